@@ -1,5 +1,340 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import json
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, File, Form, Header, HTTPException, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from pydantic import ValidationError
+
+from app.schemas.requests import PredictionRequest
+from app.schemas.responses import (
+    ArchivePredictionResponse,
+    BatchPredictionResponse,
+    PredictionResponse,
+    SimilarCasesResponse
+)
+from app.utils.audit_log import build_audit_record
+from app.utils.frame_stream import FrameSession
+from app.utils.memory_budget import MemoryReservation, estimate_decode_bytes
+from app.utils.tabular_batch import iter_archive_images, read_metadata_table, validate_metadata_table
+
 # Добавьте эти эндпоинты в router
 
+def _audit(input_sha256: Optional[str], metadata: List[float], result: Dict) -> None:
+    """Enqueue audit record of a successful prediction (may block briefly under backpressure)"""
+    if result["success"] and settings.AUDIT_ENABLED:
+        record = build_audit_record(
+            request_id=uuid.uuid4().hex,
+            input_sha256=input_sha256,
+            metadata=metadata,
+            result=result,
+            model_version=model_manager.model_version
+        )
+        audit_sink.log(record)
+
+def _decode_size() -> Optional[Tuple[int, int]]:
+    """Decode uploads straight to model input size unless disabled"""
+    return model_manager.input_size if settings.IMAGE_DRAFT_DECODE else None
+
+def _held_bytes() -> int:
+    """
+    Memory a decoded request keeps until inference: its resized RGB image
+
+    The uint8 / float32 batch input buffers are shared by a whole batch and
+    reserved once at startup, so they are not charged per request.
+    """
+    height, width, channels = model_manager.image_shape
+    return height * width * channels
+
+async def _admit(source, upload_bytes: int) -> MemoryReservation:
+    """Reserve the decode peak of an image in the memory budget; raises TimeoutError"""
+    header = image_processor.peek_image(source)
+    decode_bytes = estimate_decode_bytes(header[0], header[1], _decode_size(), header[2]) if header else 0
+    return await memory_budget.reserve(upload_bytes + decode_bytes + _held_bytes())
+
+def _decode_upload(upload: UploadFile) -> Tuple[Optional[object], Optional[str]]:
+    """
+    Decode an upload from its spooled file, hashing it for the audit log first
+    
+    The upload is never materialized as one bytes object.
+    """
+    input_sha256 = None
+    if settings.AUDIT_ENABLED:
+        digest = hashlib.sha256()
+        for block in iter(lambda: upload.file.read(1024 * 1024), b""):
+            digest.update(block)
+        input_sha256 = digest.hexdigest()
+        upload.file.seek(0)
+    return model_manager.decode_image(upload.file, settings.IMAGE_DRAFT_DECODE), input_sha256
+
+async def _predict_cached(pil_image, metadata: List[float], tta: Optional[bool], priority: str) -> Dict:
+    """
+    Predict through the shared batcher, reusing results of near-duplicate images
+    
+    With the result cache enabled, the decoded image is reduced to a perceptual
+    hash; a hit within the configured Hamming distance is returned without
+    inference, except for the audit sample, which is re-run and compared.
+    Fast-model answers are served from the cache only while the cascade is on,
+    and answers given under degradation are never stored.
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return await inference_batcher.submit((pil_image, metadata, tta), priority=priority)
+    
+    image_hash = await run_in_threadpool(image_processor.perceptual_hash, pil_image)
+    variants = ("primary", "fast") if model_manager.cascade_active else ("primary",)
+    keys = [result_cache.make_key(metadata, tta, model_manager.model_version, variant) for variant in variants]
+    
+    cached = result_cache.lookup(image_hash, keys)
+    if cached is not None:
+        cached_result, distance, audit = cached
+        if not audit:
+            cached_result["cache"] = {"hit": True, "distance": distance}
+            return cached_result
+    
+    result = await inference_batcher.submit((pil_image, metadata, tta), priority=priority)
+    if cached is not None:
+        result_cache.record_audit(cached_result, result)
+    if result.get("cascade", {}).get("stage") != "degraded":
+        key = result_cache.make_key(metadata, tta, model_manager.model_version, result.get("model_variant", "primary"))
+        result_cache.store(image_hash, key, result)
+    result["cache"] = {"hit": False, "audit": cached is not None}
+    return result
+
+def _counted_request(endpoint):
+    """Count every finished request, successful or not, towards the active profiling capture"""
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            profiler.request_finished()
+    return wrapper
+
+@router.post("/predict", response_model=PredictionResponse)
+@_counted_request
+async def predict(
+    image: UploadFile = File(...),
+    age: float = Form(...),
+    sex: float = Form(...),
+    localization: float = Form(...),
+    dx_type: float = Form(...),
+    tta: Optional[bool] = Form(None),
+    x_priority: Optional[str] = Header(None)
+):
+    """
+    Classify a skin lesion image with clinical metadata
+    
+    The X-Priority header selects the scheduling class (interactive by default, or bulk).
+    """
+    if not model_manager.is_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    is_valid, message = model_manager.validate_metadata(age, sex, localization, dx_type)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=message)
+    
+    try:
+        reservation = await _admit(image.file, image.size or 0)
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    
+    metadata = [age, sex, localization, dx_type]
+    async with reservation:
+        pil_image, input_sha256 = await run_in_threadpool(profiler.profile, "decode", _decode_upload, image)
+        await image.close()
+        if pil_image is None:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        
+        # Загрузка и полноразмерный битмап освобождены, до инференса держим только вход модели
+        await reservation.resize(_held_bytes())
+        result = await _predict_cached(pil_image, metadata, tta, x_priority or "interactive")
+    await run_in_threadpool(_audit, input_sha256, metadata, result)
+    return result
+
+def _parse_batch_metadata(metadata: str, expected: int) -> List[List[float]]:
+    """Parse JSON list of metadata objects for a batch request"""
+    try:
+        rows = [PredictionRequest(**row) for row in json.loads(metadata)]
+    except (TypeError, ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metadata: {str(e)}")
+    
+    if len(rows) != expected:
+        raise HTTPException(status_code=400, detail=f"Got {expected} images but {len(rows)} metadata rows")
+    
+    return [[row.age, row.sex, row.localization, row.dx_type] for row in rows]
+
+@router.post("/predict/batch", response_model=BatchPredictionResponse)
+@_counted_request
+async def predict_batch(
+    images: List[UploadFile] = File(...),
+    metadata: str = Form(..., description="JSON list of {age, sex, localization, dx_type}, one per image"),
+    x_priority: Optional[str] = Header(None)
+):
+    """
+    Classify several images in one request; they share model batches with concurrent traffic
+    
+    Scheduled as bulk work unless the X-Priority header says otherwise.
+    """
+    if not model_manager.is_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    metadata_list = _parse_batch_metadata(metadata, len(images))
+    priority = x_priority or "bulk"
+    
+    async def predict_one(upload: UploadFile, row: List[float]) -> Dict:
+        try:
+            reservation = await _admit(upload.file, upload.size or 0)
+        except TimeoutError as e:
+            return {"success": False, "error": str(e)}
+        
+        async with reservation:
+            pil_image, input_sha256 = await run_in_threadpool(_decode_upload, upload)
+            await upload.close()
+            if pil_image is None:
+                return {"success": False, "error": f"Invalid image file: {upload.filename}"}
+            await reservation.resize(_held_bytes())
+            result = await _predict_cached(pil_image, row, None, priority)
+        await run_in_threadpool(_audit, input_sha256, row, result)
+        return result
+    
+    results = await asyncio.gather(*[predict_one(upload, row) for upload, row in zip(images, metadata_list)])
+    failed = sum(1 for result in results if not result["success"])
+    
+    return {
+        "success": failed == 0,
+        "total": len(results),
+        "failed": failed,
+        "results": results
+    }
+
+@router.post("/predict/archive", response_model=ArchivePredictionResponse)
+@_counted_request
+async def predict_archive(
+    archive: UploadFile = File(..., description="zip or tar(.gz) archive of images named <image_id>.jpg"),
+    metadata: UploadFile = File(..., description="CSV or Parquet/Arrow table: image_id, age, sex, localization, dx_type"),
+    x_priority: Optional[str] = Header(None)
+):
+    """
+    Classify an image archive described by a metadata table
+    
+    Categorical columns accept codes or labels ('female', 'lower extremity', 'histo').
+    Metadata is validated for all rows at once; invalid rows, missing, duplicate
+    and broken images get per-row errors. Archive members are extracted one at a
+    time and fed into the shared batcher as they are read. The metadata table is
+    limited to ARCHIVE_MAX_MEMBER_MB like every archive member.
+    """
+    if not model_manager.is_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    max_member_bytes = settings.ARCHIVE_MAX_MEMBER_MB * 1024 * 1024
+    table_data = await metadata.read(max_member_bytes + 1)
+    if len(table_data) > max_member_bytes:
+        raise HTTPException(status_code=413, detail=f"Metadata table exceeds {max_member_bytes} bytes")
+    
+    try:
+        image_ids, columns = await run_in_threadpool(read_metadata_table, table_data, metadata.filename)
+        metadata_batch, errors = await run_in_threadpool(validate_metadata_table, columns, model_manager)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metadata table: {str(e)}")
+    
+    results: List[Optional[Dict]] = [None] * len(image_ids)
+    rows_by_id: Dict[str, int] = {}
+    for row, (image_id, error) in enumerate(zip(image_ids, errors)):
+        if image_id in rows_by_id:
+            error = f"Duplicate image id: {image_id}"
+        else:
+            rows_by_id[image_id] = row
+        if error is not None:
+            results[row] = {"success": False, "error": error}
+    
+    priority = x_priority or "bulk"
+    inflight = asyncio.Semaphore(settings.ARCHIVE_MAX_INFLIGHT)
+    
+    async def predict_member(row: int, image_data: bytes) -> None:
+        try:
+            reservation = await _admit(image_data, len(image_data))
+        except TimeoutError as e:
+            results[row] = {"success": False, "error": str(e)}
+            inflight.release()
+            return
+        
+        try:
+            async with reservation:
+                input_sha256 = hashlib.sha256(image_data).hexdigest() if settings.AUDIT_ENABLED else None
+                pil_image = await run_in_threadpool(model_manager.decode_image, image_data, settings.IMAGE_DRAFT_DECODE)
+                del image_data
+                if pil_image is None:
+                    results[row] = {"success": False, "error": f"Invalid image file: {image_ids[row]}"}
+                    return
+                await reservation.resize(_held_bytes())
+                row_metadata = metadata_batch[row].tolist()
+                result = await _predict_cached(pil_image, row_metadata, None, priority)
+            await run_in_threadpool(_audit, input_sha256, row_metadata, result)
+            results[row] = result
+        finally:
+            inflight.release()
+    
+    members = iter_archive_images(
+        archive.file, archive.filename,
+        max_member_bytes=max_member_bytes,
+        max_members=settings.ARCHIVE_MAX_MEMBERS
+    )
+    tasks = []
+    unmatched = []
+    member_errors: Dict[int, str] = {}
+    try:
+        while True:
+            member = await run_in_threadpool(next, members, None)
+            if member is None:
+                break
+            image_id, image_data, error = member
+            row = rows_by_id.get(image_id)
+            if row is None:
+                unmatched.append(image_id)
+                continue
+            if errors[row] is not None:
+                continue
+            if error is not None:
+                # Ошибка дубликата перекрывает и результат уже отправленной первой копии
+                member_errors[row] = error
+                continue
+            
+            # Ограничиваем число извлечённых, но ещё не обработанных изображений
+            await inflight.acquire()
+            results[row] = {"success": False, "error": "Not processed"}
+            tasks.append(asyncio.create_task(predict_member(row, image_data)))
+            del member, image_data
+    except ValueError as e:
+        for task in tasks:
+            task.cancel()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await asyncio.gather(*tasks)
+    for row, error in member_errors.items():
+        results[row] = {"success": False, "error": error}
+    results = [result or {"success": False, "error": "Image not found in archive"} for result in results]
+    failed = sum(1 for result in results if not result["success"])
+    
+    return {
+        "success": failed == 0,
+        "total": len(results),
+        "failed": failed,
+        "results": results,
+        "image_ids": image_ids.tolist(),
+        "unmatched_members": unmatched
+    }
+
+@router.get("/audit-stats")
+async def get_audit_stats():
+    """Get prediction audit log statistics"""
+    return audit_sink.get_stats()
+
 @router.get("/sex-options")
 async def get_sex_options():
     """Get available sex options"""
@@ -29,4 +364,274 @@ async def get_risk_classes():
     return {
         "risk_classes": model_manager.get_risk_classes(),
         "total_classes": len(model_manager.get_risk_classes())
-    }
\ No newline at end of file
+    }
+
+@router.get("/model-info")
+async def get_model_info():
+    """Get model version, input shape, options and serving configuration"""
+    return model_manager.get_model_info()
+
+@router.get("/routing-stats")
+async def get_routing_stats():
+    """Get model cascade and overload degradation routing rates"""
+    return model_manager.get_routing_stats()
+
+@router.post("/similar", response_model=SimilarCasesResponse)
+async def find_similar_cases(
+    image: UploadFile = File(...),
+    age: float = Form(...),
+    sex: float = Form(...),
+    localization: float = Form(...),
+    dx_type: float = Form(...),
+    k: int = Form(5, ge=1, le=100),
+    store: bool = Form(False),
+    case_id: Optional[str] = Form(None)
+):
+    """Find previously seen lesions similar to the uploaded one"""
+    if not model_manager.is_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    is_valid, message = model_manager.validate_metadata(age, sex, localization, dx_type)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=message)
+    
+    try:
+        reservation = await _admit(image.file, image.size or 0)
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    
+    metadata = [age, sex, localization, dx_type]
+    async with reservation:
+        pil_image, input_sha256 = await run_in_threadpool(_decode_upload, image)
+        await image.close()
+        if pil_image is None:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        
+        await reservation.resize(_held_bytes())
+        # Эмбеддинг считается в общем батчере вместе с остальным трафиком
+        result = await inference_batcher.submit((pil_image, metadata, False, True), priority="interactive")
+    if not result["success"]:
+        return {"success": False, "error": result["error"]}
+    
+    embedding = result.pop("embedding")
+    await run_in_threadpool(_audit, input_sha256, metadata, result)
+    neighbours = await run_in_threadpool(similarity_index.search, embedding, k)
+    
+    stored_case_id = None
+    if store:
+        stored_case_id = case_id or uuid.uuid4().hex
+        payload = {
+            "diagnosis": result["diagnosis"]["name"],
+            "risk_level": result["risk"]["level"],
+            "metadata": metadata
+        }
+        await run_in_threadpool(similarity_index.add, [embedding], [stored_case_id], [payload])
+    
+    return {
+        "success": True,
+        "diagnosis": result["diagnosis"],
+        "risk": result["risk"],
+        "neighbours": neighbours,
+        "stored_case_id": stored_case_id
+    }
+
+@router.get("/similar/stats")
+async def get_similarity_index_stats():
+    """Get similar-case index statistics"""
+    return similarity_index.get_stats()
+
+def _parse_stream_metadata(message: Dict) -> List[float]:
+    return [float(message[key]) for key in ("age", "sex", "localization", "dx_type")]
+
+@router.websocket("/ws/stream")
+async def stream_frames(websocket: WebSocket):
+    """
+    Classify a live stream of dermatoscope frames
+    
+    Protocol: the first text message is JSON session metadata
+    (age, sex, localization, dx_type, optional session_id); then every binary
+    message is an encoded frame. A later text message {"type": "metadata", ...}
+    updates the metadata. Results are pushed back with latency stamps; a slow
+    client receives only the latest result.
+    """
+    await websocket.accept()
+    
+    if not model_manager.is_loaded:
+        await websocket.send_json({"type": "error", "error": "Model not loaded"})
+        await websocket.close(code=1011)
+        return
+    
+    try:
+        session_info = await websocket.receive_json()
+        metadata = _parse_stream_metadata(session_info)
+    except WebSocketDisconnect:
+        return
+    except (KeyError, TypeError, ValueError):
+        await websocket.send_json({"type": "error", "error": "First message must contain age, sex, localization, dx_type"})
+        await websocket.close(code=1008)
+        return
+    
+    is_valid, message = model_manager.validate_metadata(*metadata)
+    if not is_valid:
+        await websocket.send_json({"type": "error", "error": message})
+        await websocket.close(code=1008)
+        return
+    
+    session = FrameSession(
+        inference_batcher,
+        metadata,
+        dedup_distance=settings.STREAM_DEDUP_DISTANCE,
+        session_id=session_info.get("session_id"),
+        target_size=_decode_size(),
+        memory_budget=memory_budget,
+        held_bytes=_held_bytes(),
+        audit=_audit if settings.AUDIT_ENABLED else None
+    )
+    await websocket.send_json({"type": "session", "session_id": session.session_id})
+    
+    async def send_results():
+        while True:
+            await websocket.send_json(await session.next_message())
+    
+    sender = asyncio.create_task(send_results())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect" or sender.done():
+                break
+            
+            if message.get("bytes") is not None:
+                await session.on_frame(message["bytes"])
+            elif message.get("text"):
+                try:
+                    update = json.loads(message["text"])
+                    metadata = _parse_stream_metadata(update)
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if update.get("type") == "metadata" and model_manager.validate_metadata(*metadata)[0]:
+                    session.update_metadata(metadata)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        try:
+            await sender
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Ошибка отправки (например, клиент отключился) не должна теряться молча
+            logger.warning(f"Stream session {session.session_id} sender failed: {str(e)}")
+        await session.close()
+
+@router.get("/explain/{explanation_id}")
+async def explain(explanation_id: str, overlay: bool = True):
+    """
+    Grad-CAM heatmap (PNG) for a previous prediction
+    
+    Computed on first request from the stored preprocessed input, then cached.
+    overlay=False returns the bare heatmap instead of blending it over the image.
+    """
+    if not model_manager.is_loaded or model_manager.explanation_store is None:
+        raise HTTPException(status_code=503, detail="Explanations are not available")
+    
+    png = explanation_store.get_heatmap(explanation_id, overlay)
+    if png is None:
+        png = await explain_batcher.submit((explanation_id, overlay))
+    if png is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired explanation id")
+    
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "private, max-age=3600"})
+
+@router.get("/explain-stats")
+async def get_explain_stats():
+    """Get explanation input and heatmap cache statistics"""
+    return {
+        **explanation_store.get_stats(),
+        "batcher": explain_batcher.get_stats()
+    }
+
+@router.get("/result-cache-stats")
+async def get_result_cache_stats():
+    """Get near-duplicate result cache hit rate and audit agreement"""
+    return {"enabled": settings.RESULT_CACHE_ENABLED, **result_cache.get_stats()}
+
+@router.get("/memory-stats")
+async def get_memory_stats():
+    """Get memory budget reservations and process RSS"""
+    return memory_budget.get_stats()
+
+@router.get("/batcher-stats")
+async def get_batcher_stats():
+    """Get inference batching statistics"""
+    return inference_batcher.get_stats()
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Allow access only with a valid X-Admin-Token header"""
+    if not settings.ADMIN_TOKEN or not x_admin_token \
+            or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@router.get("/shadow-stats")
+async def get_shadow_stats():
+    """Get candidate-vs-production agreement and latency of shadow evaluation"""
+    shadow = model_manager.shadow
+    if shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, **shadow.get_stats()}
+
+@router.post("/admin/shadow", dependencies=[Depends(_require_admin)])
+async def start_shadow_evaluation(model_path: str, sample_rate: Optional[float] = None):
+    """Load a candidate model and mirror a sample of traffic to it (replaces the current candidate)"""
+    if not model_manager.is_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if sample_rate is not None and not 0.0 <= sample_rate <= 1.0:
+        raise HTTPException(status_code=400, detail="sample_rate must be within [0, 1]")
+    
+    try:
+        shadow = await run_in_threadpool(start_shadow, model_path, sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"candidate_model_version": shadow.candidate.model_version, "sample_rate": shadow.sample_rate}
+
+@router.post("/admin/shadow/stop", dependencies=[Depends(_require_admin)])
+async def stop_shadow_evaluation():
+    """Stop shadow evaluation and return its final comparison"""
+    stats = await run_in_threadpool(stop_shadow)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Shadow evaluation is not running")
+    return stats
+
+@router.post("/admin/profile", dependencies=[Depends(_require_admin)])
+async def start_profiling(duration_s: Optional[float] = None, requests: Optional[int] = None,
+                          tf_trace: bool = True, tracemalloc_s: Optional[float] = None):
+    """
+    Start a bounded profiling capture of the request path
+    
+    tracemalloc_s opts in to allocation tracing for a short window (capped by
+    PROFILING_MAX_TRACEMALLOC_S): it slows down every allocation in the process.
+    """
+    try:
+        return await run_in_threadpool(profiler.start, duration_s, requests, tf_trace, tracemalloc_s)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/admin/profile", dependencies=[Depends(_require_admin)])
+async def get_profiling_status():
+    """Get active and finished profiling captures"""
+    return profiler.get_status()
+
+@router.post("/admin/profile/stop", dependencies=[Depends(_require_admin)])
+async def stop_profiling():
+    """Stop the active profiling capture early"""
+    capture = await run_in_threadpool(profiler.finish)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="No active capture")
+    return {"capture_id": capture["capture_id"]}
+
+@router.get("/admin/profile/{capture_id}/download", dependencies=[Depends(_require_admin)])
+async def download_profile(capture_id: str):
+    """Download profiling capture artifacts as a zip archive"""
+    path = profiler.archive_path(capture_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return FileResponse(path, media_type="application/zip", filename=f"{capture_id}.zip")
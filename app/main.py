@@ -1,11 +1,25 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 from app.api.endpoints import router as api_router
 from app.models.model_manager import SkinCancerModel
+from app.utils.artifact_fetcher import ArtifactFetcher, load_manifest
+from app.utils.audit_log import AuditSink
+from app.utils.autotune import save_profile, tune_in_process
+from app.utils.batcher import InferenceBatcher
+from app.utils.explanations import ExplanationStore, render_heatmap
 from app.utils.image_processor import ImageProcessor
+from app.utils.memory_budget import MemoryBudget
+from app.utils.profiler import ProfilingController
+from app.utils.result_cache import NearDuplicateCache
+from app.utils.shadow import ShadowEvaluator
+from app.utils.similarity_index import SimilarityIndex
 from config.settings import get_settings
 
 # Настройка логирования
@@ -20,6 +34,184 @@ settings = get_settings()
 # Глобальные экземпляры
 model_manager = SkinCancerModel()
 image_processor = ImageProcessor()
+similarity_index = SimilarityIndex(
+    settings.SIMILARITY_INDEX_DIR,
+    nlist=settings.SIMILARITY_NLIST,
+    nprobe=settings.SIMILARITY_NPROBE
+)
+audit_sink = AuditSink(
+    settings.AUDIT_DIR,
+    backend=settings.AUDIT_BACKEND,
+    max_queue=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+    overflow_policy=settings.AUDIT_OVERFLOW_POLICY,
+    block_timeout=settings.AUDIT_BLOCK_TIMEOUT,
+    max_file_bytes=settings.AUDIT_MAX_FILE_MB * 1024 * 1024,
+    max_files=settings.AUDIT_MAX_FILES
+)
+
+explanation_store = ExplanationStore(
+    max_inputs=settings.EXPLAIN_MAX_INPUTS,
+    max_heatmaps=settings.EXPLAIN_MAX_HEATMAPS
+)
+
+result_cache = NearDuplicateCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    max_distance=settings.RESULT_CACHE_MAX_DISTANCE,
+    ttl_s=settings.RESULT_CACHE_TTL_S,
+    audit_rate=settings.RESULT_CACHE_AUDIT_RATE
+)
+
+memory_budget = MemoryBudget(
+    settings.MEMORY_BUDGET_MB * 1024 * 1024 if settings.MEMORY_BUDGET_MB else None,
+    timeout_s=settings.MEMORY_ADMISSION_TIMEOUT_S
+)
+
+profiler = ProfilingController(
+    settings.PROFILING_DIR,
+    enabled=settings.PROFILING_ENABLED,
+    max_duration_s=settings.PROFILING_MAX_DURATION_S,
+    max_requests=settings.PROFILING_MAX_REQUESTS,
+    max_tracemalloc_s=settings.PROFILING_MAX_TRACEMALLOC_S
+)
+
+def run_inference_batch(items):
+    """
+    Batch function for InferenceBatcher: items are (image, metadata), (image, metadata, tta)
+    or (image, metadata, tta, return_embedding)
+    """
+    results = [None] * len(items)
+    
+    # Элементы с разной политикой TTA или с эмбеддингом обрабатываются отдельными вызовами predict_batch
+    groups = {}
+    for i, item in enumerate(items):
+        tta = item[2] if len(item) > 2 else None
+        return_embedding = bool(item[3]) if len(item) > 3 else False
+        groups.setdefault((tta, return_embedding), []).append(i)
+    
+    for (tta, return_embedding), rows in groups.items():
+        group_results = profiler.profile(
+            "inference",
+            model_manager.predict_batch,
+            [items[i][0] for i in rows],
+            [items[i][1] for i in rows],
+            tta,
+            return_embedding
+        )
+        for i, result in zip(rows, group_results):
+            results[i] = result
+    
+    return results
+
+inference_batcher = InferenceBatcher(
+    run_inference_batch,
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+    priority_weights=settings.PRIORITY_WEIGHTS,
+    default_priority="interactive",
+    slo_ms=settings.PRIORITY_SLO_MS,
+    urgent_fraction=settings.PRIORITY_URGENT_FRACTION,
+    load_monitor=model_manager.update_load
+)
+
+def run_explain_batch(items):
+    """Batch function for the explanation batcher: items are (explanation_id, overlay) pairs"""
+    inputs = {}
+    for explanation_id, _ in items:
+        entry = explanation_store.get(explanation_id)
+        if entry is not None:
+            inputs[explanation_id] = entry
+    if not inputs:
+        return [None] * len(items)
+    
+    # Одна карта на объяснение, даже если её запросили несколько клиентов
+    ids = list(inputs)
+    cams = model_manager.explain_batch(
+        np.stack([inputs[i].image for i in ids]),
+        np.stack([inputs[i].metadata for i in ids]),
+        [inputs[i].class_index for i in ids]
+    )
+    cams = dict(zip(ids, cams))
+    
+    rendered = {}
+    for explanation_id, overlay in items:
+        key = (explanation_id, overlay)
+        if explanation_id in inputs and key not in rendered:
+            rendered[key] = render_heatmap(inputs[explanation_id].image, cams[explanation_id], overlay)
+            explanation_store.put_heatmap(explanation_id, overlay, rendered[key])
+    return [rendered.get(item) for item in items]
+
+explain_batcher = InferenceBatcher(
+    run_explain_batch,
+    max_batch_size=settings.EXPLAIN_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EXPLAIN_BATCH_MAX_WAIT_MS,
+    name="explain"
+)
+
+def start_shadow(model_path: str, sample_rate: float = None) -> ShadowEvaluator:
+    """Load a candidate model next to the primary one and start mirroring traffic to it"""
+    candidate = SkinCancerModel()
+    if not candidate.load_model(model_path, lazy=False):
+        raise ValueError(f"Failed to load candidate model: {model_path}")
+    
+    shadow = ShadowEvaluator(
+        candidate,
+        sample_rate=settings.SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate,
+        max_queue=settings.SHADOW_QUEUE_SIZE,
+        batch_size=settings.SHADOW_BATCH_SIZE
+    )
+    shadow.start()
+    
+    previous, model_manager.shadow = model_manager.shadow, shadow
+    if previous is not None:
+        previous.close()
+    return shadow
+
+def stop_shadow():
+    """Stop shadow evaluation and return its final stats"""
+    shadow, model_manager.shadow = model_manager.shadow, None
+    if shadow is None:
+        return None
+    shadow.close()
+    return shadow.get_stats()
+
+def fetch_model_artifacts():
+    """Скачивание артефактов манифеста в общий кэш узла (один воркер качает, остальные ждут)"""
+    fetcher = ArtifactFetcher(
+        settings.absolute_artifact_cache_dir,
+        parallelism=settings.FETCH_PARALLELISM,
+        chunk_size=settings.FETCH_CHUNK_MB * 1024 * 1024,
+        timeout_s=settings.FETCH_TIMEOUT_S,
+        retries=settings.FETCH_RETRIES
+    )
+    entries = load_manifest(settings.absolute_model_manifest, timeout_s=settings.FETCH_TIMEOUT_S)
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for path in fetcher.fetch_manifest(entries, base_dir):
+        logger.info(f"Artifact ready: {path}")
+
+def autotune_batching():
+    """Подбор размера батча и ожидания на загруженной модели (потоки TF остаются текущими)"""
+    try:
+        profile = tune_in_process(
+            model_manager,
+            settings.AUTOTUNE_BATCH_SIZES,
+            settings.AUTOTUNE_TARGET_P99_MS,
+            intra_op_threads=settings.TF_INTRA_OP_THREADS,
+            inter_op_threads=settings.TF_INTER_OP_THREADS
+        )
+    finally:
+        # Буферы пробных батчей (до 64 изображений) не должны оставаться в памяти
+        model_manager.release_input_buffers()
+    if profile is None:
+        return
+    
+    inference_batcher.max_batch_size = profile["settings"]["BATCH_MAX_SIZE"]
+    inference_batcher.max_wait_ms = profile["settings"]["BATCH_MAX_WAIT_MS"]
+    logger.info(f"Autotuned batching: max_batch_size={inference_batcher.max_batch_size}, "
+                f"max_wait_ms={inference_batcher.max_wait_ms}")
+    if settings.absolute_tuning_profile_path:
+        save_profile(profile, settings.absolute_tuning_profile_path)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -27,19 +219,92 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Skin Cancer Classification API...")
     
+    if settings.MODEL_FETCH_ON_STARTUP and settings.MODEL_MANIFEST:
+        try:
+            fetch_model_artifacts()
+        except Exception as e:
+            logger.error(f"Error fetching model artifacts: {str(e)}")
+    
     try:
-        success = model_manager.load_model(settings.MODEL_PATH)
+        SkinCancerModel.configure_threads(settings.TF_INTRA_OP_THREADS, settings.TF_INTER_OP_THREADS)
+        model_manager.embedding_layer = settings.EMBEDDING_LAYER
+        model_manager.gradcam_layer = settings.GRADCAM_LAYER
+        if settings.EXPLAIN_ENABLED:
+            model_manager.explanation_store = explanation_store
+        artifact_path = settings.absolute_model_artifact_path
+        if artifact_path and os.path.exists(artifact_path):
+            success = model_manager.load_model(artifact_path)
+        else:
+            success = model_manager.load_model(settings.MODEL_PATH)
         if success:
             logger.info("Model loaded successfully")
+            model_manager.configure_tta(
+                enabled=settings.TTA_ENABLED,
+                confidence_threshold=settings.TTA_CONFIDENCE_THRESHOLD,
+                min_risk_level=settings.TTA_MIN_RISK_LEVEL,
+                classes=settings.TTA_CLASSES,
+                crop_fraction=settings.TTA_CROP_FRACTION
+            )
+            fast_model_needed = settings.CASCADE_ENABLED or settings.DEGRADATION_ENABLED
+            if fast_model_needed and model_manager.load_fast_model(settings.absolute_fast_model_path):
+                model_manager.configure_cascade(
+                    enabled=settings.CASCADE_ENABLED,
+                    thresholds=settings.CASCADE_THRESHOLDS
+                )
+                model_manager.configure_degradation(
+                    enabled=settings.DEGRADATION_ENABLED,
+                    queue_high=settings.DEGRADATION_QUEUE_HIGH,
+                    queue_low=settings.DEGRADATION_QUEUE_LOW,
+                    p95_high_ms=settings.DEGRADATION_P95_HIGH_MS,
+                    p95_low_ms=settings.DEGRADATION_P95_LOW_MS,
+                    min_hold_s=settings.DEGRADATION_MIN_HOLD_S
+                )
         else:
             logger.error("Failed to load model")
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
     
+    # Автоподбор батчинга до старта батчера и теневой модели, чтобы замеры не искажались
+    profile_path = settings.absolute_tuning_profile_path
+    if settings.AUTOTUNE_ON_STARTUP and model_manager.is_loaded and not (profile_path and os.path.exists(profile_path)):
+        try:
+            # Замеры идут в отдельном потоке, не блокируя цикл событий; поток завершается вместе с буферами
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="autotune") as executor:
+                await asyncio.get_running_loop().run_in_executor(executor, autotune_batching)
+        except Exception as e:
+            logger.error(f"Batching autotune failed: {str(e)}")
+    
+    # Потоковые буферы входа не растут сверх рабочего размера батча
+    model_manager.input_buffer_max_rows = max(inference_batcher.max_batch_size, explain_batcher.max_batch_size)
+    # Буферы (uint8 + float32) общие для всех запросов батча и живут в потоке каждого из двух батчеров:
+    # резервируем их в бюджете один раз, запросы платят только за своё изображение
+    height, width, channels = model_manager.image_shape
+    input_buffers = await memory_budget.reserve(
+        2 * model_manager.input_buffer_max_rows * height * width * channels * (1 + 4)
+    )
+    
+    if settings.SHADOW_MODEL_PATH and model_manager.is_loaded:
+        try:
+            start_shadow(settings.absolute_shadow_model_path)
+        except ValueError as e:
+            logger.error(str(e))
+    
+    if settings.AUDIT_ENABLED:
+        audit_sink.start()
+    inference_batcher.start()
+    explain_batcher.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down Skin Cancer Classification API...")
+    await inference_batcher.stop()
+    await explain_batcher.stop()
+    stop_shadow()
+    await input_buffers.release()
+    profiler.finish()
+    similarity_index.flush()
+    audit_sink.close()
 
 app = FastAPI(
     title=settings.APP_NAME,
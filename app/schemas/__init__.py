@@ -3,6 +3,19 @@ Pydantic schemas for request/response validation
 """
 
 from app.schemas.requests import PredictionRequest
-from app.schemas.responses import PredictionResponse
+from app.schemas.responses import (
+    ArchivePredictionResponse,
+    BatchPredictionResponse,
+    PredictionResponse,
+    SimilarCase,
+    SimilarCasesResponse
+)
 
-__all__ = ["PredictionRequest", "PredictionResponse"]
\ No newline at end of file
+__all__ = [
+    "PredictionRequest",
+    "PredictionResponse",
+    "BatchPredictionResponse",
+    "ArchivePredictionResponse",
+    "SimilarCase",
+    "SimilarCasesResponse"
+]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 class DiagnosisInfo(BaseModel):
     class_: int = Field(..., alias="class")
@@ -46,7 +46,48 @@ class PredictionResponse(BaseModel):
     risk: Optional[RiskInfo] = None
     metadata: Optional[MetadataInfo] = None
     probabilities: Optional[Dict] = None
+    model_variant: Optional[str] = None
+    explanation_id: Optional[str] = None
+    cache: Optional[Dict] = None
+    cascade: Optional[Dict] = None
+    tta: Optional[Dict] = None
+    embedding: Optional[List[float]] = None
     error: Optional[str] = None
 
     class Config:
-        allow_population_by_field_name = True
\ No newline at end of file
+        allow_population_by_field_name = True
+
+class SimilarCase(BaseModel):
+    case_id: str
+    similarity: float
+    payload: Optional[Dict] = None
+
+class SimilarCasesResponse(BaseModel):
+    """
+    Schema for similar-case lookup response
+    """
+    success: bool
+    diagnosis: Optional[DiagnosisInfo] = None
+    risk: Optional[RiskInfo] = None
+    neighbours: List[SimilarCase] = []
+    stored_case_id: Optional[str] = None
+    error: Optional[str] = None
+
+    class Config:
+        allow_population_by_field_name = True
+
+class BatchPredictionResponse(BaseModel):
+    """
+    Schema for batch prediction response, results are in request order
+    """
+    success: bool
+    total: int
+    failed: int
+    results: List[PredictionResponse]
+
+class ArchivePredictionResponse(BatchPredictionResponse):
+    """
+    Schema for archive + metadata table prediction response, results are in table row order
+    """
+    image_ids: List[str]
+    unmatched_members: List[str] = []
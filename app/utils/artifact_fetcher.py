@@ -0,0 +1,334 @@
+"""
+Resumable, parallel, checksummed download of model artifacts.
+
+Artifacts are described by a manifest (local JSON file or http(s) URL):
+
+    {"artifacts": [{"path": "models/trained_models/best_model.h5",
+                    "sha256": "<hex>", "size": 123456789,
+                    "urls": ["https://mirror-1/best_model.h5", "https://mirror-2/best_model.h5"]}]}
+
+Downloads land in a content-addressed cache (cache_dir/sha256/ab/abcd...)
+shared by every worker on the node: a per-digest file lock makes one process
+download while the others wait and then reuse the blob. A blob is only ever
+created by renaming a fully downloaded and verified part file, so a cache hit
+needs no re-hashing. The destination path gets a hard link (or copy) of the
+blob through a temporary name and os.replace(), never a half-written file;
+blobs are made read-only first, so a write through the link cannot corrupt
+the shared cache.
+
+Servers that answer Range requests are fetched in parallel fixed-size chunks;
+finished chunks are recorded in a .progress file next to the part file, so an
+interrupted download resumes with the missing chunks only, unless the server's
+validator (ETag / Last-Modified) has changed since. Servers without
+range support fall back to a single sequential stream.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка между процессами недоступна
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+
+class ChecksumMismatch(ValueError):
+    """Downloaded content does not match the manifest digest"""
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(4 * READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: str, data: Dict) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(source: str, timeout_s: float = 30.0) -> List[Dict]:
+    """Read manifest entries from a local file or an http(s) URL"""
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, timeout=timeout_s)
+        response.raise_for_status()
+        manifest = response.json()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    entries = manifest.get("artifacts", []) if isinstance(manifest, dict) else manifest
+    for entry in entries:
+        if "url" in entry and "urls" not in entry:
+            entry["urls"] = [entry["url"]]
+        missing = [key for key in ("path", "sha256", "urls") if not entry.get(key)]
+        if missing:
+            raise ValueError(f"Manifest entry {entry.get('path', '?')} is missing {', '.join(missing)}")
+        entry["sha256"] = entry["sha256"].lower()
+    return entries
+
+
+class ArtifactFetcher:
+    """Fetch artifacts into a node-wide content-addressed cache and link them into place"""
+
+    def __init__(self, cache_dir: str, parallelism: int = 4, chunk_size: int = 8 * 1024 * 1024,
+                 timeout_s: float = 30.0, retries: int = 3,
+                 progress: Optional[Callable[[int], None]] = None):
+        self.cache_dir = cache_dir
+        self.parallelism = max(1, parallelism)
+        self.chunk_size = chunk_size
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.progress = progress
+        self._local = threading.local()
+
+    # Кэш
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, "sha256", sha256[:2], sha256)
+
+    def _part_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, "partial", sha256 + ".part")
+
+    @contextmanager
+    def _lock(self, sha256: str):
+        """Exclusive per-digest lock shared by all processes using this cache"""
+        lock_dir = os.path.join(self.cache_dir, "locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, sha256 + ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    # HTTP
+    def _session(self) -> requests.Session:
+        # requests.Session не потокобезопасна - одна сессия на поток загрузки
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _probe(self, url: str) -> Tuple[Optional[int], bool, Optional[str]]:
+        """(size, range support, validator) from a one-byte range request"""
+        with self._session().get(url, headers={"Range": "bytes=0-0"}, stream=True,
+                                 timeout=self.timeout_s) as response:
+            response.raise_for_status()
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            if response.status_code == 206 and "/" in response.headers.get("Content-Range", ""):
+                total = response.headers["Content-Range"].rsplit("/", 1)[1]
+                return (int(total) if total != "*" else None), True, validator
+            length = response.headers.get("Content-Length")
+            return (int(length) if length else None), False, validator
+
+    def _with_retries(self, action: Callable[[], None], description: str) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                return action()
+            except (requests.RequestException, IOError) as e:
+                if attempt == self.retries:
+                    raise
+                delay = min(2 ** attempt, 30)
+                logger.warning(f"{description} failed ({str(e)}), retry {attempt + 1}/{self.retries} in {delay}s")
+                time.sleep(delay)
+
+    def _fetch_chunk(self, url: str, part_path: str, start: int, end: int, validator: Optional[str]) -> None:
+        headers = {"Range": f"bytes={start}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+        with self._session().get(url, headers=headers, stream=True, timeout=self.timeout_s) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError(f"Server ignored range {start}-{end} (status {response.status_code}); "
+                              f"content changed during download?")
+
+            written = 0
+            try:
+                with open(part_path, "r+b") as f:
+                    f.seek(start)
+                    for block in response.iter_content(READ_SIZE):
+                        f.write(block)
+                        written += len(block)
+                        if self.progress:
+                            self.progress(len(block))
+                if written != end - start + 1:
+                    raise IOError(f"Short read for range {start}-{end}: {written} bytes")
+            except Exception:
+                if self.progress:
+                    self.progress(-written)
+                raise
+
+    def _download_ranges(self, url: str, sha256: str, size: int, validator: Optional[str]) -> str:
+        part_path = self._part_path(sha256)
+        progress_path = part_path + ".progress"
+        num_chunks = max(1, -(-size // self.chunk_size))
+        state = {"sha256": sha256, "size": size, "chunk_size": self.chunk_size, "validator": validator, "done": []}
+
+        if os.path.exists(part_path) and os.path.exists(progress_path):
+            try:
+                with open(progress_path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                # Другой валидатор - файл на сервере заменён, скачанные чанки от старой версии
+                if all(saved.get(key) == state[key] for key in ("sha256", "size", "chunk_size", "validator")):
+                    state["done"] = saved.get("done", [])
+                else:
+                    logger.info(f"Discarding partial download of {sha256[:12]}: server content changed")
+            except (OSError, ValueError):
+                pass
+
+        done = set(state["done"])
+        if done:
+            logger.info(f"Resuming {sha256[:12]}: {len(done)}/{num_chunks} chunks already downloaded")
+            if self.progress:
+                self.progress(sum(min(self.chunk_size, size - i * self.chunk_size) for i in done))
+        else:
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            _write_json_atomic(progress_path, state)
+
+        state_lock = threading.Lock()
+
+        def fetch(index: int) -> None:
+            start = index * self.chunk_size
+            end = min(start + self.chunk_size, size) - 1
+            self._with_retries(lambda: self._fetch_chunk(url, part_path, start, end, validator),
+                               f"Chunk {index} of {sha256[:12]}")
+            with state_lock:
+                done.add(index)
+                state["done"] = sorted(done)
+                _write_json_atomic(progress_path, state)
+
+        pending = [i for i in range(num_chunks) if i not in done]
+        with ThreadPoolExecutor(max_workers=min(self.parallelism, max(1, len(pending))),
+                                thread_name_prefix="fetch") as pool:
+            for future in [pool.submit(fetch, index) for index in pending]:
+                future.result()
+        return part_path
+
+    def _download_stream(self, url: str, sha256: str) -> str:
+        part_path = self._part_path(sha256)
+
+        def fetch() -> None:
+            written = 0
+            try:
+                with self._session().get(url, stream=True, timeout=self.timeout_s) as response:
+                    response.raise_for_status()
+                    with open(part_path, "wb") as f:
+                        for block in response.iter_content(READ_SIZE):
+                            f.write(block)
+                            written += len(block)
+                            if self.progress:
+                                self.progress(len(block))
+            except Exception:
+                # Без поддержки Range повтор начинается с нуля
+                if self.progress:
+                    self.progress(-written)
+                raise
+
+        self._with_retries(fetch, f"Download of {sha256[:12]}")
+        return part_path
+
+    def _download(self, url: str, sha256: str, expected_size: Optional[int]) -> str:
+        size, ranges, validator = self._probe(url)
+        if expected_size is not None and size is not None and size != expected_size:
+            raise ChecksumMismatch(f"{url} has {size} bytes, manifest expects {expected_size}")
+
+        if ranges and size:
+            part_path = self._download_ranges(url, sha256, size, validator)
+        else:
+            logger.info(f"{url} does not support range requests, downloading sequentially")
+            part_path = self._download_stream(url, sha256)
+
+        actual = sha256_file(part_path)
+        if actual != sha256:
+            for path in (part_path, part_path + ".progress"):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise ChecksumMismatch(f"SHA-256 mismatch for {url}: expected {sha256}, got {actual}")
+        return part_path
+
+    def fetch(self, urls: Sequence[str], sha256: str, size: Optional[int] = None) -> str:
+        """Return the cache path of a verified blob, downloading it from the first working URL"""
+        sha256 = sha256.lower()
+        blob_path = self.blob_path(sha256)
+        if os.path.exists(blob_path):
+            return blob_path
+
+        os.makedirs(os.path.dirname(self._part_path(sha256)), exist_ok=True)
+        with self._lock(sha256):
+            # Пока ждали блокировку, блоб мог скачать другой воркер
+            if os.path.exists(blob_path):
+                return blob_path
+
+            errors = []
+            for url in urls:
+                try:
+                    part_path = self._download(url, sha256, size)
+                except (requests.RequestException, IOError, ValueError) as e:
+                    logger.warning(f"Download from {url} failed: {str(e)}")
+                    errors.append(f"{url}: {str(e)}")
+                    continue
+
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                with open(part_path, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(part_path, blob_path)
+                os.chmod(blob_path, 0o444)
+                if os.path.exists(part_path + ".progress"):
+                    os.remove(part_path + ".progress")
+                logger.info(f"Cached artifact {sha256[:12]} from {url}")
+                return blob_path
+
+        raise RuntimeError(f"Failed to fetch artifact {sha256}: " + "; ".join(errors))
+
+    @staticmethod
+    def materialize(blob_path: str, dest_path: str) -> None:
+        """
+        Atomically place a cached blob at dest_path
+
+        A hard link is used when the blob can be made read-only; across
+        filesystems, or for a blob we may not chmod, the blob is copied.
+        """
+        if os.path.exists(dest_path) and os.path.samefile(blob_path, dest_path):
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        tmp_path = f"{dest_path}.tmp.{os.getpid()}"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.chmod(blob_path, 0o444)  # запись через ссылку испортила бы общий блоб
+            os.link(blob_path, tmp_path)
+        except OSError:
+            shutil.copyfile(blob_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def fetch_manifest(self, entries: Sequence[Dict], base_dir: str) -> List[str]:
+        """Fetch every manifest entry and place it at base_dir/path; returns destination paths"""
+        destinations = []
+        for entry in entries:
+            blob_path = self.fetch(entry["urls"], entry["sha256"], entry.get("size"))
+            dest_path = os.path.join(base_dir, entry["path"])
+            self.materialize(blob_path, dest_path)
+            destinations.append(dest_path)
+        return destinations
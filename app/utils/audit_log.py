@@ -0,0 +1,223 @@
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+
+class AuditSink:
+    """
+    Non-blocking audit log of predictions.
+
+    Records are put on a bounded in-memory queue and written by a background
+    thread in batches to rotated JSONL or SQLite files. When the queue is full
+    the overflow policy decides what happens:
+        block       - wait up to block_timeout for space, then drop the record
+        drop_newest - drop the incoming record
+        drop_oldest - drop the oldest queued record to make room
+    """
+
+    def __init__(self, directory: str, backend: str = "jsonl", max_queue: int = 10000,
+                 batch_size: int = 256, flush_interval: float = 1.0, overflow_policy: str = "block",
+                 block_timeout: float = 0.1, max_file_bytes: int = 100 * 1024 * 1024, max_files: int = 20):
+        if backend not in ("jsonl", "sqlite"):
+            raise ValueError(f"Unknown audit backend: {backend}")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.directory = directory
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._current_path = None
+        self._connection = None
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "write_errors": 0, "rotations": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def start(self) -> None:
+        """Start background writer thread"""
+        if self._thread is not None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Audit sink started: {self.backend} files in {self.directory}")
+
+    def log(self, record: Dict) -> bool:
+        """Enqueue a record, returns False if it was dropped"""
+        try:
+            if self.overflow_policy == "block":
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+            self._count("enqueued")
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow_policy == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+                self._queue.put_nowait(record)
+                self._count("enqueued")
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+
+        self._count("dropped")
+        return False
+
+    def _drain(self, first: Optional[Dict] = None) -> List[Dict]:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+        # Дописываем всё, что осталось в очереди на момент остановки
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._write(batch)
+
+        self._close_file()
+
+    def _new_path(self) -> str:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        return os.path.join(self.directory, f"audit-{timestamp}.{self.backend}")
+
+    def _rotate_if_needed(self) -> None:
+        if self._current_path and os.path.exists(self._current_path) \
+                and os.path.getsize(self._current_path) < self.max_file_bytes:
+            return
+
+        if self._current_path:
+            self._count("rotations")
+        self._close_file()
+        self._current_path = self._new_path()
+
+        if self.backend == "sqlite":
+            self._connection = sqlite3.connect(self._current_path)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "timestamp TEXT, request_id TEXT, input_sha256 TEXT, model_version TEXT, "
+                "diagnosis TEXT, risk_level INTEGER, metadata TEXT, probabilities TEXT, record TEXT)"
+            )
+            self._connection.commit()
+        else:
+            open(self._current_path, "a").close()
+
+        # Удаляем самые старые файлы сверх лимита
+        files = sorted(glob.glob(os.path.join(self.directory, f"audit-*.{self.backend}")))
+        for path in files[:-self.max_files]:
+            os.remove(path)
+
+    def _close_file(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _write(self, batch: List[Dict]) -> None:
+        try:
+            self._rotate_if_needed()
+
+            if self.backend == "jsonl":
+                with open(self._current_path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch))
+            else:
+                self._connection.executemany(
+                    "INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(
+                        record.get("timestamp"),
+                        record.get("request_id"),
+                        record.get("input_sha256"),
+                        record.get("model_version"),
+                        record.get("diagnosis"),
+                        record.get("risk_level"),
+                        json.dumps(record.get("metadata")),
+                        json.dumps(record.get("probabilities")),
+                        json.dumps(record, ensure_ascii=False)
+                    ) for record in batch]
+                )
+                self._connection.commit()
+
+            self._count("written", len(batch))
+        except Exception as e:
+            logger.error(f"Audit write error: {str(e)}")
+            self._count("write_errors", len(batch))
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush queued records and stop background writer"""
+        if self._thread is None:
+            return
+
+        started = time.monotonic()
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Audit sink did not flush within {timeout} s, {self._queue.qsize()} records pending")
+        else:
+            logger.info(f"Audit sink flushed in {time.monotonic() - started:.2f} s")
+        self._thread = None
+
+    def get_stats(self) -> Dict:
+        """Get audit sink counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["backend"] = self.backend
+        stats["overflow_policy"] = self.overflow_policy
+        return stats
+
+
+def build_audit_record(request_id: str, input_sha256: str, metadata: List[float],
+                       result: Dict, model_version: Optional[str]) -> Dict:
+    """Build audit record from a prediction result"""
+    probabilities = result["probabilities"]["diagnosis"]
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "request_id": request_id,
+        "input_sha256": input_sha256,
+        "model_version": model_version,
+        "metadata": list(metadata),
+        "diagnosis": result["diagnosis"]["name"],
+        "risk_level": result["risk"]["level"],
+        "probabilities": [probabilities[str(i)]["probability"] for i in range(len(probabilities))],
+        "cascade": result.get("cascade"),
+        "tta": result.get("tta")
+    }
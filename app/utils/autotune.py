@@ -0,0 +1,176 @@
+"""
+Batch size / batch wait / thread auto-tuning for InferenceBatcher.
+
+Latency of one batch is measured for a set of batch-size buckets on synthetic
+inputs of the real shape and fitted with a line, latency(b) = overhead + b * per_item.
+Under load a request waits for at most max_wait_ms, then for the batch in
+flight and then for its own batch, so its p99 is estimated as
+    max_wait_ms + 2 * p99(batch)
+The chosen batch size maximizes throughput b / p50(b) within the target p99.
+max_wait_ms is capped by the fitted per-batch overhead: waiting longer than
+the cost of launching one extra batch does not pay off.
+
+The resulting profile is written as JSON and applied by config.settings.get_settings().
+"""
+
+import json
+import os
+import platform
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+PROFILE_VERSION = 1
+
+
+def synthetic_inputs(model, batch_size: int, seed: int = 0):
+    """Random images at model input size and valid metadata rows"""
+    rng = np.random.default_rng(seed)
+    height, width, _ = model.image_shape
+    images = [
+        Image.fromarray(rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8))
+        for _ in range(batch_size)
+    ]
+    metadata = [
+        [float(rng.integers(20, 80)), float(rng.integers(0, 3)), float(rng.integers(0, 15)), float(rng.integers(0, 4))]
+        for _ in range(batch_size)
+    ]
+    return images, metadata
+
+
+def measure_batch_latencies(model, batch_sizes: Sequence[int], iterations: int = 30,
+                            warmup: int = 3) -> Dict[int, Dict[str, float]]:
+    """
+    Latency of predict_proba_batch() per batch size (preprocessing + forward pass), milliseconds
+    """
+    measurements = {}
+    for batch_size in batch_sizes:
+        images, metadata = synthetic_inputs(model, batch_size, seed=batch_size)
+        for _ in range(warmup):
+            model.predict_proba_batch(images, metadata)
+
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            model.predict_proba_batch(images, metadata)
+            latencies.append(1000 * (time.perf_counter() - started))
+
+        latencies = np.asarray(latencies)
+        measurements[int(batch_size)] = {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "mean_ms": float(latencies.mean())
+        }
+        logger.info(f"Batch {batch_size}: p50={measurements[batch_size]['p50_ms']:.1f} ms, "
+                    f"p99={measurements[batch_size]['p99_ms']:.1f} ms")
+    return measurements
+
+
+def fit_latency_curve(measurements: Dict[int, Dict[str, float]]) -> Dict[str, float]:
+    """Least-squares line through p50 batch latencies: overhead_ms + per_item_ms * batch_size"""
+    batch_sizes = np.array(sorted(measurements), dtype=np.float64)
+    p50 = np.array([measurements[int(b)]["p50_ms"] for b in batch_sizes])
+    p99_ratio = float(np.median([measurements[int(b)]["p99_ms"] / measurements[int(b)]["p50_ms"] for b in batch_sizes]))
+
+    if len(batch_sizes) > 1:
+        per_item, overhead = np.polyfit(batch_sizes, p50, 1)
+    else:
+        per_item, overhead = p50[0] / batch_sizes[0], 0.0
+    return {"overhead_ms": max(float(overhead), 0.0), "per_item_ms": max(float(per_item), 1e-6),
+            "p99_ratio": max(p99_ratio, 1.0)}
+
+
+def choose_batching(measurements: Dict[int, Dict[str, float]], curve: Dict[str, float],
+                    target_p99_ms: float, min_wait_ms: float = 1.0) -> Optional[Dict]:
+    """
+    Best measured batch size and wait within the target p99, or None if even batch size 1 misses it
+    """
+    best = None
+    for batch_size in sorted(measurements):
+        p50 = measurements[batch_size]["p50_ms"]
+        p99 = max(measurements[batch_size]["p99_ms"], p50 * curve["p99_ratio"])
+        slack = target_p99_ms - 2 * p99
+        if slack < 0:
+            continue
+
+        max_wait_ms = float(min(max(curve["overhead_ms"], min_wait_ms), slack))
+        candidate = {
+            "batch_size": int(batch_size),
+            "max_wait_ms": round(max_wait_ms, 2),
+            "throughput_per_s": 1000 * batch_size / p50,
+            "predicted_p99_ms": max_wait_ms + 2 * p99
+        }
+        if best is None or candidate["throughput_per_s"] > best["throughput_per_s"]:
+            best = candidate
+    return best
+
+
+def host_info() -> Dict:
+    """Host the profile was measured on; load_tuning_profile() matches on cpu_count only"""
+    return {
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "processor": platform.processor()
+    }
+
+
+def build_profile(choice: Dict, intra_op_threads: Optional[int], inter_op_threads: Optional[int],
+                  target_p99_ms: float, model_version: Optional[str], trials: List[Dict]) -> Dict:
+    """Tuning profile; "settings" holds Settings field overrides"""
+    return {
+        "version": PROFILE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "host": host_info(),
+        "model_version": model_version,
+        "target_p99_ms": target_p99_ms,
+        "settings": {
+            "BATCH_MAX_SIZE": choice["batch_size"],
+            "BATCH_MAX_WAIT_MS": choice["max_wait_ms"],
+            "TF_INTRA_OP_THREADS": intra_op_threads,
+            "TF_INTER_OP_THREADS": inter_op_threads
+        },
+        "expected": {
+            "throughput_per_s": choice["throughput_per_s"],
+            "predicted_p99_ms": choice["predicted_p99_ms"]
+        },
+        "trials": trials
+    }
+
+
+def save_profile(profile: Dict, path: str) -> None:
+    """Write profile JSON atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def tune_in_process(model, batch_sizes: Sequence[int], target_p99_ms: float, iterations: int = 30,
+                    intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None) -> Optional[Dict]:
+    """
+    Tune batching for the current thread configuration of this process
+
+    Thread pools of TensorFlow cannot be changed after initialization, so a
+    thread sweep needs one process per configuration (scripts/tune_batching.py).
+    """
+    measurements = measure_batch_latencies(model, batch_sizes, iterations)
+    curve = fit_latency_curve(measurements)
+    choice = choose_batching(measurements, curve, target_p99_ms)
+    trial = {
+        "intra_op_threads": intra_op_threads,
+        "inter_op_threads": inter_op_threads,
+        "measurements": {str(b): m for b, m in measurements.items()},
+        "curve": curve,
+        "choice": choice
+    }
+    if choice is None:
+        logger.warning(f"No batch size meets target p99 {target_p99_ms} ms")
+        return None
+    return build_profile(choice, intra_op_threads, inter_op_threads, target_p99_ms, model.model_version, [trial])
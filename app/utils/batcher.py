@@ -0,0 +1,279 @@
+import asyncio
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITY_WEIGHTS = {"interactive": 8.0, "bulk": 1.0}
+
+
+class _Entry(NamedTuple):
+    item: Any
+    future: asyncio.Future
+    priority: str
+    enqueued_at: float
+
+
+class InferenceBatcher:
+    """
+    Asyncio micro-batcher with priority classes: merges items submitted by
+    concurrent requests into shared batches and runs them through a blocking
+    batch function in a dedicated worker thread, one batch at a time.
+
+    A batch is dispatched when the queues hold max_batch_size items or when the
+    oldest item has waited max_wait_ms. Batch slots are shared between priority
+    classes by weighted fair queuing; running batches are never interrupted, but
+    every batch boundary is a preemption point. When the oldest item of a class
+    with a latency SLO has used urgent_fraction of its SLO, the next batch is
+    filled from that class first.
+
+    If load_monitor is set, it is called before every batch with the current
+    queue depth (including the batch) and the p95 latency of recently completed
+    items, so the batch function can adapt to load.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 16,
+                 max_wait_ms: float = 5.0, name: str = "inference",
+                 priority_weights: Optional[Dict[str, float]] = None, default_priority: str = "interactive",
+                 slo_ms: Optional[Dict[str, float]] = None, urgent_fraction: float = 0.5,
+                 stats_window: int = 1000, load_monitor: Optional[Callable[[int, Optional[float]], Any]] = None,
+                 load_window: int = 200):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.priority_weights = dict(priority_weights or DEFAULT_PRIORITY_WEIGHTS)
+        self.default_priority = default_priority
+        self.slo_ms = dict(slo_ms or {})
+        self.urgent_fraction = urgent_fraction
+        self.load_monitor = load_monitor
+
+        if default_priority not in self.priority_weights:
+            raise ValueError(f"Unknown default priority: {default_priority}")
+
+        self._queues: Dict[str, Deque[_Entry]] = {c: deque() for c in self.priority_weights}
+        self._virtual_time = {c: 0.0 for c in self.priority_weights}
+        self._virtual_clock = 0.0
+        self._arrival: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {"batches": 0, "items": 0, "errors": 0, "busy_seconds": 0.0}
+        self._class_stats = {
+            c: {"submitted": 0, "completed": 0, "slo_violations": 0, "latencies": deque(maxlen=stats_window)}
+            for c in self.priority_weights
+        }
+        self._recent_latencies: Deque[float] = deque(maxlen=load_window)
+
+    def start(self) -> None:
+        """Start batching loop (must be called from a running event loop)"""
+        if self._task is not None:
+            return
+
+        self._arrival = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-batcher")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Batcher '{self.name}' started: max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait_ms}, priorities={self.priority_weights}")
+
+    async def stop(self) -> None:
+        """Stop batching loop and fail pending items"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        for queue in self._queues.values():
+            while queue:
+                entry = queue.popleft()
+                if not entry.future.done():
+                    entry.future.set_exception(RuntimeError(f"Batcher '{self.name}' stopped"))
+
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def resolve_priority(self, priority: Optional[str]) -> str:
+        """Map a requested priority class to a known one"""
+        return priority if priority in self._queues else self.default_priority
+
+    async def submit(self, item: Any, priority: Optional[str] = None) -> Any:
+        """Submit a single item with a priority class and wait for its result"""
+        if self._task is None:
+            raise RuntimeError(f"Batcher '{self.name}' is not running")
+
+        priority = self.resolve_priority(priority)
+        queue = self._queues[priority]
+        if not queue:
+            # Класс, простаивавший без очереди, не накапливает «кредит» виртуального времени
+            self._virtual_time[priority] = max(self._virtual_time[priority], self._virtual_clock)
+
+        future = asyncio.get_running_loop().create_future()
+        queue.append(_Entry(item, future, priority, time.monotonic()))
+        self._class_stats[priority]["submitted"] += 1
+        self._arrival.set()
+        return await future
+
+    def _oldest_enqueued_at(self) -> float:
+        return min(queue[0].enqueued_at for queue in self._queues.values() if queue)
+
+    def _urgent_class(self, now: float) -> Optional[str]:
+        """Class whose oldest item has used urgent_fraction of its SLO (most urgent first)"""
+        urgent = None
+        best_slack = None
+        for priority, slo in self.slo_ms.items():
+            queue = self._queues.get(priority)
+            if not queue:
+                continue
+            waited_ms = 1000 * (now - queue[0].enqueued_at)
+            slack = slo * self.urgent_fraction - waited_ms
+            if slack <= 0 and (best_slack is None or slack < best_slack):
+                urgent, best_slack = priority, slack
+        return urgent
+
+    async def _wait_for_batch(self) -> None:
+        while not self.queue_depth:
+            self._arrival.clear()
+            await self._arrival.wait()
+
+        deadline = self._oldest_enqueued_at() + self.max_wait_ms / 1000
+        while self.queue_depth < self.max_batch_size and self._urgent_class(time.monotonic()) is None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            self._arrival.clear()
+            try:
+                await asyncio.wait_for(self._arrival.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+    def _select(self) -> List[_Entry]:
+        """Fill the next batch: urgent class first, then weighted fair queuing"""
+        urgent = self._urgent_class(time.monotonic())
+        batch = []
+
+        while len(batch) < self.max_batch_size:
+            if urgent is not None and self._queues[urgent]:
+                priority = urgent
+            else:
+                active = [c for c, queue in self._queues.items() if queue]
+                if not active:
+                    break
+                priority = min(active, key=lambda c: self._virtual_time[c])
+
+            entry = self._queues[priority].popleft()
+            self._virtual_time[priority] += 1.0 / self.priority_weights[priority]
+            self._virtual_clock = self._virtual_time[priority]
+            if not entry.future.done():
+                batch.append(entry)
+
+        return batch
+
+    def recent_p95_ms(self) -> Optional[float]:
+        """p95 latency of recently completed items across all classes"""
+        if not self._recent_latencies:
+            return None
+        return float(np.percentile(np.asarray(self._recent_latencies), 95))
+
+    def _notify_load(self, batch_size: int) -> None:
+        try:
+            self.load_monitor(self.queue_depth + batch_size, self.recent_p95_ms())
+        except Exception as e:
+            logger.error(f"Batcher '{self.name}' load monitor error: {str(e)}")
+
+    def _record_completion(self, entry: _Entry, finished_at: float) -> None:
+        stats = self._class_stats[entry.priority]
+        latency_ms = 1000 * (finished_at - entry.enqueued_at)
+        stats["completed"] += 1
+        stats["latencies"].append(latency_ms)
+        self._recent_latencies.append(latency_ms)
+        slo = self.slo_ms.get(entry.priority)
+        if slo is not None and latency_ms > slo:
+            stats["slo_violations"] += 1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await self._wait_for_batch()
+            # Запросы, отменённые клиентом, пока ждали в очереди, не обрабатываем
+            batch = self._select()
+            if not batch:
+                continue
+            if self.load_monitor is not None:
+                self._notify_load(len(batch))
+
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, [e.item for e in batch])
+                finished_at = time.monotonic()
+                for entry, result in zip(batch, results):
+                    self._record_completion(entry, finished_at)
+                    if not entry.future.done():
+                        entry.future.set_result(result)
+            except asyncio.CancelledError:
+                for entry in batch:
+                    if not entry.future.done():
+                        entry.future.set_exception(RuntimeError(f"Batcher '{self.name}' stopped"))
+                raise
+            except Exception as e:
+                logger.error(f"Batcher '{self.name}' error: {str(e)}")
+                self._stats["errors"] += 1
+                for entry in batch:
+                    if not entry.future.done():
+                        entry.future.set_exception(e)
+
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["busy_seconds"] += time.perf_counter() - started
+
+    def get_stats(self) -> Dict:
+        """Get batching statistics with per-priority-class queue and latency stats"""
+        batches = self._stats["batches"]
+        classes = {}
+        for priority, stats in self._class_stats.items():
+            latencies = np.asarray(stats["latencies"])
+            classes[priority] = {
+                "weight": self.priority_weights[priority],
+                "slo_ms": self.slo_ms.get(priority),
+                "queue_depth": len(self._queues[priority]),
+                "submitted": stats["submitted"],
+                "completed": stats["completed"],
+                "slo_violations": stats["slo_violations"],
+                "latency_ms": {
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p95": float(np.percentile(latencies, 95)),
+                    "p99": float(np.percentile(latencies, 99))
+                } if len(latencies) else None
+            }
+
+        return {
+            "name": self.name,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": batches,
+            "items": self._stats["items"],
+            "errors": self._stats["errors"],
+            "mean_batch_size": self._stats["items"] / batches if batches else 0.0,
+            "busy_seconds": self._stats["busy_seconds"],
+            "recent_p95_ms": self.recent_p95_ms(),
+            "classes": classes
+        }
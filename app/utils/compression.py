@@ -0,0 +1,131 @@
+"""
+Building blocks for producing smaller / faster variants of the Keras model.
+
+Used by scripts/compress_model.py. Variants are not fine-tuned: pruning and
+reduced resolution are applied to the trained weights as-is, so their accuracy
+is the lower bound of what a short fine-tuning run would give.
+"""
+
+import json
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+PRUNABLE_LAYERS = (tf.keras.layers.Conv2D, tf.keras.layers.Dense)
+
+
+def _prunable_layers(model: tf.keras.Model) -> Iterator[tf.keras.layers.Layer]:
+    """Conv2D / Dense layers, including those of nested sub-models"""
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.Model):
+            yield from _prunable_layers(layer)
+        elif isinstance(layer, PRUNABLE_LAYERS) and not isinstance(layer, tf.keras.layers.DepthwiseConv2D):
+            yield layer
+
+
+def prune_magnitude(model: tf.keras.Model, sparsity: float) -> Tuple[tf.keras.Model, Dict]:
+    """
+    One-shot magnitude pruning: zero the smallest |w| of every Conv2D / Dense kernel
+
+    The model is cloned, the original is left untouched. Zeros only pay off in
+    the compressed file size (and with sparse kernels at runtime), so the report
+    shows both raw and compressed sizes.
+    """
+    if not 0.0 <= sparsity < 1.0:
+        raise ValueError(f"Sparsity must be in [0, 1): {sparsity}")
+
+    pruned = tf.keras.models.clone_model(model)
+    pruned.set_weights(model.get_weights())
+
+    total, zeros = 0, 0
+    for layer in _prunable_layers(pruned):
+        kernel = layer.kernel.numpy()
+        threshold = np.quantile(np.abs(kernel), sparsity)
+        kernel[np.abs(kernel) < threshold] = 0
+        layer.kernel.assign(kernel)
+        total += kernel.size
+        zeros += int((kernel == 0).sum())
+
+    return pruned, {"target_sparsity": sparsity, "kernel_weights": total, "zero_weights": zeros,
+                    "achieved_sparsity": zeros / total if total else 0.0}
+
+
+def rebuild_with_resolution(model: tf.keras.Model, height: int, width: int) -> tf.keras.Model:
+    """
+    Rebuild the model with a smaller image input and the same weights
+
+    Works when the image branch is fully convolutional up to a global pooling
+    layer; a Flatten/Dense tied to the spatial size raises ValueError.
+    """
+    config = json.loads(model.to_json())
+    image_inputs = [
+        layer for layer in config["config"]["layers"]
+        if layer["class_name"] == "InputLayer" and len(layer["config"]["batch_input_shape"]) == 4
+    ]
+    if len(image_inputs) != 1:
+        raise ValueError("Expected exactly one 4D image input")
+
+    channels = image_inputs[0]["config"]["batch_input_shape"][-1]
+    image_inputs[0]["config"]["batch_input_shape"] = [None, height, width, channels]
+
+    try:
+        rebuilt = tf.keras.models.model_from_json(json.dumps(config))
+        rebuilt.set_weights(model.get_weights())
+    except Exception as e:
+        raise ValueError(f"Model does not support input {height}x{width}: {str(e)}")
+    return rebuilt
+
+
+def convert_tflite(model: tf.keras.Model, mode: str,
+                   representative_data: Optional[Callable[[], Iterator[List[np.ndarray]]]] = None) -> bytes:
+    """
+    Convert to TensorFlow Lite
+
+    mode "float16" stores weights as float16; mode "int8" is full-integer
+    post-training quantization calibrated on representative_data (inputs and
+    outputs stay float32, so the variant is a drop-in replacement).
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if mode == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        if representative_data is None:
+            raise ValueError("int8 quantization needs representative data")
+        converter.representative_dataset = representative_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        raise ValueError(f"Unknown TFLite mode: {mode}")
+
+    return converter.convert()
+
+
+def pareto_front(points: Sequence[Dict], objectives: Dict[str, str]) -> List[bool]:
+    """
+    Mark points not dominated by any other point
+
+    objectives maps a metric key to "max" or "min". Points missing a metric
+    are never on the front.
+    """
+    def values(point):
+        return [point.get(key) if direction == "max" else
+                (-point[key] if point.get(key) is not None else None)
+                for key, direction in objectives.items()]
+
+    vectors = [values(point) for point in points]
+    front = []
+    for i, a in enumerate(vectors):
+        if any(v is None for v in a):
+            front.append(False)
+            continue
+        dominated = any(
+            all(x >= y for x, y in zip(b, a)) and any(x > y for x, y in zip(b, a))
+            for j, b in enumerate(vectors) if j != i and all(v is not None for v in b)
+        )
+        front.append(not dominated)
+    return front
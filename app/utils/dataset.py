@@ -0,0 +1,85 @@
+import csv
+import os
+import logging
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+METADATA_FILENAMES = ('metadata.csv', 'HAM10000_metadata.csv')
+
+
+class LabeledSample(NamedTuple):
+    image_id: str
+    image_path: str
+    metadata: List[float]  # age, sex, localization, dx_type
+    label: int
+
+
+def find_metadata_file(folder: str) -> Optional[str]:
+    """
+    Find HAM10000-style metadata CSV inside a labeled folder
+    """
+    for name in METADATA_FILENAMES:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def index_images(folder: str) -> Dict[str, str]:
+    """
+    Map image_id (file name without extension) to path, searching subfolders
+    """
+    images = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() in IMAGE_EXTENSIONS:
+                images[stem] = os.path.join(root, name)
+    return images
+
+
+def load_labeled_folder(folder: str, model, metadata_path: Optional[str] = None) -> List[LabeledSample]:
+    """
+    Load a labeled folder laid out like HAM10000: a CSV with columns
+    image_id, dx, dx_type, age, sex, localization and images named <image_id>.jpg.
+    
+    String labels are encoded with the mappings of the given SkinCancerModel.
+    Missing ages are filled with the mean age of the dataset.
+    """
+    metadata_path = metadata_path or find_metadata_file(folder)
+    if not metadata_path:
+        raise FileNotFoundError(f"Metadata CSV not found in: {folder}")
+    
+    images = index_images(folder)
+    class_by_name = {info["name"]: idx for idx, info in model.diagnosis_mapping.items()}
+    
+    with open(metadata_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    
+    ages = [float(row["age"]) for row in rows if row.get("age") not in (None, "")]
+    mean_age = sum(ages) / len(ages) if ages else 0.0
+    
+    samples = []
+    skipped = 0
+    for row in rows:
+        image_path = images.get(row["image_id"])
+        label = class_by_name.get(row["dx"])
+        if image_path is None or label is None:
+            skipped += 1
+            continue
+        
+        age = float(row["age"]) if row.get("age") not in (None, "") else mean_age
+        metadata = [
+            age,
+            float(model.sex_mapping.get(row.get("sex", "unknown"), model.sex_mapping["unknown"])),
+            float(model.localization_mapping.get(row.get("localization", "unknown"), 0)),
+            float(model.dx_type_mapping.get(row.get("dx_type", "consensus"), model.dx_type_mapping["consensus"]))
+        ]
+        samples.append(LabeledSample(row["image_id"], image_path, metadata, label))
+    
+    if skipped:
+        logger.warning(f"Skipped {skipped} rows without image or with unknown diagnosis")
+    
+    return samples
@@ -0,0 +1,67 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+def classification_report(probabilities: np.ndarray, labels: np.ndarray, class_names: Sequence[str],
+                          n_bins: int = 15) -> Dict:
+    """
+    Accuracy, per-class recall/precision and calibration metrics
+    (expected calibration error, Brier score, negative log-likelihood)
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    predictions = probabilities.argmax(axis=1)
+    confidences = probabilities.max(axis=1)
+    correct = predictions == labels
+
+    per_class = {}
+    for idx, name in enumerate(class_names):
+        support = int((labels == idx).sum())
+        predicted = int((predictions == idx).sum())
+        true_positive = int(((predictions == idx) & (labels == idx)).sum())
+        per_class[name] = {
+            "support": support,
+            "recall": true_positive / support if support else None,
+            "precision": true_positive / predicted if predicted else None
+        }
+
+    # Expected calibration error по равным интервалам уверенности
+    bins = np.minimum((confidences * n_bins).astype(np.int64), n_bins - 1)
+    ece = 0.0
+    for b in range(n_bins):
+        mask = bins == b
+        if mask.any():
+            ece += mask.mean() * abs(correct[mask].mean() - confidences[mask].mean())
+
+    one_hot = np.eye(probabilities.shape[1])[labels]
+    true_probabilities = np.clip(probabilities[np.arange(len(labels)), labels], 1e-12, 1.0)
+
+    recalls = [m["recall"] for m in per_class.values() if m["recall"] is not None]
+    return {
+        "samples": int(len(labels)),
+        "accuracy": float(correct.mean()) if len(labels) else None,
+        "balanced_accuracy": float(np.mean(recalls)) if recalls else None,
+        "per_class": per_class,
+        "calibration": {
+            "ece": float(ece),
+            "brier": float(((probabilities - one_hot) ** 2).sum(axis=1).mean()),
+            "nll": float(-np.log(true_probabilities).mean())
+        }
+    }
+
+
+def latency_summary(batch_latencies: List[float], batch_sizes: List[int]) -> Dict:
+    """Throughput and per-batch latency percentiles (seconds in, milliseconds out)"""
+    latencies = np.asarray(batch_latencies)
+    total_time = float(latencies.sum())
+    return {
+        "batches": len(latencies),
+        "throughput_per_s": sum(batch_sizes) / total_time if total_time else None,
+        "batch_latency_ms": {
+            "p50": float(np.percentile(latencies, 50) * 1000),
+            "p95": float(np.percentile(latencies, 95) * 1000),
+            "p99": float(np.percentile(latencies, 99) * 1000),
+            "max": float(latencies.max() * 1000)
+        } if len(latencies) else None,
+        "per_sample_ms": 1000 * total_time / sum(batch_sizes) if batch_sizes else None
+    }
@@ -0,0 +1,126 @@
+import io
+import threading
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class ExplanationInput(NamedTuple):
+    image: np.ndarray       # uint8 (H, W, 3), model input size
+    metadata: np.ndarray    # float32 (meta_dim,)
+    class_index: int        # explained class (the predicted one)
+
+
+class ExplanationStore:
+    """
+    Bounded LRU stores behind lazy explanations.
+
+    Every prediction registers its preprocessed uint8 input under an explanation
+    id, so a later /explain/{id} request needs neither a re-upload nor a
+    re-decode. Rendered heatmaps are cached as compressed PNG bytes in a
+    separate, smaller LRU. Both are in-memory and per process; the input LRU
+    is steady-state memory outside the per-request MemoryBudget, about
+    max_inputs x 180 KB at the default 300x200 input (~90 MB for 512).
+    """
+
+    def __init__(self, max_inputs: int = 512, max_heatmaps: int = 256):
+        self.max_inputs = max_inputs
+        self.max_heatmaps = max_heatmaps
+
+        self._lock = threading.Lock()
+        self._inputs: "OrderedDict[str, ExplanationInput]" = OrderedDict()
+        self._heatmaps: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._stats = {"registered": 0, "input_evictions": 0, "heatmap_hits": 0,
+                       "heatmap_misses": 0, "heatmap_evictions": 0}
+
+    def put(self, image: np.ndarray, metadata: np.ndarray, class_index: int) -> str:
+        """Register a preprocessed input and return its explanation id"""
+        explanation_id = uuid.uuid4().hex
+        entry = ExplanationInput(image, np.asarray(metadata, dtype='float32'), int(class_index))
+
+        with self._lock:
+            self._inputs[explanation_id] = entry
+            self._stats["registered"] += 1
+            while len(self._inputs) > self.max_inputs:
+                self._inputs.popitem(last=False)
+                self._stats["input_evictions"] += 1
+        return explanation_id
+
+    def get(self, explanation_id: str) -> Optional[ExplanationInput]:
+        with self._lock:
+            entry = self._inputs.get(explanation_id)
+            if entry is not None:
+                self._inputs.move_to_end(explanation_id)
+            return entry
+
+    def get_heatmap(self, explanation_id: str, overlay: bool = True) -> Optional[bytes]:
+        key = (explanation_id, overlay)
+        with self._lock:
+            png = self._heatmaps.get(key)
+            if png is None:
+                self._stats["heatmap_misses"] += 1
+                return None
+            self._heatmaps.move_to_end(key)
+            self._stats["heatmap_hits"] += 1
+            return png
+
+    def put_heatmap(self, explanation_id: str, overlay: bool, png: bytes) -> None:
+        with self._lock:
+            self._heatmaps[(explanation_id, overlay)] = png
+            self._heatmaps.move_to_end((explanation_id, overlay))
+            while len(self._heatmaps) > self.max_heatmaps:
+                self._heatmaps.popitem(last=False)
+                self._stats["heatmap_evictions"] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            inputs = len(self._inputs)
+            heatmaps = len(self._heatmaps)
+            input_bytes = sum(entry.image.nbytes + entry.metadata.nbytes for entry in self._inputs.values())
+            heatmap_bytes = sum(len(png) for png in self._heatmaps.values())
+            stats = dict(self._stats)
+
+        lookups = stats["heatmap_hits"] + stats["heatmap_misses"]
+        return {
+            "inputs": inputs,
+            "max_inputs": self.max_inputs,
+            "input_bytes": input_bytes,
+            "heatmaps": heatmaps,
+            "max_heatmaps": self.max_heatmaps,
+            "heatmap_bytes": heatmap_bytes,
+            "heatmap_hit_rate": stats["heatmap_hits"] / lookups if lookups else 0.0,
+            **stats
+        }
+
+
+def _colormap(values: np.ndarray) -> np.ndarray:
+    """Map values in [0, 1] to uint8 RGB with a jet-like colormap"""
+    r = np.clip(1.5 - np.abs(4 * values - 3), 0, 1)
+    g = np.clip(1.5 - np.abs(4 * values - 2), 0, 1)
+    b = np.clip(1.5 - np.abs(4 * values - 1), 0, 1)
+    return (np.stack([r, g, b], axis=-1) * 255).astype(np.uint8)
+
+
+def render_heatmap(image: np.ndarray, cam: np.ndarray, overlay: bool = True, alpha: float = 0.45) -> bytes:
+    """
+    Render a Grad-CAM map as PNG bytes
+
+    cam is a (h, w) map in [0, 1] at conv-layer resolution; it is upsampled to
+    the image size. With overlay=True the colored map is blended over the image.
+    """
+    height, width = image.shape[:2]
+    cam_image = Image.fromarray((np.clip(cam, 0, 1) * 255).astype(np.uint8)).resize((width, height), Image.BILINEAR)
+    heatmap = _colormap(np.asarray(cam_image, dtype=np.float32) / 255.0)
+
+    if overlay:
+        heatmap = (alpha * heatmap + (1 - alpha) * image.astype(np.float32)).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(heatmap).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from app.utils.image_processor import ImageProcessor
+from app.utils.memory_budget import estimate_decode_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class LatestSlot:
+    """
+    Single-value mailbox: a new value replaces an unread one, so a slow
+    consumer always receives the most recent value instead of a growing queue
+    """
+
+    def __init__(self):
+        self._value = None
+        self._event = asyncio.Event()
+        self.overwritten = 0
+
+    def put(self, value: Any) -> None:
+        if self._event.is_set():
+            self.overwritten += 1
+        self._value = value
+        self._event.set()
+
+    async def get(self) -> Any:
+        await self._event.wait()
+        self._event.clear()
+        value, self._value = self._value, None
+        return value
+
+
+class Frame(NamedTuple):
+    seq: int
+    image: Image.Image
+    frame_hash: int
+    received_at: float
+    decoded_at: float
+    reservation: Any = None  # MemoryReservation, held until the frame is classified or dropped
+    input_sha256: Optional[str] = None
+
+
+class FrameSession:
+    """
+    State of one streaming dermatoscope session.
+
+    Frames that are near-duplicates (by perceptual hash) of the last classified
+    frame are skipped. At most one frame per session is in inference at a time;
+    while it runs, only the newest incoming frame is kept as pending. Inference
+    goes through a shared InferenceBatcher, so frames from concurrent sessions
+    are merged into the same batches.
+
+    Frames are decoded straight to target_size, like /predict uploads, and
+    with a memory_budget every frame reserves its decode peak before decoding
+    and held_bytes afterwards; a frame that does not fit is dropped.
+
+    With audit set, every successful result is passed to
+    audit(input_sha256, metadata, result) from a worker thread, like the
+    predictions of the HTTP endpoints.
+    """
+
+    def __init__(self, batcher, metadata: List[float], dedup_distance: int = 4,
+                 session_id: Optional[str] = None, target_size: Optional[Tuple[int, int]] = None,
+                 memory_budget=None, held_bytes: int = 0,
+                 audit: Optional[Callable[[Optional[str], List[float], Dict], Any]] = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.batcher = batcher
+        self.metadata = metadata
+        self.dedup_distance = dedup_distance
+        self.target_size = target_size
+        self.memory_budget = memory_budget
+        self.held_bytes = held_bytes
+        self.audit = audit
+        self.results = LatestSlot()
+
+        self._last_hash: Optional[int] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._pending: Optional[Frame] = None
+        self._stats = {"received": 0, "skipped": 0, "superseded": 0, "classified": 0, "errors": 0,
+                       "rejected": 0}
+
+    def _decode(self, data: bytes):
+        image = ImageProcessor.load_image(data, self.target_size)
+        if image is None:
+            return None, None, None
+        input_sha256 = hashlib.sha256(data).hexdigest() if self.audit is not None else None
+        return image, ImageProcessor.perceptual_hash(image), input_sha256
+
+    def _estimate_bytes(self, data: bytes) -> int:
+        header = ImageProcessor.peek_image(data)
+        decode_bytes = estimate_decode_bytes(header[0], header[1], self.target_size, header[2]) if header else 0
+        return len(data) + decode_bytes + self.held_bytes
+
+    @staticmethod
+    async def _release(frame: Optional[Frame]) -> None:
+        if frame is not None and frame.reservation is not None:
+            await frame.reservation.release()
+
+    def _is_duplicate(self, frame_hash: int) -> bool:
+        return self._last_hash is not None and \
+            ImageProcessor.hamming_distance(frame_hash, self._last_hash) <= self.dedup_distance
+
+    async def on_frame(self, data: bytes) -> None:
+        """Handle an incoming encoded frame"""
+        received_at = time.perf_counter()
+        self._stats["received"] += 1
+        seq = self._stats["received"]
+
+        reservation = None
+        if self.memory_budget is not None:
+            try:
+                reservation = await self.memory_budget.reserve(self._estimate_bytes(data))
+            except TimeoutError as e:
+                self._stats["rejected"] += 1
+                self.results.put({"type": "error", "seq": seq, "error": str(e)})
+                return
+
+        try:
+            image, frame_hash, input_sha256 = await asyncio.get_running_loop().run_in_executor(None, self._decode, data)
+        except BaseException:
+            if reservation is not None:
+                await reservation.release()
+            raise
+        del data
+        frame = Frame(seq, image, frame_hash, received_at, time.perf_counter(), reservation, input_sha256)
+
+        if image is None:
+            await self._release(frame)
+            self._stats["errors"] += 1
+            self.results.put({"type": "error", "seq": seq, "error": "Invalid image frame"})
+            return
+
+        if self._is_duplicate(frame_hash):
+            await self._release(frame)
+            self._stats["skipped"] += 1
+            return
+
+        if reservation is not None:
+            await reservation.resize(self.held_bytes)
+        if self._inflight is not None:
+            if self._pending is not None:
+                self._stats["superseded"] += 1
+                await self._release(self._pending)
+            self._pending = frame
+            return
+
+        self._start(frame)
+
+    def update_metadata(self, metadata: List[float]) -> None:
+        """Use new metadata from the next frame on; an unchanged frame is classified again"""
+        self.metadata = metadata
+        self._last_hash = None
+
+    def _start(self, frame: Frame) -> None:
+        self._last_hash = frame.frame_hash
+        self._inflight = asyncio.get_running_loop().create_task(self._classify(frame))
+
+    async def _classify(self, frame: Frame) -> None:
+        try:
+            submitted_at = time.perf_counter()
+            metadata = self.metadata
+            result = await self.batcher.submit((frame.image, metadata), priority="interactive")
+            finished_at = time.perf_counter()
+
+            self._stats["classified"] += 1
+            self.results.put({
+                "type": "result",
+                "session_id": self.session_id,
+                "seq": frame.seq,
+                "result": result,
+                "latency": {
+                    "decode_ms": 1000 * (frame.decoded_at - frame.received_at),
+                    "inference_ms": 1000 * (finished_at - submitted_at),
+                    "server_ms": 1000 * (finished_at - frame.received_at)
+                },
+                "_received_at": frame.received_at
+            })
+            # Запись аудита после отправки результата, чтобы не задерживать клиента
+            if self.audit is not None and result.get("success"):
+                await asyncio.get_running_loop().run_in_executor(None, self.audit, frame.input_sha256,
+                                                                 metadata, result)
+        except Exception as e:
+            logger.error(f"Stream session {self.session_id} error: {str(e)}")
+            self._stats["errors"] += 1
+            self.results.put({"type": "error", "seq": frame.seq, "error": str(e)})
+        finally:
+            await self._release(frame)
+            self._inflight = None
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                if self._is_duplicate(pending.frame_hash):
+                    self._stats["skipped"] += 1
+                    await self._release(pending)
+                else:
+                    self._start(pending)
+
+    async def next_message(self) -> Dict:
+        """Wait for the latest result and stamp it for sending"""
+        message = await self.results.get()
+        received_at = message.pop("_received_at", None)
+        if received_at is not None:
+            message["latency"]["total_ms"] = 1000 * (time.perf_counter() - received_at)
+        message["sent_at"] = datetime.now(timezone.utc).isoformat()
+        message["stats"] = self.get_stats()
+        return message
+
+    async def close(self) -> None:
+        """Cancel in-flight work and release memory reservations"""
+        pending, self._pending = self._pending, None
+        await self._release(pending)
+        if self._inflight is not None:
+            self._inflight.cancel()
+            try:
+                await self._inflight
+            except asyncio.CancelledError:
+                pass
+
+    def get_stats(self) -> Dict:
+        return {**self._stats, "results_overwritten": self.results.overwritten}
@@ -1,7 +1,7 @@
 from PIL import Image
 import io
 import logging
-from typing import Optional, Dict
+from typing import BinaryIO, Dict, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
@@ -24,20 +24,49 @@ class ImageProcessor:
             return False
     
     @staticmethod
-    def load_image(image_data: bytes) -> Optional[Image.Image]:
+    def load_image(image_data: Union[bytes, BinaryIO],
+                   target_size: Optional[Tuple[int, int]] = None) -> Optional[Image.Image]:
         """
-        Load image from bytes and convert to RGB
+        Load image from bytes or a binary file and convert to RGB
+        
+        With target_size (width, height) the image is resized right after
+        decoding, and JPEGs are decoded in draft mode at the smallest DCT scale
+        that still covers the target, so the full-resolution bitmap never exists.
         """
         try:
-            image = Image.open(io.BytesIO(image_data))
+            source = io.BytesIO(image_data) if isinstance(image_data, (bytes, bytearray)) else image_data
+            image = Image.open(source)
+            if target_size is not None:
+                image.draft('RGB', target_size)
             # Convert to RGB if necessary
             if image.mode != 'RGB':
                 image = image.convert('RGB')
+            if target_size is not None and image.size != tuple(target_size):
+                image = image.resize(target_size)
+            else:
+                image.load()
             return image
         except Exception as e:
             logger.error(f"Error loading image: {str(e)}")
             return None
     
+    @staticmethod
+    def peek_image(image_data: Union[bytes, BinaryIO]) -> Optional[Tuple[str, Tuple[int, int], str]]:
+        """
+        Read (format, size, mode) from the image header without decoding pixels
+        
+        A file object is rewound afterwards.
+        """
+        source = io.BytesIO(image_data) if isinstance(image_data, (bytes, bytearray)) else image_data
+        position = source.tell()
+        try:
+            image = Image.open(source)
+            return image.format, image.size, image.mode
+        except Exception:
+            return None
+        finally:
+            source.seek(position)
+    
     @staticmethod
     def get_image_info(image: Image.Image) -> Dict:
         """
@@ -54,4 +83,26 @@ class ImageProcessor:
         """
         Validate image meets minimum size requirements
         """
-        return image.size[0] >= min_size[0] and image.size[1] >= min_size[1]
\ No newline at end of file
+        return image.size[0] >= min_size[0] and image.size[1] >= min_size[1]
+    
+    @staticmethod
+    def perceptual_hash(image: Image.Image, hash_size: int = 8) -> int:
+        """
+        Compute difference hash (dHash) of an image as a hash_size**2-bit integer
+        """
+        small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+        pixels = list(small.getdata())
+        
+        value = 0
+        for row in range(hash_size):
+            offset = row * (hash_size + 1)
+            for col in range(hash_size):
+                value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        return value
+    
+    @staticmethod
+    def hamming_distance(hash_a: int, hash_b: int) -> int:
+        """
+        Number of differing bits between two perceptual hashes
+        """
+        return bin(hash_a ^ hash_b).count('1')
\ No newline at end of file
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import sys
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """Current and peak resident set size of this process, bytes"""
+    rss, peak = None, None
+    try:
+        with open(f"/proc/{os.getpid()}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        try:
+            import resource
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = maxrss if sys.platform == "darwin" else maxrss * 1024
+        except ImportError:
+            pass
+    return {"rss_bytes": rss, "peak_rss_bytes": peak}
+
+
+def estimate_decode_bytes(image_format: Optional[str], size: Tuple[int, int],
+                          target_size: Optional[Tuple[int, int]], mode: Optional[str] = None) -> int:
+    """
+    Peak bytes of decoding an image of the given header size
+
+    JPEGs decoded in draft mode towards target_size shrink by the largest DCT
+    scale (1/2, 1/4, 1/8) that still covers the target. A mode conversion keeps
+    the decoded and the converted bitmap alive at once.
+    """
+    width, height = size
+    if target_size is not None and image_format == "JPEG":
+        scale = 1
+        while scale < 8 and width // (scale * 2) >= target_size[0] and height // (scale * 2) >= target_size[1]:
+            scale *= 2
+        width, height = -(-width // scale), -(-height // scale)
+
+    decoded = width * height * 4  # 4 байта на пиксель с запасом на RGBA/CMYK
+    if mode is not None and mode not in ("RGB", "YCbCr") and image_format != "JPEG":
+        decoded += width * height * 3
+    return decoded
+
+
+class MemoryReservation:
+    """Bytes held by one admitted request; shrink it once the large buffers are gone"""
+
+    def __init__(self, budget: "MemoryBudget", nbytes: int):
+        self._budget = budget
+        self.nbytes = nbytes
+
+    async def resize(self, nbytes: int) -> None:
+        await self._budget._resize(self, nbytes)
+
+    async def release(self) -> None:
+        await self._budget._resize(self, 0)
+
+    async def __aenter__(self) -> "MemoryReservation":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.release()
+
+
+class MemoryBudget:
+    """
+    Admission control by estimated request memory.
+
+    A request reserves its expected peak (compressed input, decoded bitmap and
+    the tensors it keeps until inference) before decoding and waits while the
+    sum of reservations would exceed limit_bytes. After decoding the
+    reservation shrinks to what the request still holds. A request larger than
+    the whole budget is admitted when nothing else is reserved rather than
+    rejected. limit_bytes=None only tracks reservations.
+    """
+
+    def __init__(self, limit_bytes: Optional[int], timeout_s: float = 10.0):
+        self.limit_bytes = limit_bytes
+        self.timeout_s = timeout_s
+        self._condition: Optional[asyncio.Condition] = None
+        self._reserved = 0
+        self._stats = {"admitted": 0, "waited": 0, "rejected": 0, "peak_reserved_bytes": 0}
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Создаём в работающем цикле событий, а не при импорте модуля
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.limit_bytes is None or self._reserved == 0 or self._reserved + nbytes <= self.limit_bytes
+
+    async def reserve(self, nbytes: int) -> MemoryReservation:
+        """
+        Wait until nbytes fit into the budget; raises TimeoutError after timeout_s
+
+        Use as "async with await budget.reserve(n) as reservation:".
+        """
+        condition = self._get_condition()
+        async with condition:
+            if not self._fits(nbytes):
+                self._stats["waited"] += 1
+                try:
+                    await asyncio.wait_for(condition.wait_for(lambda: self._fits(nbytes)), self.timeout_s)
+                except asyncio.TimeoutError:
+                    self._stats["rejected"] += 1
+                    raise TimeoutError(f"Memory budget exhausted: {self._reserved} of {self.limit_bytes} bytes "
+                                       f"reserved, request needs {nbytes}")
+            self._reserved += nbytes
+            self._stats["admitted"] += 1
+            self._stats["peak_reserved_bytes"] = max(self._stats["peak_reserved_bytes"], self._reserved)
+        return MemoryReservation(self, nbytes)
+
+    async def _resize(self, reservation: MemoryReservation, nbytes: int) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self._reserved += nbytes - reservation.nbytes
+            reservation.nbytes = nbytes
+            self._stats["peak_reserved_bytes"] = max(self._stats["peak_reserved_bytes"], self._reserved)
+            condition.notify_all()
+
+    def get_stats(self) -> Dict:
+        return {
+            "limit_bytes": self.limit_bytes,
+            "reserved_bytes": self._reserved,
+            "timeout_s": self.timeout_s,
+            **self._stats,
+            "process": process_memory()
+        }
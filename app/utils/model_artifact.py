@@ -0,0 +1,133 @@
+"""
+Serving artifact format for fast model loading.
+
+An artifact is a directory with:
+    manifest.json      - format version, source model, weight index (name, dtype, shape, offset)
+    architecture.json  - Keras model architecture (model.to_json())
+    weights.bin        - all weights concatenated as raw little-endian arrays, 64-byte aligned
+
+weights.bin is memory-mapped on load, which skips HDF5 parsing and reads the
+weights straight from the page cache. set_weights() still copies them into
+TensorFlow variables, so every worker process holds its own copy of the weights;
+the artifact speeds up loading, it does not share weight memory between workers.
+"""
+
+import json
+import os
+import shutil
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+ARCHITECTURE_NAME = "architecture.json"
+WEIGHTS_NAME = "weights.bin"
+ALIGNMENT = 64
+
+
+def is_artifact(path: Optional[str]) -> bool:
+    """Check whether a path is a serving artifact directory"""
+    return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_artifact(model: tf.keras.Model, directory: str, source_path: Optional[str] = None) -> Dict:
+    """Write a Keras model as a serving artifact, replacing the directory atomically"""
+    tmp_directory = directory.rstrip(os.sep) + ".tmp"
+    if os.path.exists(tmp_directory):
+        shutil.rmtree(tmp_directory)
+    os.makedirs(tmp_directory)
+
+    weights_index = []
+    offset = 0
+    with open(os.path.join(tmp_directory, WEIGHTS_NAME), "wb") as f:
+        for variable, value in zip(model.weights, model.get_weights()):
+            value = np.ascontiguousarray(value)
+            padding = -offset % ALIGNMENT
+            f.write(b"\0" * padding)
+            offset += padding
+
+            f.write(value.astype(value.dtype.newbyteorder("<"), copy=False).tobytes())
+            weights_index.append({
+                "name": variable.name,
+                "dtype": value.dtype.str.lstrip("<>|="),
+                "shape": list(value.shape),
+                "offset": offset
+            })
+            offset += value.nbytes
+
+    with open(os.path.join(tmp_directory, ARCHITECTURE_NAME), "w", encoding="utf-8") as f:
+        f.write(model.to_json())
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "source": os.path.basename(source_path) if source_path else None,
+        "source_sha256": file_sha256(source_path) if source_path else None,
+        "tensorflow_version": tf.__version__,
+        "weights_bytes": offset,
+        "weights": weights_index
+    }
+    with open(os.path.join(tmp_directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_directory, directory)
+
+    return manifest
+
+
+def read_manifest(directory: str) -> Dict:
+    """Read and check artifact manifest"""
+    with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version: {manifest.get('format_version')}")
+    return manifest
+
+
+def map_weights(directory: str, manifest: Dict) -> List[np.ndarray]:
+    """Memory-map weights as read-only array views into weights.bin"""
+    buffer = np.memmap(os.path.join(directory, WEIGHTS_NAME), dtype=np.uint8, mode="r")
+
+    weights = []
+    for entry in manifest["weights"]:
+        dtype = np.dtype(entry["dtype"]).newbyteorder("<")
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        weights.append(np.frombuffer(buffer, dtype=dtype, count=count, offset=entry["offset"]).reshape(entry["shape"]))
+    return weights
+
+
+def layer_names(directory: str) -> List[str]:
+    """Layer names from the artifact architecture, without building the model"""
+    with open(os.path.join(directory, ARCHITECTURE_NAME), encoding="utf-8") as f:
+        architecture = json.load(f)
+    return [layer.get("name") or layer["config"]["name"] for layer in architecture["config"]["layers"]]
+
+
+def build_model(directory: str, manifest: Optional[Dict] = None) -> tf.keras.Model:
+    """Rebuild a Keras model from a serving artifact"""
+    manifest = manifest or read_manifest(directory)
+
+    with open(os.path.join(directory, ARCHITECTURE_NAME), encoding="utf-8") as f:
+        model = tf.keras.models.model_from_json(f.read())
+
+    # Веса копируются в переменные TF; отображение файла после этого не удерживается
+    model.set_weights(map_weights(directory, manifest))
+    return model
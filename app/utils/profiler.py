@@ -0,0 +1,290 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import shutil
+import threading
+import tracemalloc
+import uuid
+import logging
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Файлы пути декодирования и препроцессинга для снимков tracemalloc
+TRACEMALLOC_FILTERS = ("*image_processor.py", "*model_manager.py", "*PIL*", "*numpy*")
+
+
+class ProfilingController:
+    """
+    On-demand profiling of the live request path.
+
+    A capture runs for a bounded time window or number of requests and collects:
+        python.prof      - cProfile stats of sampled calls (pstats format)
+        python_top.txt   - cumulative-time summary of python.prof
+        tracemalloc.txt  - peak traced memory and allocation growth of the decode
+                           and preprocessing path over the window (opt-in)
+        tf_trace/        - TensorFlow profiler trace (open in TensorBoard)
+    and is packed into <capture_id>.zip for download.
+
+    cProfile supports only one active profiler at a time, so a call is profiled
+    only if no other call is being profiled; concurrent calls run unprofiled.
+
+    tracemalloc hooks every allocation of the whole process, so it is off unless
+    a capture asks for it, and then runs only for a window of at most
+    max_tracemalloc_s seconds at the start of the capture.
+    """
+
+    def __init__(self, output_dir: str, enabled: bool = False, max_duration_s: float = 120.0,
+                 max_requests: int = 1000, tracemalloc_frames: int = 10, max_tracemalloc_s: float = 10.0):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.max_duration_s = max_duration_s
+        self.max_requests = max_requests
+        self.tracemalloc_frames = tracemalloc_frames
+        self.max_tracemalloc_s = max_tracemalloc_s
+
+        self._lock = threading.Lock()
+        self._call_lock = threading.Lock()
+        self._capture: Optional[Dict] = None
+        self._stats: Optional[pstats.Stats] = None
+        self._timer: Optional[threading.Timer] = None
+        self._tf_trace = False
+        self._started_tracemalloc = False
+        self._tracemalloc_timer: Optional[threading.Timer] = None
+        self._tracemalloc_start: Optional[tracemalloc.Snapshot] = None
+        self._tracemalloc_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._tracemalloc_memory: Optional[tuple] = None
+
+    @property
+    def active(self) -> bool:
+        return self._capture is not None
+
+    def start(self, duration_s: Optional[float] = None, requests: Optional[int] = None,
+              tf_trace: bool = True, tracemalloc_s: Optional[float] = None) -> Dict:
+        """
+        Start a capture; it ends after duration_s seconds or `requests` requests, whichever comes first
+
+        tracemalloc_s > 0 traces allocations for that many seconds (capped by max_tracemalloc_s).
+        """
+        if not self.enabled:
+            raise RuntimeError("Profiling is disabled")
+
+        with self._lock:
+            if self._capture is not None:
+                raise RuntimeError(f"Capture {self._capture['capture_id']} is already running")
+
+            duration_s = min(duration_s or self.max_duration_s, self.max_duration_s)
+            requests = min(requests or self.max_requests, self.max_requests)
+
+            capture_id = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+            directory = os.path.join(self.output_dir, capture_id)
+            os.makedirs(directory, exist_ok=True)
+
+            self._capture = {
+                "capture_id": capture_id,
+                "directory": directory,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "duration_s": duration_s,
+                "max_requests": requests,
+                "requests": 0,
+                "profiled_calls": 0,
+                "skipped_calls": 0,
+                "tracemalloc_s": None
+            }
+            self._stats = None
+            self._tracemalloc_start = self._tracemalloc_snapshot = self._tracemalloc_memory = None
+            self._tf_trace = tf_trace and self._start_tf_trace(directory)
+
+            if tracemalloc_s and tracemalloc_s > 0:
+                window = min(tracemalloc_s, self.max_tracemalloc_s, duration_s)
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.tracemalloc_frames)
+                    self._started_tracemalloc = True
+                # Кратковременные буферы к концу окна уже освобождены: их видно по пику,
+                # а рост - по разнице со снимком начала окна
+                tracemalloc.reset_peak()
+                self._tracemalloc_start = tracemalloc.take_snapshot()
+                self._capture["tracemalloc_s"] = window
+                self._tracemalloc_timer = threading.Timer(window, self._stop_tracemalloc)
+                self._tracemalloc_timer.daemon = True
+                self._tracemalloc_timer.start()
+
+            self._timer = threading.Timer(duration_s, self.finish)
+            self._timer.daemon = True
+            self._timer.start()
+
+            logger.info(f"Profiling capture {capture_id} started: {duration_s} s / {requests} requests")
+            return self._public_capture()
+
+    def _stop_tracemalloc(self) -> None:
+        """End the allocation tracing window, keeping its end snapshot and peak for the capture"""
+        with self._lock:
+            if self._tracemalloc_timer is not None:
+                self._tracemalloc_timer.cancel()
+                self._tracemalloc_timer = None
+            if self._tracemalloc_snapshot is None and tracemalloc.is_tracing():
+                self._tracemalloc_memory = tracemalloc.get_traced_memory()
+                self._tracemalloc_snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+    @staticmethod
+    def _start_tf_trace(directory: str) -> bool:
+        try:
+            import tensorflow as tf
+            tf.profiler.experimental.start(os.path.join(directory, "tf_trace"))
+            return True
+        except Exception as e:
+            logger.warning(f"TensorFlow trace is not available: {str(e)}")
+            return False
+
+    @staticmethod
+    def _stop_tf_trace() -> None:
+        try:
+            import tensorflow as tf
+            tf.profiler.experimental.stop()
+        except Exception as e:
+            logger.warning(f"Error stopping TensorFlow trace: {str(e)}")
+
+    def profile(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn, profiling it if a capture is active and no other call is being profiled"""
+        capture = self._capture
+        if capture is None:
+            return fn(*args, **kwargs)
+
+        if not self._call_lock.acquire(blocking=False):
+            with self._lock:
+                capture["skipped_calls"] += 1
+            return fn(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Другой профилировщик уже активен в процессе
+            self._call_lock.release()
+            with self._lock:
+                capture["skipped_calls"] += 1
+            return fn(*args, **kwargs)
+
+        try:
+            with self._tf_trace_context(stage):
+                return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self._call_lock.release()
+            with self._lock:
+                if self._capture is capture:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profiler)
+                    else:
+                        self._stats.add(profiler)
+                    capture["profiled_calls"] += 1
+
+    def _tf_trace_context(self, stage: str):
+        if not self._tf_trace:
+            return nullcontext()
+        import tensorflow as tf
+        return tf.profiler.experimental.Trace(stage)
+
+    def request_finished(self) -> None:
+        """Count a finished request; ends the capture when its request budget is reached"""
+        capture = self._capture
+        if capture is None:
+            return
+
+        with self._lock:
+            capture["requests"] += 1
+            done = capture["requests"] >= capture["max_requests"]
+        if done:
+            threading.Thread(target=self.finish, daemon=True).start()
+
+    def finish(self) -> Optional[Dict]:
+        """Stop the active capture and write its artifacts"""
+        with self._lock:
+            capture, self._capture = self._capture, None
+            if capture is None:
+                return None
+            stats, self._stats = self._stats, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        # Ждём завершения профилируемого вызова, если он ещё идёт
+        with self._call_lock:
+            pass
+
+        directory = capture["directory"]
+        try:
+            if self._tf_trace:
+                self._stop_tf_trace()
+                self._tf_trace = False
+
+            if capture.get("tracemalloc_s"):
+                self._stop_tracemalloc()
+                if self._tracemalloc_snapshot is not None and self._tracemalloc_start is not None:
+                    self._write_tracemalloc(self._tracemalloc_start, self._tracemalloc_snapshot,
+                                            self._tracemalloc_memory, os.path.join(directory, "tracemalloc.txt"))
+                self._tracemalloc_start = self._tracemalloc_snapshot = self._tracemalloc_memory = None
+
+            if stats is not None:
+                stats.dump_stats(os.path.join(directory, "python.prof"))
+                summary = io.StringIO()
+                pstats.Stats(os.path.join(directory, "python.prof"), stream=summary) \
+                    .sort_stats("cumulative").print_stats(60)
+                with open(os.path.join(directory, "python_top.txt"), "w", encoding="utf-8") as f:
+                    f.write(summary.getvalue())
+
+            capture["finished_at"] = datetime.now(timezone.utc).isoformat()
+            with open(os.path.join(directory, "capture.json"), "w", encoding="utf-8") as f:
+                json.dump({k: v for k, v in capture.items() if k != "directory"}, f, indent=2)
+
+            shutil.make_archive(directory, "zip", directory)
+            logger.info(f"Profiling capture {capture['capture_id']} finished")
+        except Exception as e:
+            logger.error(f"Error writing profiling capture {capture['capture_id']}: {str(e)}")
+
+        return capture
+
+    @staticmethod
+    def _write_tracemalloc(start: tracemalloc.Snapshot, end: tracemalloc.Snapshot, memory: Optional[tuple],
+                           path: str, limit: int = 50) -> None:
+        filters = [tracemalloc.Filter(True, pattern, all_frames=True) for pattern in TRACEMALLOC_FILTERS]
+        start, end = start.filter_traces(filters), end.filter_traces(filters)
+        with open(path, "w", encoding="utf-8") as f:
+            if memory is not None:
+                current, peak = memory
+                f.write(f"# Traced memory over the window: peak {peak / 1024:.1f} KiB, "
+                        f"at end {current / 1024:.1f} KiB (whole process)\n\n")
+            f.write(f"# Top {limit} allocation changes by lineno since the window started\n")
+            for stat in end.compare_to(start, "lineno")[:limit]:
+                f.write(f"{stat}\n")
+            f.write(f"\n# Top {limit} allocations alive at the end of the window by traceback\n")
+            for stat in end.statistics("traceback")[:limit]:
+                f.write(f"{stat}\n")
+                f.write("\n".join(stat.traceback.format()) + "\n")
+            f.write("\n")
+
+    def _public_capture(self) -> Dict:
+        return {k: v for k, v in self._capture.items() if k != "directory"}
+
+    def get_status(self) -> Dict:
+        """Get active capture and finished captures"""
+        captures: List[str] = []
+        if os.path.isdir(self.output_dir):
+            captures = sorted(name[:-4] for name in os.listdir(self.output_dir) if name.endswith(".zip"))
+        with self._lock:
+            active = self._public_capture() if self._capture is not None else None
+        return {"enabled": self.enabled, "active": active, "captures": captures}
+
+    def archive_path(self, capture_id: str) -> Optional[str]:
+        """Path of a finished capture archive"""
+        if os.path.basename(capture_id) != capture_id:
+            return None
+        path = os.path.join(self.output_dir, f"{capture_id}.zip")
+        return path if os.path.exists(path) else None
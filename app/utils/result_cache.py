@@ -0,0 +1,184 @@
+import copy
+import random
+import threading
+import time
+import logging
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Поля, относящиеся к конкретному запросу: в кеш не попадают
+REQUEST_FIELDS = ("explanation_id", "cache")
+
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    """Number of set bits of each uint64 value"""
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class NearDuplicateCache:
+    """
+    Result cache keyed by perceptual image hash and request metadata.
+
+    A request whose 64-bit dHash is within max_distance bits of a recent entry
+    with one of the requested keys (metadata tuple, TTA flag, model version,
+    model variant) reuses the stored result, so re-photographed, re-compressed
+    or resized copies of the same lesion skip inference. Entries live in a
+    fixed-size ring of NumPy arrays and the Hamming search is vectorized over
+    the entries of the matching keys.
+
+    A fraction audit_rate of matches is not served from the cache: the request
+    falls back to inference and the cached result is compared with the fresh one.
+    Such audit fallbacks are counted separately from hits.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_distance: int = 4, ttl_s: float = 600.0,
+                 audit_rate: float = 0.02):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl_s = ttl_s
+        self.audit_rate = audit_rate
+
+        self._lock = threading.Lock()
+        self._hashes = np.zeros(max_entries, dtype=np.uint64)
+        self._key_ids = np.full(max_entries, -1, dtype=np.int64)
+        self._stored_at = np.zeros(max_entries, dtype=np.float64)
+        self._results = [None] * max_entries
+        self._key_index: Dict[Hashable, int] = {}
+        self._next = 0
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "audit_fallbacks": 0, "stored": 0, "audits": 0,
+                       "audit_agreements": 0, "audit_prob_diff_sum": 0.0}
+
+    @staticmethod
+    def make_key(metadata, tta: Optional[bool], model_version: Optional[str],
+                 model_variant: Optional[str] = "primary") -> Tuple:
+        return tuple(float(value) for value in metadata), tta, model_version, model_variant
+
+    def _key_id(self, key: Hashable, create: bool) -> Optional[int]:
+        key_id = self._key_index.get(key)
+        if key_id is None and create:
+            key_id = len(self._key_index)
+            self._key_index[key] = key_id
+        return key_id
+
+    def lookup(self, image_hash: int, keys: Sequence[Hashable]) -> Optional[Tuple[Dict, int, bool]]:
+        """
+        Closest fresh entry within max_distance under any of keys, or None
+
+        Returns (result copy, distance, audit); with audit=True the match is
+        part of the audit sample and must not be served.
+        """
+        with self._lock:
+            self._stats["lookups"] += 1
+            key_ids = [key_id for key_id in (self._key_id(key, create=False) for key in keys) if key_id is not None]
+
+            match = None
+            if key_ids:
+                candidates = np.flatnonzero(
+                    np.isin(self._key_ids, key_ids) & (self._stored_at >= time.monotonic() - self.ttl_s)
+                )
+                if len(candidates):
+                    distances = _popcount64(self._hashes[candidates] ^ np.uint64(image_hash))
+                    best = int(np.argmin(distances))
+                    if distances[best] <= self.max_distance:
+                        audit = random.random() < self.audit_rate
+                        match = (copy.deepcopy(self._results[candidates[best]]), int(distances[best]), audit)
+
+            if match is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["audit_fallbacks" if match[2] else "hits"] += 1
+            return match
+
+    def record_audit(self, cached: Dict, fresh: Dict) -> None:
+        """
+        Compare a cached result with the fresh inference result for the same request
+
+        A fresh result served degraded (fast model only, under overload) is not
+        comparable with the cached full answer and is skipped.
+        """
+        if not fresh.get("success") or fresh.get("cascade", {}).get("stage") == "degraded":
+            return
+
+        def probabilities(result: Dict) -> np.ndarray:
+            classes = result["probabilities"]["diagnosis"]
+            return np.array([classes[k]["probability"] for k in sorted(classes, key=int)])
+
+        cached_probabilities, fresh_probabilities = probabilities(cached), probabilities(fresh)
+        agreed = cached["diagnosis"]["class"] == fresh["diagnosis"]["class"]
+        with self._lock:
+            self._stats["audits"] += 1
+            self._stats["audit_agreements"] += int(agreed)
+            self._stats["audit_prob_diff_sum"] += float(np.abs(cached_probabilities - fresh_probabilities).max())
+        if not agreed:
+            logger.warning(f"Near-duplicate cache audit mismatch: cached class {cached['diagnosis']['class']}, "
+                           f"fresh class {fresh['diagnosis']['class']}")
+
+    def store(self, image_hash: int, key: Hashable, result: Dict) -> None:
+        """
+        Store a successful result, overwriting the oldest entry when full
+
+        Request-specific fields are dropped: an explanation id refers to the
+        input of the request that produced the result, not to later hits.
+        """
+        if not result.get("success"):
+            return
+        result = {k: v for k, v in result.items() if k not in REQUEST_FIELDS}
+
+        with self._lock:
+            slot = self._next
+            self._next = (self._next + 1) % self.max_entries
+            self._hashes[slot] = np.uint64(image_hash)
+            self._key_ids[slot] = self._key_id(key, create=True)
+            self._stored_at[slot] = time.monotonic()
+            self._results[slot] = copy.deepcopy(result)
+            self._stats["stored"] += 1
+
+            # Ключи без живых записей не должны копиться бесконечно
+            if len(self._key_index) > 4 * self.max_entries:
+                self._compact_keys()
+
+    def _compact_keys(self) -> None:
+        live = set(self._key_ids[self._key_ids >= 0].tolist())
+        remap = {}
+        for key, key_id in list(self._key_index.items()):
+            if key_id in live:
+                remap[key_id] = len(remap)
+                self._key_index[key] = remap[key_id]
+            else:
+                del self._key_index[key]
+        self._key_ids = np.array([remap.get(k, -1) for k in self._key_ids.tolist()], dtype=np.int64)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._key_ids[:] = -1
+            self._results = [None] * self.max_entries
+            self._key_index.clear()
+            self._next = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = int((self._key_ids >= 0).sum())
+
+        audits = stats["audits"]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+            "ttl_s": self.ttl_s,
+            "lookups": stats["lookups"],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_rate": stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0,
+            "stored": stats["stored"],
+            "audit": {
+                "rate": self.audit_rate,
+                "fallbacks": stats["audit_fallbacks"],
+                "samples": audits,
+                "agreement_rate": stats["audit_agreements"] / audits if audits else None,
+                "mean_max_probability_diff": stats["audit_prob_diff_sum"] / audits if audits else None
+            }
+        }
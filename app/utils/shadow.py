@@ -0,0 +1,202 @@
+import queue
+import random
+import threading
+import time
+import logging
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MirroredItem(NamedTuple):
+    image: np.ndarray                   # uint8 (H, W, 3), copied from the primary request
+    metadata: np.ndarray                # float32 (meta_dim,)
+    primary_probabilities: np.ndarray   # probabilities of the production answer
+    primary_variant: Optional[str]      # primary / fast (cascade or degraded)
+    primary_ms: float                   # primary forward passes of this row (fast + full), without TTA
+
+
+class ShadowEvaluator:
+    """
+    Shadow evaluation of a candidate model on live traffic.
+
+    The primary batch hands over its already preprocessed uint8 tensors; a
+    sample_rate fraction of rows is put on a bounded queue (dropped when full,
+    never blocking the request) and a background thread runs them through the
+    candidate in batches. The candidate's answer is only recorded: class and
+    risk-level agreement with the production answer, probability differences
+    and per-item forward latency of both models. Primary latency counts only
+    the forward passes a row went through (fast stage and, if escalated, the
+    full model), so it is comparable with the candidate's single forward pass.
+    """
+
+    def __init__(self, candidate, sample_rate: float = 0.1, max_queue: int = 1024, batch_size: int = 16,
+                 stats_window: int = 5000):
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        num_classes = len(candidate.diagnosis_mapping)
+        self._risk_levels = np.array(
+            [candidate.danger_mapping[candidate.diagnosis_mapping[i]["name"]] for i in range(num_classes)]
+        )
+        self._confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self._primary_ms = deque(maxlen=stats_window)
+        self._candidate_ms = deque(maxlen=stats_window)
+        self._stats = {"offered": 0, "mirrored": 0, "dropped": 0, "compared": 0, "errors": 0,
+                       "class_agreements": 0, "risk_agreements": 0, "high_risk_misses": 0,
+                       "max_prob_diff_sum": 0.0}
+        self._by_variant: Dict[str, Dict[str, int]] = {}
+
+    def start(self) -> None:
+        """Start background candidate worker"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="shadow-worker", daemon=True)
+        self._thread.start()
+        logger.info(f"Shadow evaluation started: candidate {self.candidate.model_version}, "
+                    f"sample_rate={self.sample_rate}")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop the worker; queued items are discarded"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def offer(self, image_arrays: List[np.ndarray], metadata_batch: np.ndarray, results: List[Dict],
+              primary_ms: Sequence[float]) -> None:
+        """
+        Mirror a sample of a finished primary batch (called from the batch thread, never blocks)
+
+        primary_ms holds the per-row forward time of the primary batch.
+        """
+        for row, result in enumerate(results):
+            if not result.get("success"):
+                continue
+            self._count("offered")
+            if random.random() >= self.sample_rate:
+                continue
+
+            classes = result["probabilities"]["diagnosis"]
+            item = MirroredItem(
+                image_arrays[row].copy(),  # входные буферы батча переиспользуются
+                metadata_batch[row],
+                np.array([classes[str(i)]["probability"] for i in range(len(classes))]),
+                result.get("model_variant"),
+                float(primary_ms[row])
+            )
+            try:
+                self._queue.put_nowait(item)
+                self._count("mirrored")
+            except queue.Full:
+                self._count("dropped")
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def _drain(self, first: MirroredItem) -> List[MirroredItem]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = self._drain(first)
+            try:
+                started = time.perf_counter()
+                probabilities = self.candidate.predict_proba_preprocessed(
+                    np.stack([item.image for item in batch]),
+                    np.stack([item.metadata for item in batch])
+                )
+                candidate_ms = 1000 * (time.perf_counter() - started) / len(batch)
+                self._record(batch, probabilities, candidate_ms)
+            except Exception as e:
+                logger.error(f"Shadow candidate error: {str(e)}")
+                self._count("errors", len(batch))
+
+    def _record(self, batch: List[MirroredItem], probabilities: np.ndarray, candidate_ms: float) -> None:
+        primary = np.stack([item.primary_probabilities for item in batch])
+        primary_classes = primary.argmax(axis=1)
+        candidate_classes = probabilities.argmax(axis=1)
+        class_agreed = primary_classes == candidate_classes
+        primary_risk = self._risk_levels[primary_classes]
+        candidate_risk = self._risk_levels[candidate_classes]
+
+        with self._lock:
+            self._stats["compared"] += len(batch)
+            self._stats["class_agreements"] += int(class_agreed.sum())
+            self._stats["risk_agreements"] += int((primary_risk == candidate_risk).sum())
+            self._stats["high_risk_misses"] += int(((primary_risk >= 2) & (candidate_risk < 2)).sum())
+            self._stats["max_prob_diff_sum"] += float(np.abs(primary - probabilities).max(axis=1).sum())
+            np.add.at(self._confusion, (primary_classes, candidate_classes), 1)
+
+            for item, agreed in zip(batch, class_agreed):
+                variant = self._by_variant.setdefault(item.primary_variant or "primary", {"compared": 0, "agreements": 0})
+                variant["compared"] += 1
+                variant["agreements"] += int(agreed)
+                self._primary_ms.append(item.primary_ms)
+                self._candidate_ms.append(candidate_ms)
+
+    @staticmethod
+    def _percentiles(values) -> Optional[Dict]:
+        if not values:
+            return None
+        values = np.asarray(values)
+        return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+
+    def get_stats(self) -> Dict:
+        """Get agreement and latency comparison of the candidate against production answers"""
+        with self._lock:
+            stats = dict(self._stats)
+            confusion = self._confusion.tolist()
+            by_variant = {k: dict(v) for k, v in self._by_variant.items()}
+            primary_ms = self._percentiles(self._primary_ms)
+            candidate_ms = self._percentiles(self._candidate_ms)
+
+        compared = stats["compared"]
+        return {
+            "candidate_model_version": self.candidate.model_version,
+            "candidate_model_path": self.candidate.model_path,
+            "sample_rate": self.sample_rate,
+            "queue_depth": self._queue.qsize(),
+            "offered": stats["offered"],
+            "mirrored": stats["mirrored"],
+            "dropped": stats["dropped"],
+            "errors": stats["errors"],
+            "compared": compared,
+            "class_agreement": stats["class_agreements"] / compared if compared else None,
+            "risk_agreement": stats["risk_agreements"] / compared if compared else None,
+            "high_risk_misses": stats["high_risk_misses"],
+            "mean_max_probability_diff": stats["max_prob_diff_sum"] / compared if compared else None,
+            "agreement_by_primary_variant": {
+                variant: {**counts, "rate": counts["agreements"] / counts["compared"]}
+                for variant, counts in by_variant.items()
+            },
+            "confusion": confusion,  # строки - ответ production, столбцы - кандидат
+            "latency_ms_per_item": {
+                "primary": primary_ms,
+                "candidate": candidate_ms,
+                "delta_p50": candidate_ms["p50"] - primary_ms["p50"] if primary_ms and candidate_ms else None
+            }
+        }
@@ -0,0 +1,359 @@
+import json
+import os
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarityIndex:
+    """
+    In-process cosine similarity index over lesion embeddings.
+
+    Vectors are L2-normalized and stored as float16 in a memory-mapped file that
+    grows with incremental inserts. Until enough vectors are collected the index is
+    searched brute-force; after that an IVF coarse quantizer (k-means centroids with
+    inverted lists) is trained on a background thread and swapped in, so queries
+    only scan the nprobe closest lists. Rows inserted after training go to small
+    per-list pending buffers that are merged into the lists once they fill up.
+
+    Files in the index directory:
+        meta.json       - dim, count, capacity, training state
+        vectors.f16     - float16 matrix (capacity x dim)
+        assignments.i32 - IVF list of every row (capacity)
+        centroids.npy   - IVF centroids (nlist x dim)
+        cases.jsonl     - case id and payload of every row
+    """
+
+    def __init__(self, directory: str, nlist: int = 1024, nprobe: int = 8,
+                 train_size: Optional[int] = None, chunk_size: int = 65536, merge_threshold: int = 1024):
+        self.directory = directory
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size or nlist * 64
+        self.chunk_size = chunk_size
+        self.merge_threshold = merge_threshold
+
+        self.dim = None
+        self.count = 0
+        self.capacity = 0
+        self.vectors = None
+        self.assignments = None
+        self.centroids = None
+        self.cases: List[Dict] = []
+
+        self._lists: List[np.ndarray] = []
+        self._pending: List[List[int]] = []
+        self._lock = threading.RLock()
+        self._training_thread: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open(self) -> None:
+        """Open existing index files, if any"""
+        if not os.path.exists(self._path("meta.json")):
+            return
+
+        with open(self._path("meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self._map_files()
+
+        with open(self._path("cases.jsonl"), encoding="utf-8") as f:
+            lines = f.readlines()
+        self.cases = []
+        for line in lines[:self.count]:
+            # Оборванная при сбое последняя строка и всё после неё не считаются записанными
+            if not line.endswith("\n"):
+                break
+            try:
+                self.cases.append(json.loads(line))
+            except ValueError:
+                break
+        if len(lines) > len(self.cases):
+            # Записи, добавленные после последнего сохранения meta.json, отбрасываются
+            with open(self._path("cases.jsonl"), "w", encoding="utf-8") as f:
+                f.writelines(lines[:len(self.cases)])
+        if len(self.cases) < self.count:
+            logger.warning(f"Similarity index: {self.count - len(self.cases)} rows without a case record dropped")
+            self.count = len(self.cases)
+            self._write_meta()
+
+        if meta.get("trained") and os.path.exists(self._path("centroids.npy")):
+            self.centroids = np.load(self._path("centroids.npy"))
+            self.nlist = len(self.centroids)
+            self._build_lists()
+
+        logger.info(f"Similarity index opened: {self.count} cases from {self.directory}")
+
+    def _map_files(self) -> None:
+        self.vectors = np.memmap(self._path("vectors.f16"), dtype=np.float16, mode="r+",
+                                 shape=(self.capacity, self.dim))
+        self.assignments = np.memmap(self._path("assignments.i32"), dtype=np.int32, mode="r+",
+                                     shape=(self.capacity,))
+
+    def _grow(self, required: int) -> None:
+        """Extend memory-mapped files to hold at least `required` rows"""
+        new_capacity = max(required, self.capacity * 2, 1024)
+
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.assignments.flush()
+            self.vectors = self.assignments = None
+
+        for name, row_bytes in (("vectors.f16", self.dim * 2), ("assignments.i32", 4)):
+            with open(self._path(name), "ab") as f:
+                f.truncate(new_capacity * row_bytes)
+
+        self.capacity = new_capacity
+        self._map_files()
+
+    def _write_meta(self) -> None:
+        meta = {
+            "dim": self.dim,
+            "count": self.count,
+            "capacity": self.capacity,
+            "trained": self.centroids is not None
+        }
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _assign(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Assign normalized vectors to the closest IVF centroids"""
+        centroids = self.centroids if centroids is None else centroids
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    def _assign_rows(self, vectors: np.ndarray, start: int, stop: int, centroids: np.ndarray) -> np.ndarray:
+        assignments = np.empty(stop - start, dtype=np.int32)
+        for block_start in range(start, stop, self.chunk_size):
+            block_stop = min(block_start + self.chunk_size, stop)
+            block = np.asarray(vectors[block_start:block_stop], dtype=np.float32)
+            assignments[block_start - start:block_stop - start] = self._assign(block, centroids)
+        return assignments
+
+    def _build_lists(self) -> None:
+        """Rebuild inverted lists from stored assignments"""
+        assignments = np.asarray(self.assignments[:self.count])
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+        self._pending = [[] for _ in range(self.nlist)]
+
+    def _merge_pending(self, list_id: int) -> None:
+        """Move pending rows of an inverted list into the list itself"""
+        pending = np.asarray(self._pending[list_id], dtype=np.int64)
+        self._lists[list_id] = np.concatenate([self._lists[list_id], pending])
+        self._pending[list_id] = []
+
+    def train(self, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Train IVF centroids with k-means on a sample of stored vectors
+
+        The index lock is held only to take the sample and to install the
+        result; inserts and flat searches continue while k-means runs.
+        """
+        with self._lock:
+            if self.count < self.nlist:
+                raise ValueError(f"Need at least {self.nlist} vectors to train, have {self.count}")
+
+            rng = np.random.default_rng(seed)
+            trained_count = self.count
+            sample_rows = np.sort(rng.choice(trained_count, size=min(trained_count, self.train_size), replace=False))
+            sample = np.asarray(self.vectors[sample_rows], dtype=np.float32)
+            # Отображение остаётся валидным, даже если файлы вырастут во время обучения
+            vectors = self.vectors
+
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.nlist)[:, None]
+            # Пустые кластеры сохраняют прежний центроид
+            centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            centroids = self._normalize(centroids)
+        centroids = centroids.astype(np.float32)
+        assignments = self._assign_rows(vectors, 0, trained_count, centroids)
+
+        with self._lock:
+            # Строки, добавленные во время обучения
+            assignments = np.concatenate([assignments, self._assign_rows(self.vectors, trained_count, self.count, centroids)])
+            self.centroids = centroids
+            np.save(self._path("centroids.npy"), self.centroids)
+            self.assignments[:self.count] = assignments
+            self.assignments.flush()
+
+            self._build_lists()
+            self._write_meta()
+            logger.info(f"Similarity index trained: {self.nlist} lists over {self.count} cases")
+
+    def _start_training(self) -> None:
+        """Train on a background thread unless training is already running"""
+        if self._training_thread is not None and self._training_thread.is_alive():
+            return
+
+        def run():
+            try:
+                self.train()
+            except Exception as e:
+                logger.error(f"Similarity index training failed: {str(e)}")
+
+        self._training_thread = threading.Thread(target=run, name="similarity-train", daemon=True)
+        self._training_thread.start()
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """Wait for background training; returns False if it is still running"""
+        thread = self._training_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def add(self, vectors: np.ndarray, case_ids: List[str], payloads: Optional[List[Dict]] = None) -> None:
+        """Insert embeddings with their case ids and optional payloads"""
+        vectors = self._normalize(vectors)
+        payloads = payloads or [{} for _ in case_ids]
+        if len(vectors) != len(case_ids) or len(case_ids) != len(payloads):
+            raise ValueError("vectors, case_ids and payloads must have the same length")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            start, stop = self.count, self.count + len(vectors)
+            if stop > self.capacity:
+                self._grow(stop)
+
+            self.vectors[start:stop] = vectors.astype(np.float16)
+
+            if self.centroids is not None:
+                assignments = self._assign(vectors)
+                self.assignments[start:stop] = assignments
+                for row, list_id in zip(range(start, stop), assignments):
+                    self._pending[list_id].append(row)
+                for list_id in np.unique(assignments):
+                    if len(self._pending[list_id]) >= self.merge_threshold:
+                        self._merge_pending(list_id)
+
+            with open(self._path("cases.jsonl"), "a", encoding="utf-8") as f:
+                for case_id, payload in zip(case_ids, payloads):
+                    case = {"case_id": case_id, "payload": payload}
+                    f.write(json.dumps(case, ensure_ascii=False) + "\n")
+                    self.cases.append(case)
+
+            self.count = stop
+            self._write_meta()
+
+            if self.centroids is None and self.count >= self.train_size:
+                self._start_training()
+
+    def _probed_lists(self, query: np.ndarray) -> Optional[List[np.ndarray]]:
+        """Row arrays of the nprobe closest IVF lists (pending rows copied), or None for brute-force search"""
+        if self.centroids is None:
+            return None
+
+        nprobe = min(self.nprobe, self.nlist)
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = [self._lists[i] for i in probed]
+        rows += [np.asarray(self._pending[i], dtype=np.int64) for i in probed if self._pending[i]]
+        return rows
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            return scores[best], rows[best]
+        return scores, rows
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Dict]:
+        """
+        Find the k most similar stored cases by cosine similarity
+
+        Only a snapshot of the index (row count, mapping, probed lists) is taken
+        under the lock; the scan runs without it, so inserts and the swap to a
+        freshly trained index are not blocked by long searches.
+        """
+        query = self._normalize(query)[0]
+
+        with self._lock:
+            if self.count == 0 or k <= 0:
+                return []
+            count, vectors, cases = self.count, self.vectors, self.cases
+            probed_lists = self._probed_lists(query)
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+
+        if probed_lists is not None:
+            candidate_rows = np.sort(np.concatenate(probed_lists))
+            blocks = (candidate_rows[i:i + self.chunk_size] for i in range(0, len(candidate_rows), self.chunk_size))
+        else:
+            blocks = (np.arange(i, min(i + self.chunk_size, count)) for i in range(0, count, self.chunk_size))
+
+        for rows in blocks:
+            if not len(rows):
+                continue
+            if probed_lists is None:
+                block = vectors[rows[0]:rows[-1] + 1]
+            else:
+                block = vectors[rows]
+            scores = np.asarray(block, dtype=np.float32) @ query
+            best_scores, best_rows = self._top_k(
+                np.concatenate([best_scores, scores]),
+                np.concatenate([best_rows, rows]),
+                k
+            )
+
+        order = np.argsort(-best_scores)
+        return [
+            {
+                "case_id": cases[row]["case_id"],
+                "similarity": float(best_scores[i]),
+                "payload": cases[row]["payload"]
+            } for i, row in ((i, int(best_rows[i])) for i in order)
+        ]
+
+    def flush(self) -> None:
+        """Flush memory-mapped files to disk"""
+        with self._lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+                self.assignments.flush()
+                self._write_meta()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_stats(self) -> Dict:
+        """Get index statistics"""
+        return {
+            "count": self.count,
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "mode": "ivf" if self.centroids is not None else "flat",
+            "nlist": self.nlist if self.centroids is not None else None,
+            "nprobe": self.nprobe,
+            "training": self._training_thread is not None and self._training_thread.is_alive(),
+            "pending_rows": sum(len(pending) for pending in self._pending)
+        }
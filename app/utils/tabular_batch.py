@@ -0,0 +1,191 @@
+"""
+Bulk submissions: a metadata table (CSV or Arrow/Parquet) next to an image archive (zip or tar).
+
+The table has one row per image with columns
+    image_id (or image / filename), age, sex, localization, dx_type
+where categorical columns may hold either codes or string labels
+('female', 'lower extremity', 'histo'). Validation and label mapping are
+vectorized over the unique values of each column, and every row gets its own
+error message instead of failing the whole request.
+
+Arrow/Parquet tables need the optional pyarrow package.
+"""
+
+import csv
+import io
+import os
+import tarfile
+import zipfile
+import zlib
+import logging
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.dataset import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+METADATA_COLUMNS = ("age", "sex", "localization", "dx_type")
+IMAGE_ID_COLUMNS = ("image_id", "image", "filename")
+ARROW_EXTENSIONS = (".parquet", ".arrow", ".feather", ".ipc")
+
+
+def _read_csv(data: bytes) -> Dict[str, np.ndarray]:
+    reader = csv.reader(io.StringIO(data.decode("utf-8-sig")))
+    header = next(reader, None)
+    if not header:
+        raise ValueError("Metadata table is empty")
+
+    rows = [row + [""] * (len(header) - len(row)) for row in reader if any(cell.strip() for cell in row)]
+    columns = np.array(rows, dtype=object).reshape(len(rows), len(header)) if rows else \
+        np.empty((0, len(header)), dtype=object)
+    return {name.strip().lower(): columns[:, i] for i, name in enumerate(header)}
+
+
+def _read_arrow(data: bytes, filename: str) -> Dict[str, np.ndarray]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Arrow/Parquet metadata requires the pyarrow package")
+
+    if filename.endswith(".parquet"):
+        table = pq.read_table(io.BytesIO(data))
+    else:
+        table = pa.ipc.open_file(pa.BufferReader(data)).read_all()
+    return {name.lower(): table.column(name).to_numpy(zero_copy_only=False).astype(object)
+            for name in table.column_names}
+
+
+def read_metadata_table(data: bytes, filename: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Read a metadata table; returns (image ids, metadata columns as object arrays)"""
+    filename = (filename or "").lower()
+    columns = _read_arrow(data, filename) if filename.endswith(ARROW_EXTENSIONS) else _read_csv(data)
+
+    id_column = next((name for name in IMAGE_ID_COLUMNS if name in columns), None)
+    missing = [name for name in METADATA_COLUMNS if name not in columns]
+    if id_column is None or missing:
+        raise ValueError(f"Metadata table must have columns {IMAGE_ID_COLUMNS[0]}, {', '.join(METADATA_COLUMNS)}; "
+                         f"missing: {', '.join(missing + ([] if id_column else [IMAGE_ID_COLUMNS[0]]))}")
+
+    image_ids = np.array([_image_key(str(value)) for value in columns[id_column]], dtype=object)
+    return image_ids, {name: columns[name] for name in METADATA_COLUMNS}
+
+
+def _image_key(name: str) -> str:
+    """Archive member or table value -> image id (file name without directories and extension)"""
+    stem, ext = os.path.splitext(os.path.basename(name.strip().replace("\\", "/")))
+    return stem if ext.lower() in IMAGE_EXTENSIONS else os.path.basename(name.strip())
+
+
+def _encode_column(values: np.ndarray, mapping: Optional[Dict[str, int]]) -> np.ndarray:
+    """
+    Encode a column to float codes, NaN where a value is neither a number nor a known label
+
+    Parsing happens once per unique value; rows get their codes through the inverse index.
+    """
+    keys = np.array(["" if value is None else str(value).strip() for value in values], dtype=object)
+    if not len(keys):
+        return np.empty(0, dtype=np.float32)
+
+    unique, inverse = np.unique(keys, return_inverse=True)
+    codes = np.full(len(unique), np.nan, dtype=np.float32)
+    for i, key in enumerate(unique):
+        if mapping is not None and key.lower() in mapping:
+            codes[i] = mapping[key.lower()]
+            continue
+        try:
+            codes[i] = float(key)
+        except ValueError:
+            pass
+    return codes[inverse]
+
+
+def validate_metadata_table(columns: Dict[str, np.ndarray], model) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    Map and validate metadata columns
+
+    Returns a float32 (N, 4) array in model order and per-row error messages
+    (None for valid rows). Range checks are those of SkinCancerModel.validate_metadata_batch.
+    """
+    mappings = {
+        "age": None,
+        "sex": model.sex_mapping,
+        "localization": model.localization_mapping,
+        "dx_type": model.dx_type_mapping
+    }
+    metadata = np.stack([_encode_column(columns[name], mappings[name]) for name in METADATA_COLUMNS], axis=1) \
+        .reshape(-1, len(METADATA_COLUMNS)).astype(np.float32)
+
+    unparsed = np.isnan(metadata)
+    range_errors = model.validate_metadata_batch(np.nan_to_num(metadata, nan=0.0))
+
+    errors: List[Optional[str]] = []
+    for row in range(len(metadata)):
+        if unparsed[row].any():
+            bad = [f"{name}={columns[name][row]!r}" for name, flag in zip(METADATA_COLUMNS, unparsed[row]) if flag]
+            errors.append(f"Unrecognized value: {', '.join(bad)}")
+        else:
+            errors.append(range_errors[row])
+    return metadata, errors
+
+
+def iter_archive_images(fileobj: BinaryIO, filename: str, max_member_bytes: int,
+                        max_members: int) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    Lazily yield (image id, bytes, error) for image members of a zip or tar archive
+
+    Members are read one at a time, so at most one member is held in memory by
+    the reader. Tar archives are read as a forward-only stream; zip archives
+    need a seekable file (uploads are spooled to disk). Members that exceed
+    max_member_bytes, and every further member with an already seen image id,
+    yield an error instead of data. Corrupt archives raise ValueError.
+    """
+    filename = (filename or "").lower()
+    try:
+        members = _iter_zip(fileobj) if filename.endswith(".zip") else _iter_tar(fileobj)
+        count = 0
+        seen = set()
+        for name, size, read in members:
+            count += 1
+            if count > max_members:
+                raise ValueError(f"Archive has more than {max_members} images")
+
+            image_id = _image_key(name)
+            if image_id in seen:
+                yield image_id, None, f"Duplicate image id in archive: {name}"
+                continue
+            seen.add(image_id)
+
+            data = read(max_member_bytes + 1) if size <= max_member_bytes else None
+            if data is None or len(data) > max_member_bytes:
+                yield image_id, None, f"Image exceeds {max_member_bytes} bytes"
+            else:
+                yield image_id, data, None
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error) as e:
+        raise ValueError(f"Corrupt or unsupported archive (expected zip or tar): {str(e)}")
+
+
+def _iter_zip(fileobj: BinaryIO):
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+
+            def read(limit: int, info=info) -> bytes:
+                with archive.open(info) as member:
+                    return member.read(limit)
+            yield info.filename, info.file_size, read
+
+
+def _iter_tar(fileobj: BinaryIO):
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for info in archive:
+            if not info.isfile() or not info.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+
+            def read(limit: int, info=info) -> bytes:
+                member = archive.extractfile(info)
+                return member.read(limit) if member is not None else b""
+            yield info.name, info.size, read
@@ -0,0 +1,96 @@
+import json
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_processor import ImageProcessor
+
+logger = logging.getLogger(__name__)
+
+IMAGES_NAME = "images.npy"
+METADATA_NAME = "metadata.npy"
+LABELS_NAME = "labels.npy"
+INDEX_NAME = "index.json"
+
+
+class TensorCache(NamedTuple):
+    images: np.ndarray      # uint8 (N, H, W, 3), memory-mapped
+    metadata: np.ndarray    # float32 (N, 4): age, sex, localization, dx_type
+    labels: np.ndarray      # int16 (N,)
+    image_ids: List[str]
+
+    def iter_batches(self, batch_size: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield (images, metadata, labels) slices without copying the whole store into memory"""
+        for start in range(0, len(self.labels), batch_size):
+            stop = start + batch_size
+            yield self.images[start:stop], self.metadata[start:stop], self.labels[start:stop]
+
+
+def _load_array(path: str, decode: Callable[[bytes], Optional[Image.Image]],
+                image_to_array: Callable[[Image.Image], np.ndarray]) -> np.ndarray:
+    with open(path, "rb") as f:
+        image = decode(f.read())
+    if image is None:
+        raise ValueError(f"Cannot decode image: {path}")
+    return image_to_array(image)
+
+
+def build_tensor_cache(samples, directory: str, image_to_array: Callable[[Image.Image], np.ndarray],
+                       image_shape: Tuple[int, int, int], workers: int = 8,
+                       decode: Callable[[bytes], Optional[Image.Image]] = ImageProcessor.load_image,
+                       preprocessing: Optional[Dict] = None) -> TensorCache:
+    """
+    Decode and resize labeled samples once into a memory-mapped uint8 .npy store.
+
+    samples are LabeledSample tuples (see app.utils.dataset). Images are decoded in
+    parallel threads and written straight into the memory-mapped file. Pass the
+    serving decoder (SkinCancerModel.decode_image) as decode so the store holds
+    the pixels that are actually served; preprocessing is recorded in the index.
+    """
+    os.makedirs(directory, exist_ok=True)
+    count = len(samples)
+
+    images = np.lib.format.open_memmap(
+        os.path.join(directory, IMAGES_NAME), mode="w+", dtype=np.uint8, shape=(count,) + tuple(image_shape)
+    )
+    metadata = np.array([sample.metadata for sample in samples], dtype=np.float32).reshape(count, 4)
+    labels = np.array([sample.label for sample in samples], dtype=np.int16)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        arrays = executor.map(lambda sample: _load_array(sample.image_path, decode, image_to_array), samples)
+        for i, array in enumerate(arrays):
+            images[i] = array
+            if (i + 1) % 1000 == 0:
+                logger.info(f"Cached {i + 1}/{count} images")
+    images.flush()
+
+    np.save(os.path.join(directory, METADATA_NAME), metadata)
+    np.save(os.path.join(directory, LABELS_NAME), labels)
+    with open(os.path.join(directory, INDEX_NAME), "w", encoding="utf-8") as f:
+        json.dump({
+            "created": datetime.now(timezone.utc).isoformat(),
+            "count": count,
+            "image_shape": list(image_shape),
+            "preprocessing": preprocessing,
+            "image_ids": [sample.image_id for sample in samples]
+        }, f)
+
+    return open_tensor_cache(directory)
+
+
+def open_tensor_cache(directory: str) -> TensorCache:
+    """Open a tensor cache; images are memory-mapped read-only"""
+    with open(os.path.join(directory, INDEX_NAME), encoding="utf-8") as f:
+        index: Dict = json.load(f)
+
+    return TensorCache(
+        images=np.load(os.path.join(directory, IMAGES_NAME), mmap_mode="r"),
+        metadata=np.load(os.path.join(directory, METADATA_NAME)),
+        labels=np.load(os.path.join(directory, LABELS_NAME)),
+        image_ids=index["image_ids"]
+    )
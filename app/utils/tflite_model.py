@@ -0,0 +1,50 @@
+import threading
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+
+class TFLiteModel:
+    """
+    TensorFlow Lite model with the Keras predict() interface used by SkinCancerModel.
+
+    Lets float16 / int8 variants produced by scripts/compress_model.py be served as
+    the fast model. Inputs are matched by rank: the 4D input is the image, the 2D
+    input is the metadata. The interpreter is not thread-safe, so calls are serialized.
+    """
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        self.model_path = model_path
+        self._interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self._lock = threading.Lock()
+
+        details = self._interpreter.get_input_details()
+        self._image_index = next(d["index"] for d in details if len(d["shape"]) == 4)
+        self._metadata_index = next(d["index"] for d in details if len(d["shape"]) == 2)
+        self._output_index = self._interpreter.get_output_details()[0]["index"]
+        self.image_shape: Tuple[int, int, int] = tuple(
+            int(dim) for dim in next(d["shape"] for d in details if len(d["shape"]) == 4)[1:]
+        )
+        self._batch_size = None
+
+    def _resize(self, batch_size: int, meta_dim: int) -> None:
+        if batch_size == self._batch_size:
+            return
+        self._interpreter.resize_tensor_input(self._image_index, [batch_size, *self.image_shape])
+        self._interpreter.resize_tensor_input(self._metadata_index, [batch_size, meta_dim])
+        self._interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def predict(self, inputs: List[np.ndarray], verbose: int = 0) -> np.ndarray:
+        """Run the interpreter on [image_batch, metadata_batch]"""
+        image_batch, metadata_batch = inputs
+        with self._lock:
+            self._resize(len(image_batch), metadata_batch.shape[1])
+            self._interpreter.set_tensor(self._image_index, np.ascontiguousarray(image_batch, dtype=np.float32))
+            self._interpreter.set_tensor(self._metadata_index, np.ascontiguousarray(metadata_batch, dtype=np.float32))
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output_index).copy()
@@ -0,0 +1,9 @@
+"""
+Python client for the Skin Cancer Classification API
+"""
+
+from client._common import ClientError, RetryPolicy
+from client.async_client import AsyncSkinCancerClient
+from client.sync_client import SkinCancerClient
+
+__all__ = ["SkinCancerClient", "AsyncSkinCancerClient", "ClientError", "RetryPolicy"]
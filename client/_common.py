@@ -0,0 +1,122 @@
+import io
+import json
+import os
+import random
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+from app.schemas.requests import PredictionRequest
+from app.schemas.responses import BatchPredictionResponse
+
+# Изображение: путь к файлу, байты или открытый бинарный файл
+ImageSource = Union[str, os.PathLike, bytes, BinaryIO]
+Metadata = Union[PredictionRequest, Dict, Sequence[float]]
+
+API_PREFIX = "/api/v1"
+RETRY_STATUS_CODES = (429, 503)
+
+
+class ClientError(Exception):
+    """API request failed"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class RetryPolicy:
+    """Retries with exponential backoff and full jitter on 429/503 and transport errors"""
+    max_retries: int = 3
+    backoff_base: float = 0.2  # Секунды
+    backoff_max: float = 5.0
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def should_retry(self, attempt: int, response: Optional[httpx.Response]) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUS_CODES
+
+
+def to_request(metadata: Metadata) -> PredictionRequest:
+    """Validate metadata with the API request schema"""
+    if isinstance(metadata, PredictionRequest):
+        return metadata
+    if isinstance(metadata, dict):
+        return PredictionRequest(**metadata)
+    age, sex, localization, dx_type = metadata
+    return PredictionRequest(age=age, sex=sex, localization=localization, dx_type=dx_type)
+
+
+def open_image(image: ImageSource, name: str = "image") -> Tuple[str, BinaryIO, bool]:
+    """
+    Return (filename, file object, should_close). Paths are opened lazily as
+    file objects, so httpx streams them in chunks instead of reading them into memory.
+    """
+    if isinstance(image, (str, os.PathLike)):
+        return os.path.basename(os.fspath(image)), open(image, "rb"), True
+    if isinstance(image, bytes):
+        return f"{name}.jpg", io.BytesIO(image), True
+    image.seek(0)
+    return os.path.basename(getattr(image, "name", f"{name}.jpg")), image, False
+
+
+def build_single_form(image: ImageSource, metadata: Metadata) -> Tuple[Dict, List, List[BinaryIO]]:
+    """Multipart fields for /predict: (data, files, files_to_close)"""
+    request = to_request(metadata)
+    filename, file, should_close = open_image(image)
+    return request.model_dump(), [("image", (filename, file, "application/octet-stream"))], \
+        [file] if should_close else []
+
+
+def build_batch_form(items: Sequence[Tuple[ImageSource, Metadata]]) -> Tuple[Dict, List, List[BinaryIO]]:
+    """Multipart fields for /predict/batch: (data, files, files_to_close)"""
+    files, to_close, rows = [], [], []
+    try:
+        for i, (image, metadata) in enumerate(items):
+            rows.append(to_request(metadata).model_dump())
+            filename, file, should_close = open_image(image, name=f"image_{i}")
+            files.append(("images", (filename, file, "application/octet-stream")))
+            if should_close:
+                to_close.append(file)
+    except Exception:
+        close_all(to_close)
+        raise
+    return {"metadata": json.dumps(rows)}, files, to_close
+
+
+def chunk_items(items: Sequence, batch_size: int) -> List[Sequence]:
+    """Split items into /predict/batch requests of at most batch_size images"""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def merge_batches(batches: Sequence[BatchPredictionResponse]) -> BatchPredictionResponse:
+    """Combine chunk responses into one response, results in input order"""
+    results = [result for batch in batches for result in batch.results]
+    failed = sum(batch.failed for batch in batches)
+    return BatchPredictionResponse(success=failed == 0, total=len(results), failed=failed, results=results)
+
+
+def close_all(files: List[BinaryIO]) -> None:
+    for file in files:
+        file.close()
+
+
+def raise_for_status(response: httpx.Response) -> None:
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise ClientError(f"HTTP {response.status_code}: {detail}", status_code=response.status_code)
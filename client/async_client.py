@@ -0,0 +1,141 @@
+import asyncio
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.schemas.responses import BatchPredictionResponse, PredictionResponse
+from client._common import (
+    API_PREFIX, ClientError, ImageSource, Metadata, RetryPolicy,
+    build_batch_form, build_single_form, chunk_items, close_all, merge_batches, raise_for_status
+)
+
+
+class AsyncSkinCancerClient:
+    """
+    Asyncio API client with a keep-alive connection pool and bounded concurrency.
+
+    predict_batched() coalesces concurrent single-image calls on the client side:
+    calls made within max_wait_ms of each other (up to batch_size) are sent as one
+    /predict/batch request.
+
+        async with AsyncSkinCancerClient("http://localhost:8000") as client:
+            results = await asyncio.gather(*[client.predict_batched(path, meta) for path, meta in items])
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", timeout: float = 30.0,
+                 max_connections: int = 16, max_concurrency: int = 8, batch_size: int = 16,
+                 max_wait_ms: float = 10.0, retry: Optional[RetryPolicy] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.retry = retry or RetryPolicy()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+        self._pending: List[Tuple[ImageSource, Metadata, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks = set()
+
+    async def __aenter__(self) -> "AsyncSkinCancerClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Send pending batched calls and close the connection pool"""
+        self._flush()
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    async def _request(self, method: str, path: str, build_form: Optional[Callable] = None) -> httpx.Response:
+        """Send a request, rebuilding multipart fields and retrying with jitter on 429/503"""
+        attempt = 0
+        while True:
+            response = None
+            async with self._semaphore:
+                data, files, to_close = build_form() if build_form else (None, None, [])
+                try:
+                    response = await self._client.request(method, path, data=data, files=files)
+                except httpx.TransportError as e:
+                    if not self.retry.should_retry(attempt, None):
+                        raise ClientError(f"Request failed: {str(e)}")
+                finally:
+                    close_all(to_close)
+
+            if response is not None and not self.retry.should_retry(attempt, response):
+                raise_for_status(response)
+                return response
+
+            await asyncio.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    async def health(self) -> Dict:
+        return (await self._request("GET", "/health")).json()
+
+    async def model_info(self) -> Dict:
+        return (await self._request("GET", f"{API_PREFIX}/model-info")).json()
+
+    async def predict(self, image: ImageSource, metadata: Metadata) -> PredictionResponse:
+        """Classify one image via /predict"""
+        response = await self._request("POST", f"{API_PREFIX}/predict", lambda: build_single_form(image, metadata))
+        return PredictionResponse.model_validate(response.json())
+
+    async def _predict_chunk(self, items: Sequence[Tuple[ImageSource, Metadata]]) -> BatchPredictionResponse:
+        response = await self._request("POST", f"{API_PREFIX}/predict/batch", lambda: build_batch_form(items))
+        return BatchPredictionResponse.model_validate(response.json())
+
+    async def predict_batch(self, items: Sequence[Tuple[ImageSource, Metadata]]) -> BatchPredictionResponse:
+        """Classify images via /predict/batch, at most batch_size images per request"""
+        chunks = chunk_items(items, self.batch_size)
+        if len(chunks) == 1:
+            return await self._predict_chunk(chunks[0])
+        return merge_batches([await self._predict_chunk(chunk) for chunk in chunks])
+
+    async def predict_many(self, items: Sequence[Tuple[ImageSource, Metadata]]) -> List[PredictionResponse]:
+        """Classify any number of images in concurrent batches, results in input order"""
+        batches = await asyncio.gather(*[self._predict_chunk(chunk) for chunk in chunk_items(items, self.batch_size)])
+        return merge_batches(batches).results
+
+    async def predict_batched(self, image: ImageSource, metadata: Metadata) -> PredictionResponse:
+        """Classify one image, coalescing it with concurrent calls into a /predict/batch request"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((image, metadata, future))
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._flush)
+        if not pending:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._send_pending(pending))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _send_pending(self, pending: List[Tuple[ImageSource, Metadata, asyncio.Future]]) -> None:
+        try:
+            batch = await self.predict_batch([(image, metadata) for image, metadata, _ in pending])
+            for (_, _, future), result in zip(pending, batch.results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,94 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.schemas.responses import BatchPredictionResponse, PredictionResponse
+from client._common import (
+    API_PREFIX, ClientError, ImageSource, Metadata, RetryPolicy,
+    build_batch_form, build_single_form, chunk_items, close_all, merge_batches, raise_for_status
+)
+
+
+class SkinCancerClient:
+    """
+    Synchronous API client with a keep-alive connection pool.
+
+    predict_many() splits items into chunks sent to /predict/batch, running at
+    most max_concurrency requests at a time over the shared pool.
+
+        with SkinCancerClient("http://localhost:8000") as client:
+            result = client.predict("lesion.jpg", {"age": 45, "sex": 1, "localization": 5, "dx_type": 1})
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", timeout: float = 30.0,
+                 max_connections: int = 16, max_concurrency: int = 4, batch_size: int = 16,
+                 retry: Optional[RetryPolicy] = None, transport: Optional[httpx.BaseTransport] = None):
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.retry = retry or RetryPolicy()
+        self._client = httpx.Client(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+
+    def __enter__(self) -> "SkinCancerClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _request(self, method: str, path: str, build_form: Optional[Callable] = None) -> httpx.Response:
+        """Send a request, rebuilding multipart fields and retrying with jitter on 429/503"""
+        attempt = 0
+        while True:
+            data, files, to_close = build_form() if build_form else (None, None, [])
+            response = None
+            try:
+                response = self._client.request(method, path, data=data, files=files)
+            except httpx.TransportError as e:
+                if not self.retry.should_retry(attempt, None):
+                    raise ClientError(f"Request failed: {str(e)}")
+            finally:
+                close_all(to_close)
+
+            if response is not None and not self.retry.should_retry(attempt, response):
+                raise_for_status(response)
+                return response
+
+            time.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    def health(self) -> Dict:
+        return self._request("GET", "/health").json()
+
+    def model_info(self) -> Dict:
+        return self._request("GET", f"{API_PREFIX}/model-info").json()
+
+    def predict(self, image: ImageSource, metadata: Metadata) -> PredictionResponse:
+        """Classify one image via /predict"""
+        response = self._request("POST", f"{API_PREFIX}/predict", lambda: build_single_form(image, metadata))
+        return PredictionResponse.model_validate(response.json())
+
+    def _predict_chunk(self, items: Sequence[Tuple[ImageSource, Metadata]]) -> BatchPredictionResponse:
+        response = self._request("POST", f"{API_PREFIX}/predict/batch", lambda: build_batch_form(items))
+        return BatchPredictionResponse.model_validate(response.json())
+
+    def predict_batch(self, items: Sequence[Tuple[ImageSource, Metadata]]) -> BatchPredictionResponse:
+        """Classify images via /predict/batch, at most batch_size images per request"""
+        chunks = chunk_items(items, self.batch_size)
+        if len(chunks) == 1:
+            return self._predict_chunk(chunks[0])
+        return merge_batches([self._predict_chunk(chunk) for chunk in chunks])
+
+    def predict_many(self, items: Sequence[Tuple[ImageSource, Metadata]]) -> List[PredictionResponse]:
+        """Classify any number of images in batches with bounded concurrency, results in input order"""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            batches = list(executor.map(self._predict_chunk, chunk_items(items, self.batch_size)))
+        return merge_batches(batches).results
@@ -1,7 +1,11 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
+import json
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 class Settings(BaseSettings):
     """Настройки приложения"""
     
@@ -13,6 +17,117 @@ class Settings(BaseSettings):
     
     # Настройки модели
     MODEL_PATH: str = "models/trained_models/best_model.h5"
+    # Серверный артефакт (scripts/compile_model.py); если существует, загружается вместо MODEL_PATH
+    MODEL_ARTIFACT_PATH: Optional[str] = "models/trained_models/best_model.artifact"
+    
+    # Test-time augmentation для случаев высокого риска (mel/bcc)
+    TTA_ENABLED: bool = False
+    TTA_CLASSES: List[str] = ["mel", "bcc"]
+    TTA_MIN_RISK_LEVEL: int = 2  # Применять TTA начиная с этого уровня риска
+    TTA_CONFIDENCE_THRESHOLD: float = 0.0  # Применять TTA, если уверенность ниже порога
+    TTA_CROP_FRACTION: float = 0.9
+    
+    # Каскад моделей: быстрая модель отвечает, если уверенность выше порога класса
+    FAST_MODEL_PATH: Optional[str] = None  # Путь относительно корня проекта
+    CASCADE_ENABLED: bool = False
+    CASCADE_THRESHOLDS: Dict[str, float] = {"nv": 0.9, "bkl": 0.9, "df": 0.95, "vasc": 0.95}
+    
+    # Деградация под нагрузкой на быструю модель (FAST_MODEL_PATH) с гистерезисом
+    DEGRADATION_ENABLED: bool = False
+    DEGRADATION_QUEUE_HIGH: int = 64
+    DEGRADATION_QUEUE_LOW: int = 16
+    DEGRADATION_P95_HIGH_MS: float = 500.0
+    DEGRADATION_P95_LOW_MS: float = 200.0
+    DEGRADATION_MIN_HOLD_S: float = 5.0
+    
+    # Поиск похожих случаев по эмбеддингам
+    EMBEDDING_LAYER: Optional[str] = None  # None - вход последнего слоя модели
+    SIMILARITY_INDEX_DIR: str = "data/similarity_index"
+    SIMILARITY_NLIST: int = 1024  # Число IVF-списков
+    SIMILARITY_NPROBE: int = 8  # Число просматриваемых списков при запросе
+    
+    # Аудит предсказаний
+    AUDIT_ENABLED: bool = True
+    AUDIT_DIR: str = "logs/audit"
+    AUDIT_BACKEND: str = "jsonl"  # jsonl, sqlite
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 256
+    AUDIT_FLUSH_INTERVAL: float = 1.0  # Секунды
+    AUDIT_OVERFLOW_POLICY: str = "block"  # block, drop_newest, drop_oldest
+    AUDIT_BLOCK_TIMEOUT: float = 0.1  # Секунды ожидания места в очереди для block
+    AUDIT_MAX_FILE_MB: int = 100
+    AUDIT_MAX_FILES: int = 20
+    
+    # Динамический батчинг запросов
+    BATCH_MAX_SIZE: int = 16
+    BATCH_MAX_WAIT_MS: float = 5.0
+    
+    # Потоки TensorFlow (None - по умолчанию TF); задаются до загрузки модели
+    TF_INTRA_OP_THREADS: Optional[int] = None
+    TF_INTER_OP_THREADS: Optional[int] = None
+    
+    # Профиль автотюнинга (scripts/tune_batching.py): переопределяет BATCH_MAX_SIZE,
+    # BATCH_MAX_WAIT_MS и TF_*_THREADS, если они не заданы явно в окружении / .env
+    TUNING_PROFILE_PATH: Optional[str] = "config/tuning_profile.json"
+    AUTOTUNE_ON_STARTUP: bool = False  # Подобрать батчинг при старте, если профиля нет
+    AUTOTUNE_TARGET_P99_MS: float = 300.0
+    AUTOTUNE_BATCH_SIZES: List[int] = [1, 2, 4, 8, 16, 32, 64]
+    
+    # Пакетная загрузка: архив изображений (zip/tar) + таблица метаданных (CSV/Parquet)
+    ARCHIVE_MAX_MEMBERS: int = 10000
+    ARCHIVE_MAX_MEMBER_MB: int = 20
+    ARCHIVE_MAX_INFLIGHT: int = 64  # Изображений архива одновременно в декодировании и инференсе
+    
+    # Grad-CAM объяснения по запросу (/explain/{id})
+    EXPLAIN_ENABLED: bool = True
+    EXPLAIN_MAX_INPUTS: int = 512  # Входы uint8 300x200x3 (~180 KB каждый, ~90 MB при 512); не входит в MEMORY_BUDGET_MB
+    EXPLAIN_MAX_HEATMAPS: int = 256  # Кеш PNG-карт
+    EXPLAIN_BATCH_MAX_SIZE: int = 8
+    EXPLAIN_BATCH_MAX_WAIT_MS: float = 10.0
+    GRADCAM_LAYER: Optional[str] = None  # None - последний слой с 4D выходом
+    
+    # Кеш результатов для почти одинаковых изображений (перцептивный хеш)
+    RESULT_CACHE_ENABLED: bool = False
+    RESULT_CACHE_MAX_ENTRIES: int = 10000
+    RESULT_CACHE_MAX_DISTANCE: int = 4  # Порог расстояния Хэмминга (из 64 бит)
+    RESULT_CACHE_TTL_S: float = 600.0
+    RESULT_CACHE_AUDIT_RATE: float = 0.02  # Доля попаданий, перепроверяемых инференсом
+    
+    # Теневая оценка модели-кандидата на живом трафике
+    SHADOW_MODEL_PATH: Optional[str] = None  # .h5 или артефакт, путь относительно корня проекта
+    SHADOW_SAMPLE_RATE: float = 0.1
+    SHADOW_QUEUE_SIZE: int = 1024
+    SHADOW_BATCH_SIZE: int = 16
+    
+    # Память на пути запроса
+    IMAGE_DRAFT_DECODE: bool = True  # Декодировать JPEG сразу в размер входа модели (DCT-масштаб 1/2..1/8)
+    MEMORY_BUDGET_MB: Optional[int] = 1024  # Бюджет оценённой памяти запросов (None - только учёт)
+    MEMORY_ADMISSION_TIMEOUT_S: float = 10.0  # Ожидание места в бюджете до ответа 503
+    
+    # Загрузка артефактов по манифесту (scripts/download_model.py)
+    MODEL_MANIFEST: Optional[str] = None  # JSON-манифест: путь относительно корня проекта или URL
+    MODEL_FETCH_ON_STARTUP: bool = False  # Скачать недостающие артефакты манифеста при старте
+    ARTIFACT_CACHE_DIR: str = "models/cache"  # Общий кэш по SHA-256 для всех воркеров узла
+    FETCH_PARALLELISM: int = 4
+    FETCH_CHUNK_MB: int = 8
+    FETCH_TIMEOUT_S: float = 30.0
+    FETCH_RETRIES: int = 3
+    
+    # Приоритеты запросов (заголовок X-Priority): веса взвешенной справедливой очереди и SLO
+    PRIORITY_WEIGHTS: Dict[str, float] = {"interactive": 8.0, "bulk": 1.0}
+    PRIORITY_SLO_MS: Dict[str, float] = {"interactive": 300.0}
+    PRIORITY_URGENT_FRACTION: float = 0.5  # Доля SLO, после которой класс обслуживается вне очереди
+    
+    # Потоковая классификация кадров (WebSocket)
+    STREAM_DEDUP_DISTANCE: int = 4  # Макс. расстояние Хэмминга dHash для пропуска кадра
+    
+    # Администрирование и профилирование
+    ADMIN_TOKEN: Optional[str] = None  # Токен для /admin эндпоинтов (None - отключены)
+    PROFILING_ENABLED: bool = False
+    PROFILING_DIR: str = "logs/profiles"
+    PROFILING_MAX_DURATION_S: float = 120.0
+    PROFILING_MAX_REQUESTS: int = 1000
+    PROFILING_MAX_TRACEMALLOC_S: float = 10.0  # tracemalloc замедляет все аллокации процесса - только коротким окном
     
     # Настройки сервера
     HOST: str = "0.0.0.0"  # 0.0.0.0 - доступ с любых адресов
@@ -31,11 +146,84 @@ class Settings(BaseSettings):
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         return os.path.join(base_dir, self.MODEL_PATH)
     
+    @property
+    def absolute_model_artifact_path(self) -> Optional[str]:
+        """Возвращает абсолютный путь к серверному артефакту модели"""
+        if not self.MODEL_ARTIFACT_PATH:
+            return None
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, self.MODEL_ARTIFACT_PATH)
+    
+    @property
+    def absolute_model_manifest(self) -> Optional[str]:
+        """Возвращает URL или абсолютный путь к манифесту артефактов"""
+        if not self.MODEL_MANIFEST or self.MODEL_MANIFEST.startswith(("http://", "https://")):
+            return self.MODEL_MANIFEST
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, self.MODEL_MANIFEST)
+    
+    @property
+    def absolute_artifact_cache_dir(self) -> str:
+        """Возвращает абсолютный путь к кэшу артефактов"""
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, self.ARTIFACT_CACHE_DIR)
+    
+    @property
+    def absolute_tuning_profile_path(self) -> Optional[str]:
+        """Возвращает абсолютный путь к профилю автотюнинга"""
+        if not self.TUNING_PROFILE_PATH:
+            return None
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, self.TUNING_PROFILE_PATH)
+    
+    @property
+    def absolute_shadow_model_path(self) -> Optional[str]:
+        """Возвращает абсолютный путь к модели-кандидату теневой оценки"""
+        if not self.SHADOW_MODEL_PATH:
+            return None
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, self.SHADOW_MODEL_PATH)
+    
+    @property
+    def absolute_fast_model_path(self) -> Optional[str]:
+        """Возвращает абсолютный путь к быстрой модели каскада"""
+        if not self.FAST_MODEL_PATH:
+            return None
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, self.FAST_MODEL_PATH)
+    
     class Config:
         # Загружать переменные из .env файла
         env_file = ".env"
         env_file_encoding = "utf-8"
 
+def load_tuning_profile(path: Optional[str]) -> Dict:
+    """Переопределения настроек из профиля автотюнинга (пусто, если профиля нет или он с другого хоста)"""
+    if not path or not os.path.exists(path):
+        return {}
+    
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать профиль автотюнинга {path}: {e}")
+        return {}
+    
+    # Профиль, снятый на машине с другим числом ядер, не применяем
+    if profile.get("host", {}).get("cpu_count") != os.cpu_count():
+        logger.warning(f"Профиль автотюнинга {path} снят на другом хосте, игнорируется")
+        return {}
+    return profile.get("settings", {})
+
 def get_settings() -> Settings:
     """Функция для получения настроек"""
-    return Settings()
\ No newline at end of file
+    settings = Settings()
+    
+    # Явно заданные (окружение, .env) значения важнее профиля
+    overrides = {
+        key: value for key, value in load_tuning_profile(settings.absolute_tuning_profile_path).items()
+        if key in Settings.model_fields and key not in settings.model_fields_set
+    }
+    if overrides:
+        settings = Settings(**overrides)
+    return settings
\ No newline at end of file
@@ -2,11 +2,43 @@ import tensorflow as tf
 import numpy as np
 from PIL import Image
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import BinaryIO, Dict, List, Tuple, Optional, Union
 import os
+import threading
+import time
+
+from app.utils import model_artifact
+from app.utils.image_processor import ImageProcessor
+from app.utils.tflite_model import TFLiteModel
 
 logger = logging.getLogger(__name__)
 
+class _InputBuffers(threading.local):
+    """
+    Per-thread uint8 and float32 input batches, reused across calls and grown on demand
+
+    Batches larger than max_rows get one-off arrays, so a rare large batch does
+    not stay pinned in every thread that ever saw it.
+    """
+    
+    def __init__(self):
+        self.images = None
+        self.normalized = None
+    
+    def get(self, batch_size: int, image_shape: Tuple[int, int, int],
+            max_rows: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if max_rows is not None and batch_size > max_rows:
+            return (np.empty((batch_size, *image_shape), dtype=np.uint8),
+                    np.empty((batch_size, *image_shape), dtype=np.float32))
+        if self.images is None or len(self.images) < batch_size or self.images.shape[1:] != tuple(image_shape):
+            self.images = np.empty((batch_size, *image_shape), dtype=np.uint8)
+            self.normalized = np.empty((batch_size, *image_shape), dtype=np.float32)
+        return self.images[:batch_size], self.normalized[:batch_size]
+    
+    def release(self) -> None:
+        self.images = None
+        self.normalized = None
+
 class SkinCancerModel:
     """
     Main model manager for skin cancer classification
@@ -14,11 +46,63 @@ class SkinCancerModel:
     """
     
     def __init__(self, model_path: str = None):
-        self.model = None
+        self._model = None
+        self._artifact_manifest = None  # Артефакт, ожидающий ленивой загрузки
+        self._model_lock = threading.Lock()
         self.model_path = model_path
+        self.model_version = None
         self.image_shape = (300, 200, 3)
         self.meta_dim = 4  # age, sex, localization, dx_type
         self.is_loaded = False
+        self._input_buffers = _InputBuffers()
+        self.input_buffer_max_rows = None  # None - буферы растут до самого большого батча
+        
+        # Модель с двумя выходами (вероятности + эмбеддинг предпоследнего слоя)
+        self.serving_model = None
+        self.embedding_layer = None  # None - вход последнего слоя модели
+        
+        # Ленивые Grad-CAM объяснения: входы предсказаний хранятся в explanation_store,
+        # градиенты считаются только по запросу /explain/{id}
+        self.explanation_store = None
+        self.gradcam_layer = None  # None - последний слой ветки изображения с 4D выходом
+        self.gradcam_model = None
+        
+        # Теневая оценка модели-кандидата на выборке живого трафика (ShadowEvaluator)
+        self.shadow = None
+        
+        # Test-time augmentation (TTA) для случаев высокого риска
+        self.tta_enabled = False
+        self.tta_classes = {'mel', 'bcc'}
+        self.tta_min_risk_level = 2
+        self.tta_confidence_threshold = 0.0
+        self.tta_crop_fraction = 0.9
+        
+        # Каскад: быстрая (дистиллированная/квантованная) модель отвечает сама,
+        # если её уверенность превышает порог для предсказанного класса
+        self.fast_model = None
+        self.fast_model_path = None
+        self.fast_image_shape = None  # Вход быстрой модели, если её разрешение уменьшено
+        self.cascade_enabled = False
+        self.cascade_thresholds = {
+            'nv': 0.9,
+            'bkl': 0.9,
+            'df': 0.95,
+            'vasc': 0.95
+        }  # Классы без порога (akiec, bcc, mel) всегда идут в полную модель
+        self.routing_stats = {"fast": 0, "full": 0, "degraded": 0}
+        self._stats_lock = threading.Lock()
+        
+        # Деградация под нагрузкой: при длинной очереди или высоком p95 весь трафик
+        # обслуживает быстрая модель; пороги входа и выхода разнесены (гистерезис)
+        self.degradation_enabled = False
+        self.degradation_queue_high = 64
+        self.degradation_queue_low = 16
+        self.degradation_p95_high_ms = 500.0
+        self.degradation_p95_low_ms = 200.0
+        self.degradation_min_hold_s = 5.0
+        self.degraded = False
+        self._degraded_changed_at = 0.0
+        self.degradation_transitions = 0
         
         # Маппинги из вашего ноутбука
         self.dx_type_mapping = {
@@ -114,8 +198,50 @@ class SkinCancerModel:
             }
         }
     
-    def load_model(self, model_path: str = 'model/best_multimodal_model.h5') -> bool:
-        """Load model from file"""
+    @property
+    def model(self):
+        """Keras model; a serving artifact is materialized on first access"""
+        if self._model is None and self._artifact_manifest is not None:
+            with self._model_lock:
+                if self._model is None:
+                    self._materialize_artifact()
+        return self._model
+    
+    @model.setter
+    def model(self, value) -> None:
+        self._model = value
+    
+    def release_input_buffers(self) -> None:
+        """Drop the calling thread's reusable input batches (e.g. after autotune probed large batches)"""
+        self._input_buffers.release()
+    
+    @staticmethod
+    def configure_threads(intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None) -> None:
+        """Set TensorFlow thread pools; must run before the first model is loaded"""
+        try:
+            if intra_op_threads is not None:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads is not None:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError as e:
+            logger.warning(f"Thread configuration ignored, TensorFlow is already initialized: {str(e)}")
+    
+    def _materialize_artifact(self) -> None:
+        """Build the model from a memory-mapped serving artifact"""
+        model = model_artifact.build_model(self.model_path, self._artifact_manifest)
+        self._model = model
+        self._artifact_manifest = None
+        self._build_serving_model()
+        logger.info(f"Model materialized from artifact: {self.model_path}")
+    
+    def load_model(self, model_path: str = 'model/best_multimodal_model.h5', lazy: bool = True) -> bool:
+        """
+        Load model from file
+        
+        model_path may be a Keras .h5 file or a serving artifact directory written by
+        scripts/compile_model.py. An artifact is only validated here and built on
+        first use unless lazy=False.
+        """
         try:
             if model_path:
                 self.model_path = model_path
@@ -124,7 +250,22 @@ class SkinCancerModel:
                 logger.error(f"Model file not found: {self.model_path}")
                 return False
             
+            self.gradcam_model = None
+            if model_artifact.is_artifact(self.model_path):
+                self._model = None
+                self.serving_model = None
+                self._artifact_manifest = model_artifact.read_manifest(self.model_path)
+                self.model_version = self._get_model_version(self.model_path, self._artifact_manifest)
+                self.is_loaded = True
+                if not lazy:
+                    self._materialize_artifact()
+                logger.info(f"Model artifact {'registered' if lazy else 'loaded'}: {self.model_path}")
+                return True
+            
+            self._artifact_manifest = None
             self.model = tf.keras.models.load_model(self.model_path)
+            self._build_serving_model()
+            self.model_version = self._get_model_version(self.model_path)
             self.is_loaded = True
             logger.info(f"Model loaded successfully from: {self.model_path}")
             return True
@@ -134,20 +275,263 @@ class SkinCancerModel:
             self.is_loaded = False
             return False
     
+    @staticmethod
+    def _get_model_version(model_path: str, manifest: Optional[Dict] = None) -> str:
+        """
+        Model version as <source file name>@<first 12 hex digits of its SHA-256>
+        
+        An artifact carries the name and hash of the .h5 it was compiled from, so
+        the same model gets the same version in both formats.
+        """
+        if manifest is not None:
+            if manifest.get("source_sha256"):
+                return f"{manifest['source']}@{manifest['source_sha256'][:12]}"
+            weights_path = os.path.join(model_path, model_artifact.WEIGHTS_NAME)
+            return f"{os.path.basename(model_path.rstrip(os.sep))}@{model_artifact.file_sha256(weights_path)[:12]}"
+        return f"{os.path.basename(model_path)}@{model_artifact.file_sha256(model_path)[:12]}"
+    
+    @property
+    def embedding_available(self) -> bool:
+        """Whether predictions can return embeddings"""
+        if self._model is None and self._artifact_manifest is not None:
+            # Артефакт ещё не материализован: ищем слой эмбеддинга в архитектуре, не строя модель
+            return not self.embedding_layer or self.embedding_layer in model_artifact.layer_names(self.model_path)
+        return self.serving_model is not None
+    
+    def _build_serving_model(self) -> None:
+        """
+        Build a model that returns class probabilities together with the penultimate-layer
+        embedding, so embeddings come out of the same forward pass as the prediction.
+        """
+        try:
+            if self.embedding_layer:
+                embedding = self.model.get_layer(self.embedding_layer).output
+            else:
+                embedding = self.model.layers[-1].input
+            
+            self.serving_model = tf.keras.Model(inputs=self.model.inputs, outputs=[self.model.output, embedding])
+        except Exception as e:
+            logger.warning(f"Embedding output is not available: {str(e)}")
+            self.serving_model = None
+    
+    def _find_gradcam_layer(self):
+        """Last layer of the image branch with a 4D (batch, h, w, channels) output"""
+        if self.gradcam_layer:
+            return self.model.get_layer(self.gradcam_layer)
+        
+        for layer in reversed(self.model.layers):
+            try:
+                if len(layer.output.shape) == 4:
+                    return layer
+            except (AttributeError, ValueError):
+                continue
+        raise ValueError("Model has no convolutional feature map for Grad-CAM")
+    
+    def _build_gradcam_model(self) -> None:
+        with self._model_lock:
+            if self.gradcam_model is None:
+                layer = self._find_gradcam_layer()
+                self.gradcam_model = tf.keras.Model(inputs=self.model.inputs, outputs=[layer.output, self.model.output])
+                logger.info(f"Grad-CAM model built on layer: {layer.name}")
+    
+    def explain_batch(self, image_batch: np.ndarray, metadata_batch: np.ndarray,
+                      class_indices: List[int]) -> np.ndarray:
+        """
+        Compute Grad-CAM maps of the primary model for a batch of preprocessed inputs
+        
+        image_batch is uint8 (N, H, W, 3) as produced by image_to_array(). Gradients
+        of each row's class score are taken with respect to the last feature map of
+        the image branch; the metadata input is held fixed. Returns float32 maps in
+        [0, 1] at feature-map resolution, shape (N, h, w).
+        """
+        if not self.is_loaded or self.model is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        if self.gradcam_model is None:
+            self._build_gradcam_model()
+        
+        images = tf.convert_to_tensor(self.normalize_images(image_batch))
+        metadata = tf.convert_to_tensor(metadata_batch, dtype=tf.float32)
+        indices = tf.constant(class_indices, dtype=tf.int32)
+        
+        with tf.GradientTape() as tape:
+            feature_maps, probabilities = self.gradcam_model([images, metadata], training=False)
+            scores = tf.gather(probabilities, indices, axis=1, batch_dims=1)
+        gradients = tape.gradient(scores, feature_maps)
+        
+        weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+        cams = tf.nn.relu(tf.reduce_sum(weights * feature_maps, axis=-1)).numpy()
+        
+        peaks = cams.reshape(len(cams), -1).max(axis=1)
+        return (cams / np.maximum(peaks, 1e-8)[:, None, None]).astype('float32')
+    
+    def _attach_explanation(self, result: Dict, image_array: np.ndarray, metadata_row: np.ndarray) -> Dict:
+        """Register the input of a successful prediction and add its explanation handle"""
+        if self.explanation_store is not None and result.get("success"):
+            # Входные буферы переиспользуются следующим батчем - храним копию
+            result["explanation_id"] = self.explanation_store.put(
+                image_array.copy(), metadata_row, result["diagnosis"]["class"]
+            )
+        return result
+    
+    def load_fast_model(self, model_path: str) -> bool:
+        """
+        Load fast model variant (distilled, pruned or quantized) from file
+        
+        Accepts Keras .h5 files and .tflite variants from scripts/compress_model.py.
+        A variant with a reduced input resolution gets resized inputs.
+        """
+        try:
+            if not model_path or not os.path.exists(model_path):
+                logger.error(f"Fast model file not found: {model_path}")
+                return False
+            
+            if model_path.endswith(".tflite"):
+                self.fast_model = TFLiteModel(model_path)
+                image_shape = self.fast_model.image_shape
+            else:
+                self.fast_model = tf.keras.models.load_model(model_path)
+                image_shape = next(tuple(t.shape[1:]) for t in self.fast_model.inputs if len(t.shape) == 4)
+            self.fast_image_shape = tuple(image_shape) if tuple(image_shape) != self.image_shape else None
+            self.fast_model_path = model_path
+            logger.info(f"Fast model loaded successfully from: {model_path}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error loading fast model: {str(e)}")
+            self.fast_model = None
+            return False
+    
+    def configure_cascade(self, enabled: Optional[bool] = None, thresholds: Optional[Dict[str, float]] = None) -> None:
+        """Update cascade policy"""
+        if enabled is not None:
+            self.cascade_enabled = enabled
+        if thresholds is not None:
+            self.cascade_thresholds = dict(thresholds)
+    
+    @property
+    def cascade_active(self) -> bool:
+        return self.cascade_enabled and self.fast_model is not None
+    
+    def configure_degradation(self, enabled: Optional[bool] = None, queue_high: Optional[int] = None,
+                              queue_low: Optional[int] = None, p95_high_ms: Optional[float] = None,
+                              p95_low_ms: Optional[float] = None, min_hold_s: Optional[float] = None) -> None:
+        """Update overload degradation policy"""
+        if enabled is not None:
+            self.degradation_enabled = enabled
+        if queue_high is not None:
+            self.degradation_queue_high = queue_high
+        if queue_low is not None:
+            self.degradation_queue_low = queue_low
+        if p95_high_ms is not None:
+            self.degradation_p95_high_ms = p95_high_ms
+        if p95_low_ms is not None:
+            self.degradation_p95_low_ms = p95_low_ms
+        if min_hold_s is not None:
+            self.degradation_min_hold_s = min_hold_s
+        
+        if self.degradation_queue_low > self.degradation_queue_high or \
+                self.degradation_p95_low_ms > self.degradation_p95_high_ms:
+            raise ValueError("Degradation low thresholds must not exceed high thresholds")
+    
+    @property
+    def degradation_active(self) -> bool:
+        return self.degradation_enabled and self.degraded and self.fast_model is not None
+    
+    def update_load(self, queue_depth: int, p95_ms: Optional[float] = None) -> bool:
+        """
+        Switch between primary and fast variants from observed load
+        
+        Degraded mode is entered when the queue depth or the recent p95 latency
+        reaches its high threshold, and left only when both are back at or below
+        their low thresholds. Each mode is held for at least min_hold_s to avoid
+        flapping. Returns whether the model is degraded.
+        """
+        if not self.degradation_enabled or self.fast_model is None:
+            return False
+        
+        now = time.monotonic()
+        if now - self._degraded_changed_at < self.degradation_min_hold_s:
+            return self.degraded
+        
+        if not self.degraded:
+            overloaded = queue_depth >= self.degradation_queue_high or \
+                (p95_ms is not None and p95_ms >= self.degradation_p95_high_ms)
+            if overloaded:
+                self._set_degraded(True, now, queue_depth, p95_ms)
+        else:
+            recovered = queue_depth <= self.degradation_queue_low and \
+                (p95_ms is None or p95_ms <= self.degradation_p95_low_ms)
+            if recovered:
+                self._set_degraded(False, now, queue_depth, p95_ms)
+        
+        return self.degraded
+    
+    def _set_degraded(self, degraded: bool, now: float, queue_depth: int, p95_ms: Optional[float]) -> None:
+        self.degraded = degraded
+        self._degraded_changed_at = now
+        with self._stats_lock:
+            self.degradation_transitions += 1
+        
+        p95 = f"{p95_ms:.1f} ms" if p95_ms is not None else "n/a"
+        if degraded:
+            logger.warning(f"Overload: serving fast model variant (queue={queue_depth}, p95={p95})")
+        else:
+            logger.info(f"Load recovered: serving primary model (queue={queue_depth}, p95={p95})")
+    
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        """Model image input as PIL (width, height)"""
+        return self.image_shape[1], self.image_shape[0]
+    
+    def decode_image(self, image_data: Union[bytes, BinaryIO], draft: bool = True) -> Optional[Image.Image]:
+        """
+        Decode an image exactly as serving does before image_to_array()
+        
+        With draft=True (IMAGE_DRAFT_DECODE) JPEGs are decoded at a reduced DCT
+        scale straight to model input size; otherwise at full resolution.
+        Offline tools must use the same flag to see the served pixels.
+        """
+        return ImageProcessor.load_image(image_data, self.input_size if draft else None)
+    
+    def image_to_array(self, image: Image.Image, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Resize image to model input size as a uint8 (H, W, 3) array, written into out if given"""
+        # Resize to model input size (images decoded by ImageProcessor with target_size already match)
+        if image.size != self.input_size:
+            image = image.resize(self.input_size)
+        
+        # Convert to RGB if needed (grayscale, RGBA)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        if out is None:
+            return np.array(image)
+        out[...] = np.asarray(image)
+        return out
+    
+    @staticmethod
+    def normalize_images(image_batch: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Normalize uint8 image batch to float32 [0, 1]"""
+        return np.divide(image_batch, np.float32(255.0), out=out, dtype=np.float32)
+    
+    def preprocess_batch(self, images: List[Image.Image]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Resize and normalize images into this thread's reusable input buffers
+        
+        Returns uint8 and float32 (N, H, W, 3) views that stay valid until the
+        next call on the same thread; anything kept longer must be copied.
+        """
+        image_batch, normalized = self._input_buffers.get(len(images), self.image_shape, self.input_buffer_max_rows)
+        for row, image in enumerate(images):
+            self.image_to_array(image, out=image_batch[row])
+        self.normalize_images(image_batch, out=normalized)
+        return image_batch, normalized
+    
     def preprocess_image(self, image: Image.Image) -> np.ndarray:
         """Preprocess image for model inference"""
-        # Resize to model input size
-        image = image.resize((self.image_shape[1], self.image_shape[0]))
-        image_array = np.array(image)
-        
-        # Convert to RGB if needed
-        if len(image_array.shape) == 2:  # Grayscale
-            image_array = np.stack([image_array] * 3, axis=-1)
-        elif image_array.shape[2] == 4:  # RGBA
-            image_array = image_array[:, :, :3]
+        image_array = self.image_to_array(image)
         
         # Normalize to [0, 1]
-        image_array = image_array.astype('float32') / 255.0
+        image_array = self.normalize_images(image_array)
         image_array = np.expand_dims(image_array, axis=0)
         
         return image_array
@@ -174,107 +558,381 @@ class SkinCancerModel:
             }
         }
     
-    def predict(self, image: Image.Image, metadata: List[float]) -> Dict:
-        """Make prediction for single image"""
+    def configure_tta(self, enabled: Optional[bool] = None, confidence_threshold: Optional[float] = None,
+                      min_risk_level: Optional[int] = None, classes: Optional[List[str]] = None,
+                      crop_fraction: Optional[float] = None) -> None:
+        """Update test-time augmentation policy"""
+        if enabled is not None:
+            self.tta_enabled = enabled
+        if confidence_threshold is not None:
+            self.tta_confidence_threshold = confidence_threshold
+        if min_risk_level is not None:
+            self.tta_min_risk_level = min_risk_level
+        if classes is not None:
+            self.tta_classes = set(classes)
+        if crop_fraction is not None:
+            self.tta_crop_fraction = crop_fraction
+    
+    def _forward(self, image_batch: np.ndarray, metadata_batch: np.ndarray) -> np.ndarray:
+        """Run a single forward pass over already preprocessed batches"""
+        return self.model.predict([image_batch, metadata_batch], verbose=0)
+    
+    def _forward_with_embedding(self, image_batch: np.ndarray, metadata_batch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Run a single forward pass returning probabilities and penultimate-layer embeddings"""
+        if self.model is None or self.serving_model is None:
+            raise ValueError("Embedding output is not available for this model")
+        
+        probabilities, embeddings = self.serving_model.predict([image_batch, metadata_batch], verbose=0)
+        return probabilities, embeddings.reshape(len(embeddings), -1)
+    
+    def _forward_fast(self, image_batch: np.ndarray, metadata_batch: np.ndarray) -> np.ndarray:
+        """Run a forward pass of the fast model variant"""
+        if self.fast_image_shape is not None:
+            image_batch = tf.image.resize(image_batch, self.fast_image_shape[:2]).numpy()
+        return self.fast_model.predict([image_batch, metadata_batch], verbose=0)
+    
+    def cascade_accepts(self, probabilities: np.ndarray, thresholds: Optional[Dict[str, float]] = None) -> bool:
+        """Check whether fast-model probabilities clear the threshold of the predicted class"""
+        thresholds = self.cascade_thresholds if thresholds is None else thresholds
+        diagnosis_name = self.diagnosis_mapping[int(np.argmax(probabilities))]["name"]
+        threshold = thresholds.get(diagnosis_name)
+        
+        return threshold is not None and float(np.max(probabilities)) >= threshold
+    
+    def _fast_accepts(self, probabilities: np.ndarray, tta: Optional[bool], degraded: bool) -> bool:
+        """
+        Decide whether a fast-model answer is final
+        
+        In degraded mode every answer is kept except those that call for a TTA
+        follow-up pass: high-risk cases are still re-run on the primary model.
+        """
+        if degraded:
+            return not (tta or (tta is None and self.tta_enabled and self._should_apply_tta(probabilities)))
+        return self.cascade_accepts(probabilities)
+    
+    def _record_route(self, stage: str) -> None:
+        with self._stats_lock:
+            self.routing_stats[stage] += 1
+    
+    def get_routing_stats(self) -> Dict:
+        """Get per-stage cascade and degradation routing counts and rates"""
+        with self._stats_lock:
+            counts = dict(self.routing_stats)
+            transitions = self.degradation_transitions
+        
+        total = sum(counts.values())
+        return {
+            "cascade_enabled": self.cascade_active,
+            "degraded": self.degradation_active,
+            "degradation_transitions": transitions,
+            "total": total,
+            "stages": {
+                stage: {
+                    "count": count,
+                    "rate": count / total if total else 0.0
+                } for stage, count in counts.items()
+            }
+        }
+    
+    def predict_proba_batch(self, images: List[Image.Image], metadata_list: List[List[float]],
+                            use_fast_model: bool = False) -> np.ndarray:
+        """Get class probabilities for a batch of images in a single forward pass"""
+        model = self.fast_model if use_fast_model else self.model
+        if model is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        _, image_batch = self.preprocess_batch(images)
+        metadata_batch = np.concatenate([self.preprocess_metadata(*metadata) for metadata in metadata_list])
+        
+        if use_fast_model:
+            return self._forward_fast(image_batch, metadata_batch)
+        return self._forward(image_batch, metadata_batch)
+    
+    def predict_proba_preprocessed(self, image_batch: np.ndarray, metadata_batch: np.ndarray,
+                                   use_fast_model: bool = False) -> np.ndarray:
+        """Get class probabilities for already resized uint8 (N, H, W, 3) images and (N, 4) metadata"""
+        model = self.fast_model if use_fast_model else self.model
+        if model is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        _, normalized = self._input_buffers.get(len(image_batch), self.image_shape, self.input_buffer_max_rows)
+        image_batch = self.normalize_images(image_batch, out=normalized)
+        metadata_batch = np.asarray(metadata_batch, dtype='float32')
+        
+        if use_fast_model:
+            return self._forward_fast(image_batch, metadata_batch)
+        return self._forward(image_batch, metadata_batch)
+    
+    def _should_apply_tta(self, probabilities: np.ndarray) -> bool:
+        """Decide whether first-pass probabilities call for test-time augmentation"""
+        diagnosis_class = int(np.argmax(probabilities))
+        diagnosis_name = self.diagnosis_mapping[diagnosis_class]["name"]
+        risk_level = self.danger_mapping.get(diagnosis_name, 0)
+        
+        return (
+            diagnosis_name in self.tta_classes
+            or risk_level >= self.tta_min_risk_level
+            or float(np.max(probabilities)) < self.tta_confidence_threshold
+        )
+    
+    def _build_tta_views(self, image_batch: np.ndarray) -> np.ndarray:
+        """
+        Build augmented views of a preprocessed (1, H, W, 3) image with vectorized NumPy ops.
+        
+        The original view is not included. Rotations are limited to 180 degrees because
+        the model input is not square; crops are taken from the four corners and resized
+        back to the input size with nearest-neighbour index sampling.
+        """
+        image = image_batch[0]
+        height, width = image.shape[:2]
+        
+        views = [
+            image[:, ::-1],      # horizontal flip
+            image[::-1, :],      # vertical flip
+            image[::-1, ::-1],   # rotation by 180 degrees
+        ]
+        
+        crop_h = max(1, int(round(height * self.tta_crop_fraction)))
+        crop_w = max(1, int(round(width * self.tta_crop_fraction)))
+        row_index = (np.arange(height) * crop_h // height)
+        col_index = (np.arange(width) * crop_w // width)
+        
+        for top, left in ((0, 0), (0, width - crop_w), (height - crop_h, 0), (height - crop_h, width - crop_w)):
+            views.append(image[(top + row_index)[:, None], (left + col_index)[None, :]])
+        
+        return np.stack(views).astype('float32', copy=False)
+    
+    def _predict_with_tta(self, processed_image: np.ndarray, processed_metadata: np.ndarray,
+                          first_pass: np.ndarray) -> Tuple[np.ndarray, int]:
+        """Average first-pass probabilities with a single batched pass over augmented views"""
+        views = self._build_tta_views(processed_image)
+        metadata_batch = np.repeat(processed_metadata, len(views), axis=0)
+        
+        augmented = self._forward(views, metadata_batch)
+        total_views = len(views) + 1
+        probabilities = (first_pass + augmented.sum(axis=0)) / total_views
+        
+        return probabilities, total_views
+    
+    def predict(self, image: Image.Image, metadata: List[float], tta: Optional[bool] = None,
+                return_embedding: bool = False) -> Dict:
+        """
+        Make prediction for single image
+        
+        tta=None applies test-time augmentation according to the configured policy,
+        tta=True forces it and tta=False disables it.
+        return_embedding=True adds the penultimate-layer embedding of the original view;
+        it always comes from the full model, so the cascade is bypassed.
+        """
         if not self.is_loaded or self.model is None:
             raise ValueError("Model not loaded. Call load_model() first.")
         
         try:
             # Preprocess inputs
-            processed_image = self.preprocess_image(image)
+            image_batch, processed_image = self.preprocess_batch([image])
+            image_array = image_batch[0]
             processed_metadata = self.preprocess_metadata(*metadata)
             
+            # Cascade or overload: cheap model first, full model only when its answer is not final
+            degraded = self.degradation_active
+            use_fast = (self.cascade_active or degraded) and not return_embedding
+            if use_fast:
+                probabilities = self._forward_fast(processed_image, processed_metadata)[0]
+                if self._fast_accepts(probabilities, tta, degraded):
+                    result = self._fast_result(probabilities, metadata, degraded)
+                    return self._attach_explanation(result, image_array, processed_metadata[0])
+            
             # Make prediction (7 classes as in notebook)
-            predictions = self.model.predict(
-                [processed_image, processed_metadata], 
-                verbose=0
-            )
-            diagnosis_class = int(np.argmax(predictions[0]))
-            diagnosis_confidence = float(np.max(predictions[0]))
+            embedding = None
+            if return_embedding:
+                probabilities, embeddings = self._forward_with_embedding(processed_image, processed_metadata)
+                probabilities, embedding = probabilities[0], embeddings[0]
+            else:
+                probabilities = self._forward(processed_image, processed_metadata)[0]
+            if use_fast:
+                self._record_route("full")
             
-            # Get diagnosis and risk info
-            info = self._get_diagnosis_info(diagnosis_class)
-            diagnosis_info = info["diagnosis"]
-            risk_info = info["risk"]
+            result = self._full_result(probabilities, processed_image, processed_metadata, metadata, tta)
+            if embedding is not None:
+                result["embedding"] = embedding.astype('float32').tolist()
+            return self._attach_explanation(result, image_array, processed_metadata[0])
             
-            # Diagnosis probabilities for all classes
-            diagnosis_probabilities = {
-                str(i): {
-                    "diagnosis": self.diagnosis_mapping[i]["name"],
-                    "full_name": self.diagnosis_mapping[i]["full_name"],
-                    "description": self.diagnosis_mapping[i]["description"],
-                    "probability": float(predictions[0][i]),
-                    "risk_level": self.danger_mapping[self.diagnosis_mapping[i]["name"]]
-                } for i in range(len(self.diagnosis_mapping))
+        except Exception as e:
+            logger.error(f"Prediction error: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
             }
+    
+    def predict_batch(self, images: List[Image.Image], metadata_list: List[List[float]],
+                      tta: Optional[bool] = None, return_embedding: bool = False) -> List[Dict]:
+        """
+        Make predictions for a batch of images
+        
+        Runs one forward pass per cascade stage for the whole batch and follows
+        the same cascade, degradation and TTA policy as predict().
+        return_embedding=True adds embeddings as in predict() and bypasses the cascade.
+        """
+        if not self.is_loaded or self.model is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        try:
+            image_arrays, image_batch = self.preprocess_batch(images)
+            metadata_batch = np.concatenate([self.preprocess_metadata(*metadata) for metadata in metadata_list])
             
-            # Aggregated risk probabilities
-            risk_probabilities = {
-                str(i): {
-                    "probability": 0.0,
-                    "risk_info": self.risk_classes[i]
-                } for i in range(len(self.risk_classes))
-            }
+            results = [None] * len(images)
+            full_rows = np.arange(len(images))
+            # Время прямых проходов на строку (без TTA и сборки ответа) - для сравнения с теневой моделью
+            forward_ms = np.zeros(len(images))
             
-            for i, prob in enumerate(predictions[0]):
-                diagnosis_name = self.diagnosis_mapping[i]["name"]
-                risk_level = self.danger_mapping.get(diagnosis_name, 0)
-                risk_probabilities[str(risk_level)]["probability"] += float(prob)
+            degraded = self.degradation_active
+            use_fast = (self.cascade_active or degraded) and not return_embedding
+            if use_fast:
+                started = time.perf_counter()
+                fast_probabilities = self._forward_fast(image_batch, metadata_batch)
+                forward_ms += 1000 * (time.perf_counter() - started) / len(images)
+                accepted = np.array([self._fast_accepts(p, tta, degraded) for p in fast_probabilities], dtype=bool)
+                for row in np.flatnonzero(accepted):
+                    results[row] = self._fast_result(fast_probabilities[row], metadata_list[row], degraded)
+                full_rows = np.flatnonzero(~accepted)
             
-            # Process metadata for response
-            age, sex_code, localization_code, dx_type_code = metadata
+            if len(full_rows):
+                embeddings = None
+                started = time.perf_counter()
+                if return_embedding:
+                    full_probabilities, embeddings = self._forward_with_embedding(
+                        image_batch[full_rows], metadata_batch[full_rows]
+                    )
+                else:
+                    full_probabilities = self._forward(image_batch[full_rows], metadata_batch[full_rows])
+                forward_ms[full_rows] += 1000 * (time.perf_counter() - started) / len(full_rows)
+                for i, (row, probabilities) in enumerate(zip(full_rows, full_probabilities)):
+                    if use_fast:
+                        self._record_route("full")
+                    results[row] = self._full_result(
+                        probabilities, image_batch[row:row + 1], metadata_batch[row:row + 1], metadata_list[row], tta
+                    )
+                    if embeddings is not None:
+                        results[row]["embedding"] = embeddings[i].astype('float32').tolist()
             
-            sex_name = self.sex_reverse.get(int(sex_code), "unknown")
-            localization_name = self.localization_reverse.get(int(localization_code), "unknown")
-            dx_type_name = self.dx_type_reverse.get(int(dx_type_code), "consensus")
+            for row, result in enumerate(results):
+                self._attach_explanation(result, image_arrays[row], metadata_batch[row])
             
-            return {
-                "success": True,
-                "diagnosis": {
-                    "class": diagnosis_class,
-                    "name": diagnosis_info["name"],
-                    "full_name": diagnosis_info["full_name"],
-                    "description": diagnosis_info["description"],
-                    "confidence": diagnosis_confidence
-                },
-                "risk": {
-                    "level": risk_info["level"],
-                    "name": risk_info["name"],
-                    "description": risk_info["description"],
-                    "recommendation": risk_info["recommendation"],
-                    "color": risk_info["color"],
-                    "urgency": risk_info["urgency"],
-                    "confidence": risk_probabilities[str(risk_info["level"])]["probability"]
+            # Теневая модель получает уже готовые тензоры; под перегрузкой не зеркалим
+            if self.shadow is not None and not degraded:
+                self.shadow.offer(image_arrays, metadata_batch, results, forward_ms)
+            return results
+            
+        except Exception as e:
+            logger.error(f"Batch prediction error: {str(e)}")
+            return [{"success": False, "error": str(e)} for _ in images]
+    
+    def _fast_result(self, probabilities: np.ndarray, metadata: List[float], degraded: bool = False) -> Dict:
+        """Build response for a prediction answered by the fast model variant"""
+        self._record_route("degraded" if degraded else "fast")
+        result = self._build_result(probabilities, metadata)
+        result["model_variant"] = "fast"
+        result["cascade"] = {"stage": "degraded" if degraded else "fast"}
+        result["tta"] = {"applied": False, "views": 0}
+        return result
+    
+    def _full_result(self, probabilities: np.ndarray, processed_image: np.ndarray, processed_metadata: np.ndarray,
+                     metadata: List[float], tta: Optional[bool]) -> Dict:
+        """Build response for a full-model prediction, applying TTA when the policy calls for it"""
+        tta_views = 0
+        if tta or (tta is None and self.tta_enabled and self._should_apply_tta(probabilities)):
+            probabilities, tta_views = self._predict_with_tta(processed_image, processed_metadata, probabilities)
+        
+        result = self._build_result(probabilities, metadata)
+        result["model_variant"] = "primary"
+        result["cascade"] = {"stage": "full"}
+        result["tta"] = {
+            "applied": tta_views > 0,
+            "views": tta_views
+        }
+        return result
+    
+    def _build_result(self, probabilities: np.ndarray, metadata: List[float]) -> Dict:
+        """Build prediction response from class probabilities"""
+        diagnosis_class = int(np.argmax(probabilities))
+        diagnosis_confidence = float(np.max(probabilities))
+        
+        # Get diagnosis and risk info
+        info = self._get_diagnosis_info(diagnosis_class)
+        diagnosis_info = info["diagnosis"]
+        risk_info = info["risk"]
+        
+        # Diagnosis probabilities for all classes
+        diagnosis_probabilities = {
+            str(i): {
+                "diagnosis": self.diagnosis_mapping[i]["name"],
+                "full_name": self.diagnosis_mapping[i]["full_name"],
+                "description": self.diagnosis_mapping[i]["description"],
+                "probability": float(probabilities[i]),
+                "risk_level": self.danger_mapping[self.diagnosis_mapping[i]["name"]]
+            } for i in range(len(self.diagnosis_mapping))
+        }
+        
+        # Aggregated risk probabilities
+        risk_probabilities = {
+            str(i): {
+                "probability": 0.0,
+                "risk_info": self.risk_classes[i]
+            } for i in range(len(self.risk_classes))
+        }
+        
+        for i, prob in enumerate(probabilities):
+            diagnosis_name = self.diagnosis_mapping[i]["name"]
+            risk_level = self.danger_mapping.get(diagnosis_name, 0)
+            risk_probabilities[str(risk_level)]["probability"] += float(prob)
+        
+        # Process metadata for response
+        age, sex_code, localization_code, dx_type_code = metadata
+        
+        sex_name = self.sex_reverse.get(int(sex_code), "unknown")
+        localization_name = self.localization_reverse.get(int(localization_code), "unknown")
+        dx_type_name = self.dx_type_reverse.get(int(dx_type_code), "consensus")
+        
+        return {
+            "success": True,
+            "diagnosis": {
+                "class": diagnosis_class,
+                "name": diagnosis_info["name"],
+                "full_name": diagnosis_info["full_name"],
+                "description": diagnosis_info["description"],
+                "confidence": diagnosis_confidence
+            },
+            "risk": {
+                "level": risk_info["level"],
+                "name": risk_info["name"],
+                "description": risk_info["description"],
+                "recommendation": risk_info["recommendation"],
+                "color": risk_info["color"],
+                "urgency": risk_info["urgency"],
+                "confidence": risk_probabilities[str(risk_info["level"])]["probability"]
+            },
+            "metadata": {
+                "age": age,
+                "sex": {
+                    "code": sex_code,
+                    "name": sex_name
                 },
-                "metadata": {
-                    "age": age,
-                    "sex": {
-                        "code": sex_code,
-                        "name": sex_name
-                    },
-                    "localization": {
-                        "code": localization_code,
-                        "name": localization_name,
-                        "description": self._get_localization_description(localization_name)
-                    },
-                    "dx_type": {
-                        "code": dx_type_code,
-                        "name": dx_type_name,
-                        "description": self._get_dx_type_description(dx_type_name)
-                    }
+                "localization": {
+                    "code": localization_code,
+                    "name": localization_name,
+                    "description": self._get_localization_description(localization_name)
                 },
-                "probabilities": {
-                    "diagnosis": diagnosis_probabilities,
-                    "risk": risk_probabilities
+                "dx_type": {
+                    "code": dx_type_code,
+                    "name": dx_type_name,
+                    "description": self._get_dx_type_description(dx_type_name)
                 }
+            },
+            "probabilities": {
+                "diagnosis": diagnosis_probabilities,
+                "risk": risk_probabilities
             }
-            
-        except Exception as e:
-            logger.error(f"Prediction error: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+        }
     
     def _get_dx_type_description(self, dx_type: str) -> str:
         """Get description for diagnosis type"""
@@ -309,22 +967,41 @@ class SkinCancerModel:
     
     def validate_metadata(self, age: float, sex: float, localization: float, dx_type: float) -> Tuple[bool, str]:
         """Validate metadata inputs using exact ranges from notebook"""
-        if age < 0 or age > 120:
-            return False, "Возраст должен быть от 0 до 120 лет"
+        error = self.validate_metadata_batch(np.array([[age, sex, localization, dx_type]], dtype='float32'))[0]
+        if error is not None:
+            return False, error
         
-        # Sex validation (0, 1, 2 as in sex_mapping)
-        if sex not in [0, 1, 2]:
-            return False, "Пол должен быть 0 (male), 1 (female) или 2 (unknown)"
+        return True, "OK"
+    
+    def validate_metadata_batch(self, metadata_batch: np.ndarray) -> List[Optional[str]]:
+        """
+        Validate an (N, 4) metadata array with vectorized range checks
         
-        # Localization validation (0-14 as in localization_danger_mapping)
-        if localization < 0 or localization > 14:
-            return False, "Локализация должна быть в диапазоне от 0 до 14"
+        Returns the first error message of each row, or None for valid rows.
+        """
+        metadata_batch = np.asarray(metadata_batch, dtype='float32').reshape(-1, self.meta_dim)
+        age, sex, localization, dx_type = metadata_batch.T
         
-        # Diagnosis type validation (0-3 as in dx_type_final_mapping)
-        if dx_type not in [0, 1, 2, 3]:
-            return False, "Тип диагностики должен быть 0 (follow_up), 1 (consensus), 2 (confocal) или 3 (histo)"
+        checks = [
+            (~((age >= 0) & (age <= 120)),
+             "Возраст должен быть от 0 до 120 лет"),
+            # Sex validation (0, 1, 2 as in sex_mapping)
+            (~np.isin(sex, list(self.sex_reverse)),
+             "Пол должен быть 0 (male), 1 (female) или 2 (unknown)"),
+            # Localization validation (0-14 as in localization_danger_mapping)
+            (~((localization >= 0) & (localization <= 14)),
+             "Локализация должна быть в диапазоне от 0 до 14"),
+            # Diagnosis type validation (0-3 as in dx_type_final_mapping)
+            (~np.isin(dx_type, list(self.dx_type_reverse)),
+             "Тип диагностики должен быть 0 (follow_up), 1 (consensus), 2 (confocal) или 3 (histo)")
+        ]
         
-        return True, "OK"
+        errors: List[Optional[str]] = [None] * len(metadata_batch)
+        # Обратный порядок, чтобы у строки осталась первая по порядку ошибка
+        for failed, message in reversed(checks):
+            for row in np.flatnonzero(failed):
+                errors[row] = message
+        return errors
     
     def get_sex_options(self) -> Dict:
         """Get available sex options"""
@@ -369,6 +1046,7 @@ class SkinCancerModel:
         return {
             "is_loaded": self.is_loaded,
             "model_path": self.model_path,
+            "model_version": self.model_version,
             "image_shape": self.image_shape,
             "meta_dim": self.meta_dim,
             "sex_options": self.get_sex_options(),
@@ -377,5 +1055,31 @@ class SkinCancerModel:
             "diagnosis_classes": self.get_diagnosis_classes(),
             "risk_classes": self.get_risk_classes(),
             "total_diagnosis_classes": len(self.diagnosis_mapping),
-            "total_risk_classes": len(self.risk_classes)
+            "total_risk_classes": len(self.risk_classes),
+            "embedding_available": self.embedding_available,
+            "materialized": self._model is not None,
+            "explanations_enabled": self.explanation_store is not None,
+            "shadow_candidate": self.shadow.candidate.model_version if self.shadow is not None else None,
+            "cascade": {
+                "enabled": self.cascade_active,
+                "fast_model_path": self.fast_model_path,
+                "fast_image_shape": self.fast_image_shape,
+                "thresholds": self.cascade_thresholds
+            },
+            "degradation": {
+                "enabled": self.degradation_enabled,
+                "degraded": self.degradation_active,
+                "queue_high": self.degradation_queue_high,
+                "queue_low": self.degradation_queue_low,
+                "p95_high_ms": self.degradation_p95_high_ms,
+                "p95_low_ms": self.degradation_p95_low_ms,
+                "min_hold_s": self.degradation_min_hold_s
+            },
+            "tta": {
+                "enabled": self.tta_enabled,
+                "classes": sorted(self.tta_classes),
+                "min_risk_level": self.tta_min_risk_level,
+                "confidence_threshold": self.tta_confidence_threshold,
+                "crop_fraction": self.tta_crop_fraction
+            }
         }
\ No newline at end of file
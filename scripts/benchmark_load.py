@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Сравнение времени загрузки модели: .h5 против серверного артефакта
+
+Каждый замер выполняется в отдельном процессе (холодный старт воркера).
+
+Использование:
+    python scripts/benchmark_load.py [--model best_model.h5] [--artifact best_model.artifact] [--runs 5]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(model_path: str) -> dict:
+    """Замер в текущем процессе: импорт TF, load_model и первое предсказание"""
+    started = time.perf_counter()
+    from PIL import Image
+    from app.models.model_manager import SkinCancerModel
+    imported = time.perf_counter()
+
+    model = SkinCancerModel()
+    if not model.load_model(model_path):
+        raise RuntimeError(f"Не удалось загрузить модель: {model_path}")
+    loaded = time.perf_counter()
+
+    result = model.predict(Image.new('RGB', (200, 300), color='red'), [45, 1, 5, 1], tta=False)
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    predicted = time.perf_counter()
+
+    return {
+        "import_s": imported - started,
+        "load_s": loaded - imported,
+        "first_predict_s": predicted - loaded,
+        "ready_s": predicted - imported
+    }
+
+
+def run_isolated(model_path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", model_path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    from config.settings import get_settings
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки модели")
+    parser.add_argument("--model", default=settings.absolute_model_path, help="Путь к модели .h5")
+    parser.add_argument("--artifact", default=None, help="Папка артефакта")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker)))
+        return True
+
+    artifact_path = args.artifact or settings.absolute_model_artifact_path or os.path.splitext(args.model)[0] + ".artifact"
+    candidates = {".h5": args.model, "artifact": artifact_path}
+
+    print(f"⏱  Бенчмарк загрузки ({args.runs} запусков в отдельных процессах)")
+    print(f"{'формат':>10} {'load, с':>10} {'1-й predict, с':>15} {'готовность, с':>14}")
+    for name, path in candidates.items():
+        if not os.path.exists(path):
+            print(f"{name:>10}   ❌ не найден: {path}")
+            continue
+
+        runs = [run_isolated(path) for _ in range(args.runs)]
+        print(f"{name:>10} {statistics.median(r['load_s'] for r in runs):>10.3f} "
+              f"{statistics.median(r['first_predict_s'] for r in runs):>15.3f} "
+              f"{statistics.median(r['ready_s'] for r in runs):>14.3f}")
+
+    return True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Пиковое потребление памяти (RSS) сервера при параллельных запросах /predict
+
+Для каждого уровня параллельности запускается отдельный процесс сервера:
+пик RSS (VmHWM) растёт монотонно и сбрасывается только перезапуском.
+Кэш похожих результатов отключается, чтобы каждый запрос проходил весь путь.
+
+Использование:
+    python scripts/benchmark_memory.py [--concurrency 1,16,64] [--image photo.jpg] [--budget-mb 512] [--no-draft]
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MB = 1024 * 1024
+
+
+def synthetic_jpeg(width: int = 4000, height: int = 3000) -> bytes:
+    """Фото-подобный JPEG размера типичной камеры смартфона"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, size=(height // 16, width // 16, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((width, height), Image.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, env_overrides: dict) -> subprocess.Popen:
+    env = {**os.environ, "RESULT_CACHE_ENABLED": "false", "AUTOTUNE_ON_STARTUP": "false", **env_overrides}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+
+
+def wait_ready(base_url: str, server: subprocess.Popen, timeout_s: float = 300.0) -> None:
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Сервер завершился: {server.stderr.read()[-2000:]}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2).json().get("model_loaded"):
+                return
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(1)
+    raise RuntimeError("Сервер не загрузил модель за отведённое время")
+
+
+def memory_stats(base_url: str) -> dict:
+    return httpx.get(f"{base_url}/api/v1/memory-stats", timeout=10).json()
+
+
+async def run_load(base_url: str, image_data: bytes, concurrency: int, requests_per_client: int) -> dict:
+    form = {"age": "45", "sex": "1", "localization": "5", "dx_type": "1", "tta": "false"}
+    latencies, statuses = [], {}
+
+    async def client(http: httpx.AsyncClient):
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            response = await http.post(f"{base_url}/api/v1/predict", data=form,
+                                       files={"image": ("lesion.jpg", image_data, "image/jpeg")})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as http:
+        await asyncio.gather(*[client(http) for _ in range(concurrency)])
+
+    latencies.sort()
+    return {"statuses": statuses, "p50_s": latencies[len(latencies) // 2], "max_s": latencies[-1]}
+
+
+def measure_level(concurrency: int, image_data: bytes, requests_per_client: int, env_overrides: dict) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(port, env_overrides)
+    try:
+        wait_ready(base_url, server)
+        # Прогрев: первый запрос инициализирует граф и буферы
+        asyncio.run(run_load(base_url, image_data, 1, 1))
+        idle = memory_stats(base_url)["process"]
+
+        load = asyncio.run(run_load(base_url, image_data, concurrency, requests_per_client))
+        stats = memory_stats(base_url)
+        return {
+            "concurrency": concurrency,
+            "idle_rss_mb": idle["rss_bytes"] / MB if idle["rss_bytes"] else None,
+            "peak_before_mb": idle["peak_rss_bytes"] / MB if idle["peak_rss_bytes"] else None,
+            "peak_rss_mb": stats["process"]["peak_rss_bytes"] / MB if stats["process"]["peak_rss_bytes"] else None,
+            "budget_waited": stats["waited"],
+            "budget_rejected": stats["rejected"],
+            **load
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пикового RSS сервера")
+    parser.add_argument("--concurrency", default="1,16,64", help="Уровни параллельности через запятую")
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--image", default=None, help="JPEG для запросов (по умолчанию синтетический 4000x3000)")
+    parser.add_argument("--budget-mb", type=int, default=None, help="MEMORY_BUDGET_MB сервера")
+    parser.add_argument("--no-draft", action="store_true", help="Отключить IMAGE_DRAFT_DECODE")
+    parser.add_argument("--output", default=None, help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_data = f.read()
+    else:
+        image_data = synthetic_jpeg()
+
+    env_overrides = {}
+    if args.budget_mb is not None:
+        env_overrides["MEMORY_BUDGET_MB"] = str(args.budget_mb)
+    if args.no_draft:
+        env_overrides["IMAGE_DRAFT_DECODE"] = "false"
+
+    print(f"🧠 Бенчмарк памяти: изображение {len(image_data) / MB:.1f} MB, "
+          f"{args.requests_per_client} запросов на клиента, {env_overrides or 'настройки по умолчанию'}")
+    print(f"{'клиентов':>9} {'RSS покоя, MB':>14} {'пик до, MB':>11} {'пик, MB':>9} {'ожиданий':>9} "
+          f"{'отказов':>8} {'p50, с':>7} {'max, с':>7}  статусы")
+
+    results = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        try:
+            row = measure_level(concurrency, image_data, args.requests_per_client, env_overrides)
+        except Exception as e:
+            print(f"{concurrency:>9}   ❌ {e}")
+            continue
+        results.append(row)
+        print(f"{row['concurrency']:>9} {row['idle_rss_mb']:>14.0f} {row['peak_before_mb']:>11.0f} "
+              f"{row['peak_rss_mb']:>9.0f} {row['budget_waited']:>9} {row['budget_rejected']:>8} "
+              f"{row['p50_s']:>7.2f} {row['max_s']:>7.2f}  {row['statuses']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Результаты сохранены: {args.output}")
+    return bool(results)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
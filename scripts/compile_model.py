@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Скрипт для компиляции модели .h5 в серверный артефакт с быстрой загрузкой
+
+Использование:
+    python scripts/compile_model.py [--model path/to/best_model.h5] [--output path/to/artifact_dir]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tensorflow as tf
+
+from app.utils import model_artifact
+from config.settings import get_settings
+
+
+def compile_model(model_path: str, output_path: str) -> bool:
+    """Конвертация .h5 в артефакт (архитектура JSON + плоский файл весов)"""
+    if not os.path.exists(model_path):
+        print(f"❌ Файл модели не найден: {model_path}")
+        return False
+
+    print(f"🔄 Загрузка модели: {model_path}")
+    started = time.perf_counter()
+    model = tf.keras.models.load_model(model_path)
+    print(f"   Загрузка .h5: {time.perf_counter() - started:.2f} с")
+
+    print(f"🔄 Запись артефакта: {output_path}")
+    manifest = model_artifact.write_artifact(model, output_path, source_path=model_path)
+    print(f"✅ Артефакт записан: {len(manifest['weights'])} тензоров, "
+          f"{manifest['weights_bytes'] / (1024 * 1024):.2f} MB весов")
+
+    # Проверяем, что артефакт даёт те же веса
+    rebuilt = model_artifact.build_model(output_path, manifest)
+    for original, restored in zip(model.get_weights(), rebuilt.get_weights()):
+        if original.shape != restored.shape or not (original == restored).all():
+            print("❌ Веса артефакта не совпадают с исходной моделью")
+            return False
+    print("✅ Веса артефакта совпадают с исходной моделью")
+
+    return True
+
+
+def main():
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Компиляция модели в серверный артефакт")
+    parser.add_argument("--model", default=settings.absolute_model_path, help="Путь к модели .h5")
+    parser.add_argument("--output", default=None, help="Папка артефакта (по умолчанию рядом с моделью)")
+    args = parser.parse_args()
+
+    output_path = args.output or settings.absolute_model_artifact_path or os.path.splitext(args.model)[0] + ".artifact"
+    return compile_model(args.model, output_path)
+
+
+if __name__ == "__main__":
+    main()
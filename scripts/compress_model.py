@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Сжатие модели: варианты best_model.h5 и отчёт точность / задержка / память (фронт Парето)
+
+Варианты:
+    baseline      - исходная модель
+    pruned_<N>    - магнитудный прунинг N% весов Conv2D/Dense (.h5)
+    float16       - TFLite с весами float16
+    int8          - TFLite, полная int8 пост-тренировочная квантизация (калибровка на кеше)
+    res_<H>x<W>   - уменьшенное входное разрешение (.h5, только для полностью свёрточной ветки)
+
+Каждый вариант замеряется в отдельном процессе (задержка batch=1, пропускная способность,
+RSS) и оценивается на кеше тензоров из scripts/evaluate.py build-cache.
+
+Использование:
+    python scripts/compress_model.py --cache data/eval_cache --output models/compressed
+    python scripts/compress_model.py --cache data/eval_cache --variants int8,res_240x160 --sparsity 0.5,0.8
+
+Любой вариант можно подключить как быструю модель: FAST_MODEL_PATH=models/compressed/variants/int8.tflite
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import logging
+import subprocess
+
+import numpy as np
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+
+DEFAULT_VARIANTS = "pruned,float16,int8,res_240x160,res_180x120"
+PARETO_OBJECTIVES = {"balanced_accuracy": "max", "latency_p50_ms": "min", "size_mb": "min"}
+
+
+def read_memory_kb() -> dict:
+    """Текущий (VmRSS) и пиковый (VmHWM) RSS процесса, KB"""
+    memory = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    memory[key] = int(value.split()[0])
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory = {"VmRSS": peak, "VmHWM": peak}
+    return memory
+
+
+def compressed_size(path: str) -> int:
+    """Размер файла после zlib (нули после прунинга выигрывают только при сжатии)"""
+    compressor = zlib.compressobj(6)
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            size += len(compressor.compress(chunk))
+    return size + len(compressor.flush())
+
+
+def load_variant(path: str):
+    """Keras-модель или TFLite-интерпретатор с одинаковым predict() и формой входа изображения"""
+    if path.endswith(".tflite"):
+        from app.utils.tflite_model import TFLiteModel
+        model = TFLiteModel(path)
+        return model, model.image_shape
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(path)
+    image_shape = next(tuple(t.shape[1:]) for t in model.inputs if len(t.shape) == 4)
+    return model, image_shape
+
+
+def prepare_images(images: np.ndarray, image_shape) -> np.ndarray:
+    """Нормализация uint8 кеша и ресайз под вход варианта (как _forward_fast на сервере)"""
+    from app.models.model_manager import SkinCancerModel
+    batch = SkinCancerModel.normalize_images(np.ascontiguousarray(images))
+    if tuple(batch.shape[1:3]) != tuple(image_shape[:2]):
+        import tensorflow as tf
+        batch = tf.image.resize(batch, image_shape[:2]).numpy()
+    return batch
+
+
+def measure_variant(path: str, cache_dir: str, batch_size: int, iterations: int) -> dict:
+    """Замер в текущем процессе: память загрузки, задержка batch=1, пропускная способность, качество"""
+    from app.models.model_manager import SkinCancerModel
+    from app.utils.evaluation import classification_report
+    from app.utils.tensor_cache import open_tensor_cache
+
+    # TF уже импортирован вместе с model_manager, поэтому в RSS загрузки попадают только веса
+    cache = open_tensor_cache(cache_dir)
+    memory_before = read_memory_kb()
+    started = time.perf_counter()
+    model, image_shape = load_variant(path)
+    load_s = time.perf_counter() - started
+    memory_loaded = read_memory_kb()
+
+    single_images = prepare_images(cache.images[:1], image_shape)
+    single_metadata = cache.metadata[:1]
+    model.predict([single_images, single_metadata], verbose=0)  # прогрев
+
+    single = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        model.predict([single_images, single_metadata], verbose=0)
+        single.append(time.perf_counter() - started)
+
+    batch_images = prepare_images(cache.images[:batch_size], image_shape)
+    batch_metadata = cache.metadata[:batch_size]
+    model.predict([batch_images, batch_metadata], verbose=0)
+    batched = []
+    for _ in range(max(1, iterations // 4)):
+        started = time.perf_counter()
+        model.predict([batch_images, batch_metadata], verbose=0)
+        batched.append(time.perf_counter() - started)
+
+    probabilities = []
+    for images, metadata, _ in cache.iter_batches(batch_size):
+        probabilities.append(model.predict([prepare_images(images, image_shape), metadata], verbose=0))
+
+    reference = SkinCancerModel()
+    class_names = [reference.diagnosis_mapping[i]["name"] for i in range(len(reference.diagnosis_mapping))]
+    report = classification_report(np.concatenate(probabilities), cache.labels, class_names)
+    memory_peak = read_memory_kb()
+
+    single_ms = 1000 * np.asarray(single)
+    return {
+        "image_shape": list(image_shape),
+        "load_s": load_s,
+        "latency_p50_ms": float(np.percentile(single_ms, 50)),
+        "latency_p95_ms": float(np.percentile(single_ms, 95)),
+        "throughput_per_s": batch_size * len(batched) / float(np.sum(batched)),
+        "rss_load_mb": (memory_loaded["VmRSS"] - memory_before["VmRSS"]) / 1024,
+        "rss_peak_mb": memory_peak["VmHWM"] / 1024,
+        "accuracy": report["accuracy"],
+        "balanced_accuracy": report["balanced_accuracy"],
+        "recall_mel": report["per_class"]["mel"]["recall"],
+        "ece": report["calibration"]["ece"]
+    }
+
+
+def run_isolated(path: str, args) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", path, "--cache", args.cache,
+         "--batch-size", str(args.batch_size), "--iterations", str(args.iterations)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def representative_data(model, cache, samples: int):
+    """Генератор калибровочных входов для int8 в порядке входов модели"""
+    def generate():
+        for i in range(min(samples, len(cache.labels))):
+            image = prepare_images(cache.images[i:i + 1], cache.images.shape[1:])
+            metadata = cache.metadata[i:i + 1]
+            yield [image if len(t.shape) == 4 else metadata for t in model.inputs]
+    return generate
+
+
+def build_variants(args, cache) -> dict:
+    """Создание файлов вариантов; возвращает {имя: (путь, параметры или ошибка)}"""
+    import tensorflow as tf
+    from app.utils.compression import convert_tflite, prune_magnitude, rebuild_with_resolution
+
+    variants_dir = os.path.join(args.output, "variants")
+    os.makedirs(variants_dir, exist_ok=True)
+
+    print(f"🔄 Загрузка модели: {args.model}")
+    model = tf.keras.models.load_model(args.model)
+    variants = {"baseline": (args.model, {})}
+
+    for name in args.variants.split(","):
+        name = name.strip()
+        print(f"🔄 Вариант {name}...")
+        try:
+            if name == "pruned":
+                for sparsity in (float(s) for s in args.sparsity.split(",")):
+                    pruned, info = prune_magnitude(model, sparsity)
+                    path = os.path.join(variants_dir, f"pruned_{int(sparsity * 100)}.h5")
+                    pruned.save(path)
+                    variants[f"pruned_{int(sparsity * 100)}"] = (path, info)
+                continue
+            if name in ("float16", "int8"):
+                data = representative_data(model, cache, args.calibration_samples) if name == "int8" else None
+                path = os.path.join(variants_dir, f"{name}.tflite")
+                with open(path, "wb") as f:
+                    f.write(convert_tflite(model, name, data))
+                variants[name] = (path, {})
+                continue
+            if name.startswith("res_"):
+                height, width = (int(v) for v in name[4:].split("x"))
+                path = os.path.join(variants_dir, f"{name}.h5")
+                rebuild_with_resolution(model, height, width).save(path)
+                variants[name] = (path, {"image_shape": [height, width, 3]})
+                continue
+            raise ValueError(f"Unknown variant: {name}")
+        except Exception as e:
+            print(f"   ⚠️  пропущен: {str(e)}")
+            variants[name] = (None, {"error": str(e)})
+
+    return variants
+
+
+def _fmt(value, spec: str = ".4f") -> str:
+    return "—" if value is None else format(value, spec)
+
+
+def write_markdown(report: dict, path: str) -> None:
+    rows = sorted(report["variants"], key=lambda v: (not v.get("pareto"), -(v.get("balanced_accuracy") or 0)))
+    lines = [
+        f"# Compression report: {os.path.basename(report['model'])}",
+        "",
+        f"Evaluation set: {report['samples']} samples, batch size {report['batch_size']}. "
+        "Pareto front over balanced accuracy (max), batch=1 p50 latency (min) and file size (min).",
+        "",
+        "| variant | pareto | bal. acc | Δ bal. acc | recall mel | p50 ms | p95 ms | img/s | size MB | zlib MB | RSS load MB |",
+        "|---|---|---|---|---|---|---|---|---|---|---|"
+    ]
+    for v in rows:
+        if "error" in v:
+            lines.append(f"| {v['name']} | — | skipped: {v['error']} | | | | | | | | |")
+            continue
+        lines.append(
+            f"| {v['name']} | {'✅' if v['pareto'] else ''} | {_fmt(v['balanced_accuracy'])} | "
+            f"{_fmt(v.get('balanced_accuracy_delta'), '+.4f')} | {_fmt(v['recall_mel'])} | "
+            f"{v['latency_p50_ms']:.1f} | {v['latency_p95_ms']:.1f} | {v['throughput_per_s']:.1f} | "
+            f"{v['size_mb']:.2f} | {v['compressed_mb']:.2f} | {v['rss_load_mb']:.1f} |"
+        )
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Варианты сжатия модели и отчёт Парето")
+    parser.add_argument("--model", default=settings.absolute_model_path, help="Путь к модели .h5")
+    parser.add_argument("--cache", required=True, help="Кеш тензоров размеченного набора (evaluate.py build-cache)")
+    parser.add_argument("--output", default="models/compressed", help="Папка для вариантов и отчёта")
+    parser.add_argument("--variants", default=DEFAULT_VARIANTS, help="Список вариантов через запятую")
+    parser.add_argument("--sparsity", default="0.5", help="Доли прунинга через запятую")
+    parser.add_argument("--calibration-samples", type=int, default=256, help="Образцов для калибровки int8")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=50, help="Замеров задержки batch=1")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure_variant(args.worker, args.cache, args.batch_size, args.iterations)))
+        return True
+
+    logging.basicConfig(level=logging.INFO)
+    from app.utils.compression import pareto_front
+    from app.utils.tensor_cache import open_tensor_cache
+
+    cache = open_tensor_cache(args.cache)
+    variants = build_variants(args, cache)
+
+    results = []
+    for name, (path, info) in variants.items():
+        if path is None:
+            results.append({"name": name, **info})
+            continue
+        print(f"⏱  Замер {name} (отдельный процесс)...")
+        try:
+            metrics = run_isolated(path, args)
+        except subprocess.CalledProcessError as e:
+            print(f"   ❌ ошибка замера: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+            results.append({"name": name, "path": path, "error": "benchmark failed", **info})
+            continue
+        results.append({
+            "name": name,
+            "path": path,
+            "size_mb": os.path.getsize(path) / (1024 * 1024),
+            "compressed_mb": compressed_size(path) / (1024 * 1024),
+            **info,
+            **metrics
+        })
+
+    baseline = next((r for r in results if r["name"] == "baseline" and "error" not in r), None)
+    measured = [r for r in results if "error" not in r]
+    for result, on_front in zip(measured, pareto_front(measured, PARETO_OBJECTIVES)):
+        result["pareto"] = on_front
+        if baseline is not None:
+            result["balanced_accuracy_delta"] = result["balanced_accuracy"] - baseline["balanced_accuracy"]
+            result["speedup_p50"] = baseline["latency_p50_ms"] / result["latency_p50_ms"]
+
+    report = {
+        "model": args.model,
+        "samples": int(len(cache.labels)),
+        "batch_size": args.batch_size,
+        "objectives": PARETO_OBJECTIVES,
+        "variants": results
+    }
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    write_markdown(report, os.path.join(args.output, "report.md"))
+
+    print(f"\n{'вариант':>14} {'Парето':>7} {'bal.acc':>8} {'p50, мс':>8} {'изобр./с':>9} {'MB':>7}")
+    for r in measured:
+        print(f"{r['name']:>14} {'✅' if r['pareto'] else '':>7} {r['balanced_accuracy']:>8.4f} "
+              f"{r['latency_p50_ms']:>8.1f} {r['throughput_per_s']:>9.1f} {r['size_mb']:>7.2f}")
+    print(f"💾 Отчёт: {os.path.join(args.output, 'report.md')}")
+    return True
+
+
+if __name__ == "__main__":
+    main()
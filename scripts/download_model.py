@@ -1,80 +1,96 @@
 #!/usr/bin/env python3
 """
-Скрипт для скачивания модели из облачного хранилища
+Скрипт для скачивания модели по манифесту артефактов
+
+Загрузка идет параллельными Range-запросами с докачкой после обрыва, SHA-256
+сверяется с манифестом, файл попадает в общий кэш узла (ARTIFACT_CACHE_DIR)
+и атомарно ставится на место модели.
+
+Использование:
+    python scripts/download_model.py [--manifest models/manifest.json]
+    python scripts/download_model.py --url https://.../best_model.h5 --sha256 <hex> [--output path]
 """
 
-import requests
 import os
 import sys
+import argparse
+import threading
 from tqdm import tqdm
 
 # Добавляем корневую директорию в путь
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.settings import get_settings
+from app.utils.artifact_fetcher import ArtifactFetcher, load_manifest
 
 def download_model():
-    """Скачивание модели из облачного хранилища"""
+    """Скачивание модели по манифесту или по URL с контрольной суммой"""
     settings = get_settings()
-    
-    # URL для скачивания модели (замените на реальный)
-    model_urls = [
-        "https://example.com/models/skin_cancer_model.h5",
-        "https://drive.google.com/uc?export=download&id=YOUR_FILE_ID",
-        "https://dropbox.com/s/.../best_model.h5?dl=1"
-    ]
-    
-    print("📥 Скачивание модели...")
-    print("⚠️  ВАЖНО: Замените URL в коде на реальную ссылку на вашу модель")
-    
-    # Создаем директорию если нужно
-    os.makedirs(os.path.dirname(settings.absolute_model_path), exist_ok=True)
-    
-    # Пробуем скачать с первого доступного URL
-    for i, model_url in enumerate(model_urls, 1):
-        print(f"\nПопытка {i}: {model_url}")
-        
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Скачивание артефактов модели")
+    parser.add_argument("--manifest", default=settings.absolute_model_manifest, help="JSON-манифест (путь или URL)")
+    parser.add_argument("--url", action="append", default=None, help="URL модели (можно несколько зеркал)")
+    parser.add_argument("--sha256", default=None, help="SHA-256 модели для --url")
+    parser.add_argument("--size", type=int, default=None, help="Ожидаемый размер в байтах для --url")
+    parser.add_argument("--output", default=settings.absolute_model_path, help="Куда положить модель для --url")
+    parser.add_argument("--cache-dir", default=settings.absolute_artifact_cache_dir)
+    parser.add_argument("--parallelism", type=int, default=settings.FETCH_PARALLELISM)
+    parser.add_argument("--chunk-mb", type=int, default=settings.FETCH_CHUNK_MB)
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.sha256:
+            print("❌ Для --url нужна контрольная сумма --sha256")
+            return False
+        entries = [{"path": os.path.abspath(args.output), "urls": args.url,
+                    "sha256": args.sha256.lower(), "size": args.size}]
+    elif args.manifest:
         try:
-            response = requests.get(model_url, stream=True)
-            response.raise_for_status()
-            
-            # Получаем общий размер файла
-            total_size = int(response.headers.get('content-length', 0))
-            
-            # Скачиваем с прогресс-баром
-            with open(settings.absolute_model_path, 'wb') as f, tqdm(
-                desc="Скачивание",
-                total=total_size,
-                unit='iB',
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as pbar:
-                for chunk in response.iter_content(chunk_size=8192):
-                    size = f.write(chunk)
-                    pbar.update(size)
-            
-            file_size = os.path.getsize(settings.absolute_model_path) / (1024*1024)
-            print(f"✅ Модель сохранена: {settings.absolute_model_path} ({file_size:.2f} MB)")
-            
-            # Проверяем валидность файла
-            if file_size < 1:  # Меньше 1MB - вероятно ошибка
-                print("❌ Файл слишком маленький, вероятно ошибка скачивания")
-                os.remove(settings.absolute_model_path)
-                continue
-                
-            return True
-            
+            entries = load_manifest(args.manifest, timeout_s=settings.FETCH_TIMEOUT_S)
         except Exception as e:
-            print(f"❌ Ошибка скачивания: {e}")
-            continue
-    
-    print("\n❌ Не удалось скачать модель ни с одного URL")
-    print("📋 Альтернативные варианты:")
-    print("   1. Поместите модель вручную в models/trained_models/best_model.h5")
-    print("   2. Обучите модель заново в ноутбуке")
-    print("   3. Используйте Google Drive/Dropbox для обмена моделью")
-    
-    return False
+            print(f"❌ Не удалось прочитать манифест {args.manifest}: {e}")
+            return False
+    else:
+        print("❌ Не задан манифест (MODEL_MANIFEST или --manifest) и не указан --url")
+        return False
+
+    print(f"📥 Скачивание артефактов: {len(entries)}")
+    print(f"   Кэш: {args.cache_dir}")
+
+    known_sizes = [entry.get("size") for entry in entries]
+    total = sum(known_sizes) if all(known_sizes) else None
+    pbar_lock = threading.Lock()
+    with tqdm(desc="Скачивание", total=total, unit='iB', unit_scale=True, unit_divisor=1024) as pbar:
+        def progress(delta: int):
+            with pbar_lock:
+                pbar.update(delta)
+
+        fetcher = ArtifactFetcher(
+            args.cache_dir,
+            parallelism=args.parallelism,
+            chunk_size=args.chunk_mb * 1024 * 1024,
+            timeout_s=settings.FETCH_TIMEOUT_S,
+            retries=settings.FETCH_RETRIES,
+            progress=progress
+        )
+        try:
+            paths = fetcher.fetch_manifest(entries, base_dir)
+        except Exception as e:
+            pbar.close()
+            print(f"\n❌ Ошибка скачивания: {e}")
+            print("📋 Повторный запуск докачает недостающие части")
+            print("📋 Альтернативные варианты:")
+            print("   1. Поместите модель вручную в models/trained_models/best_model.h5")
+            print("   2. Обучите модель заново в ноутбуке")
+            return False
+
+    for path in paths:
+        file_size = os.path.getsize(path) / (1024*1024)
+        print(f"✅ Сохранено и проверено: {path} ({file_size:.2f} MB)")
+
+    return True
 
 if __name__ == "__main__":
-    download_model()
\ No newline at end of file
+    success = download_model()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Офлайн-оценка модели на размеченном датасете с кешем препроцессированных тензоров
+
+Шаг 1 (один раз): декодирование и ресайз изображений в memory-mapped uint8 .npy
+    python scripts/evaluate.py build-cache --data path/to/HAM10000 --cache data/eval_cache
+
+Шаг 2 (для каждой модели): прогон кеша большими батчами
+    python scripts/evaluate.py run --cache data/eval_cache --model models/trained_models/best_model.h5
+    python scripts/evaluate.py run --cache data/eval_cache --backend cascade --fast-model fast_model.h5
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+import numpy as np
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.model_manager import SkinCancerModel
+from app.utils.dataset import load_labeled_folder
+from app.utils.evaluation import classification_report, latency_summary
+from app.utils.tensor_cache import build_tensor_cache, open_tensor_cache
+from config.settings import get_settings
+
+
+def build_cache(args) -> bool:
+    """Препроцессинг датасета в кеш тензоров"""
+    settings = get_settings()
+    model = SkinCancerModel()
+    samples = load_labeled_folder(args.data, model)
+    if not samples:
+        print("❌ В папке нет размеченных изображений")
+        return False
+
+    print(f"🔄 Препроцессинг {len(samples)} изображений в {args.cache}...")
+    started = time.perf_counter()
+    # Тот же декодер, что и при обслуживании (IMAGE_DRAFT_DECODE), чтобы оценивались реальные пиксели
+    draft = settings.IMAGE_DRAFT_DECODE
+    cache = build_tensor_cache(samples, args.cache, model.image_to_array, model.image_shape, workers=args.workers,
+                               decode=lambda data: model.decode_image(data, draft),
+                               preprocessing={"draft_decode": draft})
+    print(f"✅ Кеш создан за {time.perf_counter() - started:.1f} с: {cache.images.shape}, "
+          f"{cache.images.nbytes / (1024 * 1024):.1f} MB")
+    return True
+
+
+def predict_cache(model: SkinCancerModel, cache, backend: str, batch_size: int):
+    """Прогон кеша через модель; возвращает вероятности, задержки и размеры батчей"""
+    probabilities, latencies, sizes = [], [], []
+    fast_accepted = 0
+
+    for images, metadata, _ in cache.iter_batches(batch_size):
+        images = np.ascontiguousarray(images)  # Чтение страниц mmap вне замера
+        started = time.perf_counter()
+
+        if backend == "cascade":
+            fast = model.predict_proba_preprocessed(images, metadata, use_fast_model=True)
+            accepted = np.array([model.cascade_accepts(p) for p in fast], dtype=bool)
+            batch_probabilities = fast
+            if not accepted.all():
+                batch_probabilities = fast.copy()
+                batch_probabilities[~accepted] = model.predict_proba_preprocessed(images[~accepted], metadata[~accepted])
+            fast_accepted += int(accepted.sum())
+        else:
+            batch_probabilities = model.predict_proba_preprocessed(images, metadata, use_fast_model=backend == "fast")
+
+        latencies.append(time.perf_counter() - started)
+        sizes.append(len(images))
+        probabilities.append(batch_probabilities)
+
+    return np.concatenate(probabilities), latencies, sizes, fast_accepted
+
+
+def run(args) -> bool:
+    """Оценка модели на кеше"""
+    settings = get_settings()
+    cache = open_tensor_cache(args.cache)
+
+    model = SkinCancerModel()
+    if not model.load_model(args.model or settings.absolute_model_path, lazy=False):
+        print("❌ Не удалось загрузить модель")
+        return False
+    if args.backend in ("fast", "cascade"):
+        if not model.load_fast_model(args.fast_model or settings.absolute_fast_model_path):
+            print("❌ Не удалось загрузить быструю модель")
+            return False
+        if args.cascade_threshold is not None:
+            model.configure_cascade(thresholds={name: args.cascade_threshold for name in model.cascade_thresholds})
+
+    # Прогрев батчем из кеша, чтобы построение графа не попало в замер; каскаду нужны обе модели
+    warmup_images = np.ascontiguousarray(cache.images[:args.batch_size])
+    warmup_metadata = cache.metadata[:args.batch_size]
+    if args.backend in ("full", "cascade"):
+        model.predict_proba_preprocessed(warmup_images, warmup_metadata)
+    if args.backend in ("fast", "cascade"):
+        model.predict_proba_preprocessed(warmup_images, warmup_metadata, use_fast_model=True)
+
+    print(f"🔄 Оценка {len(cache.labels)} образцов, backend={args.backend}, batch_size={args.batch_size}...")
+    probabilities, latencies, sizes, fast_accepted = predict_cache(model, cache, args.backend, args.batch_size)
+
+    class_names = [model.diagnosis_mapping[i]["name"] for i in range(len(model.diagnosis_mapping))]
+    report = {
+        "model": model.model_path,
+        "model_version": model.model_version,
+        "backend": args.backend,
+        "batch_size": args.batch_size,
+        **classification_report(probabilities, cache.labels, class_names),
+        "performance": latency_summary(latencies, sizes)
+    }
+    if args.backend == "cascade":
+        report["cascade_fast_rate"] = fast_accepted / len(cache.labels)
+
+    print(f"\n📊 Accuracy: {report['accuracy']:.4f}  Balanced accuracy: {report['balanced_accuracy']:.4f}")
+    print(f"📊 Recall mel: {report['per_class']['mel']['recall']}")
+    print(f"{'класс':>8} {'n':>6} {'recall':>8} {'precision':>10}")
+    for name, metrics in report["per_class"].items():
+        recall = f"{metrics['recall']:.4f}" if metrics["recall"] is not None else "—"
+        precision = f"{metrics['precision']:.4f}" if metrics["precision"] is not None else "—"
+        print(f"{name:>8} {metrics['support']:>6} {recall:>8} {precision:>10}")
+    calibration = report["calibration"]
+    print(f"📊 Калибровка: ECE={calibration['ece']:.4f}  Brier={calibration['brier']:.4f}  NLL={calibration['nll']:.4f}")
+    performance = report["performance"]
+    print(f"⏱  {performance['throughput_per_s']:.1f} изобр./с, батч p50={performance['batch_latency_ms']['p50']:.1f} мс, "
+          f"p95={performance['batch_latency_ms']['p95']:.1f} мс")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Отчёт сохранён: {args.output}")
+
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-оценка модели классификации")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cache_parser = subparsers.add_parser("build-cache", help="Препроцессинг датасета в кеш тензоров")
+    cache_parser.add_argument("--data", required=True, help="Папка с изображениями и metadata.csv")
+    cache_parser.add_argument("--cache", required=True, help="Папка кеша")
+    cache_parser.add_argument("--workers", type=int, default=8)
+
+    run_parser = subparsers.add_parser("run", help="Оценка модели на кеше")
+    run_parser.add_argument("--cache", required=True, help="Папка кеша")
+    run_parser.add_argument("--model", default=None, help="Модель .h5 или папка артефакта (по умолчанию из настроек)")
+    run_parser.add_argument("--backend", choices=("full", "fast", "cascade"), default="full")
+    run_parser.add_argument("--fast-model", default=None, help="Быстрая модель для backend fast/cascade")
+    run_parser.add_argument("--cascade-threshold", type=float, default=None,
+                            help="Единый порог каскада для классов с порогом")
+    run_parser.add_argument("--batch-size", type=int, default=256)
+    run_parser.add_argument("--output", default=None, help="Путь для JSON-отчёта")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build-cache":
+        return build_cache(args)
+    return run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Оценка каскада моделей: точность и задержка для разных порогов уверенности
+
+Использование:
+    python scripts/evaluate_cascade.py --data path/to/labeled_folder \
+        --fast-model models/trained_models/fast_model.h5 \
+        --thresholds 0.7 0.8 0.9 0.95
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+import numpy as np
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.model_manager import SkinCancerModel
+from app.utils.dataset import load_labeled_folder
+from config.settings import get_settings
+
+BENIGN_CLASSES = ('nv', 'bkl', 'df', 'vasc')
+
+
+def read_image(model: SkinCancerModel, path: str):
+    # Декодирование как при обслуживании (IMAGE_DRAFT_DECODE)
+    with open(path, 'rb') as f:
+        return model.decode_image(f.read(), get_settings().IMAGE_DRAFT_DECODE)
+
+
+def run_model(model: SkinCancerModel, samples, batch_size: int, use_fast_model: bool):
+    """Прогон модели по всем образцам, возвращает вероятности и среднюю задержку на образец"""
+    probabilities = []
+    elapsed = 0.0
+
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        images = [read_image(model, sample.image_path) for sample in chunk]
+        metadata = [sample.metadata for sample in chunk]
+
+        started = time.perf_counter()
+        probabilities.append(model.predict_proba_batch(images, metadata, use_fast_model=use_fast_model))
+        elapsed += time.perf_counter() - started
+
+    return np.concatenate(probabilities), elapsed / len(samples)
+
+
+def evaluate_cascade(model: SkinCancerModel, fast_probs: np.ndarray, full_probs: np.ndarray,
+                     labels: np.ndarray, thresholds: dict, fast_latency: float, full_latency: float) -> dict:
+    """Метрики каскада для одного набора порогов"""
+    accepted = np.array([model.cascade_accepts(p, thresholds) for p in fast_probs], dtype=bool)
+    predictions = np.where(accepted, fast_probs.argmax(axis=1), full_probs.argmax(axis=1))
+
+    mel_class = next(idx for idx, info in model.diagnosis_mapping.items() if info["name"] == "mel")
+    mel_mask = labels == mel_class
+
+    fast_rate = float(accepted.mean())
+    return {
+        "fast_rate": fast_rate,
+        "accuracy": float((predictions == labels).mean()),
+        "mel_recall": float((predictions[mel_mask] == mel_class).mean()) if mel_mask.any() else float('nan'),
+        "latency_ms": 1000 * (fast_latency + (1 - fast_rate) * full_latency)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оценка каскада моделей на размеченной папке")
+    parser.add_argument("--data", required=True, help="Папка с изображениями и metadata.csv")
+    parser.add_argument("--model", default=None, help="Путь к полной модели (по умолчанию из настроек)")
+    parser.add_argument("--fast-model", default=None, help="Путь к быстрой модели (по умолчанию из настроек)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9, 0.95, 0.99],
+                        help="Кандидаты порога для доброкачественных классов")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+
+    model = SkinCancerModel()
+    if not model.load_model(args.model or settings.absolute_model_path):
+        print("❌ Не удалось загрузить полную модель")
+        return False
+    if not model.load_fast_model(args.fast_model or settings.absolute_fast_model_path):
+        print("❌ Не удалось загрузить быструю модель")
+        return False
+
+    samples = load_labeled_folder(args.data, model)
+    if not samples:
+        print("❌ В папке нет размеченных изображений")
+        return False
+    labels = np.array([sample.label for sample in samples])
+    print(f"📁 Образцов: {len(samples)}")
+
+    print("🔄 Прогон быстрой модели...")
+    fast_probs, fast_latency = run_model(model, samples, args.batch_size, use_fast_model=True)
+    print("🔄 Прогон полной модели...")
+    full_probs, full_latency = run_model(model, samples, args.batch_size, use_fast_model=False)
+
+    print(f"\n📊 Полная модель: accuracy={(full_probs.argmax(axis=1) == labels).mean():.4f}, "
+          f"{1000 * full_latency:.2f} мс/образец")
+    print(f"📊 Быстрая модель: accuracy={(fast_probs.argmax(axis=1) == labels).mean():.4f}, "
+          f"{1000 * fast_latency:.2f} мс/образец\n")
+
+    print(f"{'порог':>8} {'fast, %':>9} {'accuracy':>9} {'mel recall':>11} {'мс/образец':>11}")
+    for threshold in args.thresholds:
+        thresholds = {name: threshold for name in BENIGN_CLASSES}
+        metrics = evaluate_cascade(model, fast_probs, full_probs, labels, thresholds, fast_latency, full_latency)
+        print(f"{threshold:>8.2f} {100 * metrics['fast_rate']:>9.1f} {metrics['accuracy']:>9.4f} "
+              f"{metrics['mel_recall']:>11.4f} {metrics['latency_ms']:>11.2f}")
+
+    return True
+
+
+if __name__ == "__main__":
+    main()
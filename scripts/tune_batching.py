@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Автоподбор батчинга и потоков TensorFlow под текущую машину
+
+Для каждой конфигурации потоков (intra:inter) запускается отдельный процесс:
+потоки TF задаются только до инициализации. В процессе замеряется латентность
+батчей разного размера, строится линейная модель overhead + b * per_item и
+выбирается максимальная пропускная способность при целевом p99.
+Результат сохраняется в профиль, который подхватывает config.settings.get_settings().
+
+Использование:
+    python scripts/tune_batching.py [--model best_model.h5] [--threads 4:1,8:1,8:2] [--target-p99-ms 300]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_threads(value: str) -> list:
+    """'4:1,8:2' -> [(4, 1), (8, 2)]; пустое значение - потоки по умолчанию TF"""
+    if not value:
+        return [(None, None)]
+    configs = []
+    for item in value.split(","):
+        intra, _, inter = item.strip().partition(":")
+        configs.append((int(intra), int(inter) if inter else None))
+    return configs
+
+
+def measure(model_path: str, batch_sizes: list, iterations: int, intra: int, inter: int) -> dict:
+    """Замер в текущем процессе при заданных потоках TF"""
+    from app.models.model_manager import SkinCancerModel
+    from app.utils.autotune import measure_batch_latencies
+
+    SkinCancerModel.configure_threads(intra, inter)
+    model = SkinCancerModel()
+    if not model.load_model(model_path):
+        raise RuntimeError(f"Не удалось загрузить модель: {model_path}")
+
+    measurements = measure_batch_latencies(model, batch_sizes, iterations)
+    return {"model_version": model.model_version,
+            "measurements": {str(b): m for b, m in measurements.items()}}
+
+
+def run_isolated(model_path: str, batch_sizes: list, iterations: int, intra, inter) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--worker",
+               "--model", model_path,
+               "--batch-sizes", ",".join(str(b) for b in batch_sizes),
+               "--iterations", str(iterations)]
+    if intra is not None:
+        command += ["--threads", f"{intra}:{inter}" if inter is not None else str(intra)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    from config.settings import get_settings
+    from app.utils.autotune import build_profile, choose_batching, fit_latency_curve, save_profile
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Автоподбор батчинга и потоков TF")
+    parser.add_argument("--model", default=settings.absolute_model_path, help="Путь к модели")
+    parser.add_argument("--batch-sizes", default=",".join(str(b) for b in settings.AUTOTUNE_BATCH_SIZES))
+    parser.add_argument("--threads", default="", help="Конфигурации потоков intra:inter через запятую")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--target-p99-ms", type=float, default=settings.AUTOTUNE_TARGET_P99_MS)
+    parser.add_argument("--output", default=settings.absolute_tuning_profile_path, help="Файл профиля")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    thread_configs = parse_threads(args.threads)
+
+    if args.worker:
+        intra, inter = thread_configs[0]
+        print(json.dumps(measure(args.model, batch_sizes, args.iterations, intra, inter)))
+        return True
+
+    if not os.path.exists(args.model):
+        print(f"❌ Модель не найдена: {args.model}")
+        return False
+
+    print(f"⏱  Автоподбор: батчи {batch_sizes}, целевой p99 {args.target_p99_ms} мс")
+    print(f"{'потоки':>10} {'overhead, мс':>13} {'на элемент, мс':>15} {'батч':>5} {'ожид., мс':>10} "
+          f"{'изобр./с':>9} {'p99, мс':>8}")
+
+    trials, best, model_version = [], None, None
+    for intra, inter in thread_configs:
+        label = f"{intra}:{inter}" if intra is not None else "default"
+        try:
+            result = run_isolated(args.model, batch_sizes, args.iterations, intra, inter)
+        except subprocess.CalledProcessError as e:
+            print(f"{label:>10}   ❌ {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+            continue
+
+        model_version = result["model_version"]
+        measurements = {int(b): m for b, m in result["measurements"].items()}
+        curve = fit_latency_curve(measurements)
+        choice = choose_batching(measurements, curve, args.target_p99_ms)
+        trials.append({"intra_op_threads": intra, "inter_op_threads": inter,
+                       "measurements": result["measurements"], "curve": curve, "choice": choice})
+
+        if choice is None:
+            print(f"{label:>10} {curve['overhead_ms']:>13.1f} {curve['per_item_ms']:>15.2f}   ⚠️  целевой p99 недостижим")
+            continue
+        print(f"{label:>10} {curve['overhead_ms']:>13.1f} {curve['per_item_ms']:>15.2f} {choice['batch_size']:>5} "
+              f"{choice['max_wait_ms']:>10.1f} {choice['throughput_per_s']:>9.1f} {choice['predicted_p99_ms']:>8.1f}")
+        if best is None or choice["throughput_per_s"] > best[0]["throughput_per_s"]:
+            best = (choice, intra, inter)
+
+    if best is None:
+        print("❌ Ни одна конфигурация не укладывается в целевой p99")
+        return False
+
+    choice, intra, inter = best
+    profile = build_profile(choice, intra, inter, args.target_p99_ms, model_version, trials)
+    save_profile(profile, args.output)
+    print(f"\n✅ Профиль сохранен: {args.output}")
+    for key, value in profile["settings"].items():
+        print(f"   {key}={value}")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.utils.artifact_fetcher import ArtifactFetcher, load_manifest
+
+CHUNK = 64 * 1024
+DATA = os.urandom(10 * CHUNK + 123)
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Static file server with Range support; ranges from fail_from on answer 500"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.headers.get("Range"))
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range") or "")
+        if match is None or not server.ranges:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(DATA)))
+            self.end_headers()
+            self.wfile.write(DATA)
+            return
+
+        start, end = int(match.group(1)), min(int(match.group(2)), len(DATA) - 1)
+        if server.fail_from is not None and start >= server.fail_from:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(DATA)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+        self.wfile.write(DATA[start:end + 1])
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.ranges = True
+    httpd.fail_from = None
+    httpd.etag = '"v1"'
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_port}/best_model.h5"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_fetcher(tmp_path, **kwargs):
+    return ArtifactFetcher(str(tmp_path / "cache"), chunk_size=CHUNK, retries=0, **kwargs)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_parallel_ranged_download_reassembles_file(tmp_path, server):
+    progress = []
+    fetcher = make_fetcher(tmp_path, parallelism=4, progress=progress.append)
+
+    blob_path = fetcher.fetch([server.url], SHA256, len(DATA))
+
+    assert read(blob_path) == DATA
+    assert blob_path == fetcher.blob_path(SHA256)
+    assert sum(progress) == len(DATA)
+    # Пробный запрос bytes=0-0 и по одному запросу на каждый из 11 чанков
+    assert len(server.requests) == 12
+    assert all(request is not None for request in server.requests)
+    assert not os.path.exists(fetcher._part_path(SHA256) + ".progress")
+
+
+def test_interrupted_download_resumes_from_progress_file(tmp_path, server):
+    fetcher = make_fetcher(tmp_path, parallelism=1)
+    server.fail_from = 6 * CHUNK
+    with pytest.raises(RuntimeError):
+        fetcher.fetch([server.url], SHA256)
+
+    with open(fetcher._part_path(SHA256) + ".progress", encoding="utf-8") as f:
+        assert json.load(f)["done"] == list(range(6))
+
+    server.fail_from = None
+    server.requests.clear()
+    blob_path = make_fetcher(tmp_path, parallelism=2).fetch([server.url], SHA256, len(DATA))
+
+    assert read(blob_path) == DATA
+    fetched = sorted(int(re.match(r"bytes=(\d+)-", r).group(1)) for r in server.requests[1:])
+    assert fetched == [i * CHUNK for i in range(6, 11)]
+
+
+def test_changed_validator_restarts_download(tmp_path, server):
+    fetcher = make_fetcher(tmp_path, parallelism=1)
+    server.fail_from = 6 * CHUNK
+    with pytest.raises(RuntimeError):
+        fetcher.fetch([server.url], SHA256)
+
+    server.fail_from = None
+    server.etag = '"v2"'
+    server.requests.clear()
+    blob_path = fetcher.fetch([server.url], SHA256, len(DATA))
+
+    assert read(blob_path) == DATA
+    # Все 11 чанков заново после пробного запроса
+    assert len(server.requests) == 12
+
+
+def test_checksum_mismatch_is_rejected(tmp_path, server):
+    fetcher = make_fetcher(tmp_path)
+    wrong = "0" * 64
+
+    with pytest.raises(RuntimeError, match="SHA-256 mismatch"):
+        fetcher.fetch([server.url], wrong)
+
+    assert not os.path.exists(fetcher.blob_path(wrong))
+    assert not os.path.exists(fetcher._part_path(wrong))
+    assert not os.path.exists(fetcher._part_path(wrong) + ".progress")
+
+
+def test_size_mismatch_is_rejected_before_download(tmp_path, server):
+    with pytest.raises(RuntimeError, match="manifest expects"):
+        make_fetcher(tmp_path).fetch([server.url], SHA256, len(DATA) + 1)
+    assert len(server.requests) == 1
+
+
+def test_falls_back_to_next_url_and_to_sequential_stream(tmp_path, server):
+    server.ranges = False
+    blob_path = make_fetcher(tmp_path).fetch(["http://127.0.0.1:1/unreachable", server.url], SHA256)
+    assert read(blob_path) == DATA
+
+
+def test_cached_blob_needs_no_requests_and_is_linked_into_place(tmp_path, server):
+    fetcher = make_fetcher(tmp_path)
+    fetcher.fetch([server.url], SHA256)
+    server.requests.clear()
+
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps({"artifacts": [
+        {"path": "models/best_model.h5", "url": server.url, "sha256": SHA256.upper(), "size": len(DATA)}
+    ]}))
+    dest_path, = fetcher.fetch_manifest(load_manifest(str(manifest_path)), str(tmp_path / "root"))
+
+    assert server.requests == []
+    assert read(dest_path) == DATA
+    assert os.path.samefile(dest_path, fetcher.blob_path(SHA256))
+    assert not os.stat(dest_path).st_mode & 0o222
+
+
+def test_manifest_entry_without_checksum_is_rejected(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps([{"path": "best_model.h5", "url": "http://mirror/best_model.h5"}]))
+    with pytest.raises(ValueError, match="sha256"):
+        load_manifest(str(manifest_path))
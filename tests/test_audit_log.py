@@ -0,0 +1,102 @@
+import glob
+import json
+import os
+import sqlite3
+
+import pytest
+
+from app.utils.audit_log import AuditSink, build_audit_record
+
+
+def make_result(diagnosis="nv", risk=1):
+    return {
+        "diagnosis": {"name": diagnosis},
+        "risk": {"level": risk},
+        "probabilities": {"diagnosis": {str(i): {"probability": 1 / 7} for i in range(7)}}
+    }
+
+
+def read_jsonl(directory):
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "audit-*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            records += [json.loads(line) for line in f]
+    return records
+
+
+def test_jsonl_records_are_flushed_on_close(tmp_path):
+    sink = AuditSink(str(tmp_path), flush_interval=0.05)
+    sink.start()
+    for i in range(10):
+        assert sink.log({"request_id": str(i)})
+    sink.close()
+
+    assert [r["request_id"] for r in read_jsonl(tmp_path)] == [str(i) for i in range(10)]
+    stats = sink.get_stats()
+    assert stats["enqueued"] == 10 and stats["written"] == 10 and stats["dropped"] == 0
+
+
+def test_sqlite_backend_writes_columns(tmp_path):
+    sink = AuditSink(str(tmp_path), backend="sqlite", flush_interval=0.05)
+    sink.start()
+    sink.log(build_audit_record("r1", "abc", [45.0, 1.0, 5.0, 1.0], make_result("mel", 3), "m@1"))
+    sink.close()
+
+    path, = glob.glob(os.path.join(tmp_path, "audit-*.sqlite"))
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT request_id, model_version, diagnosis, risk_level FROM predictions").fetchall()
+    assert rows == [("r1", "m@1", "mel", 3)]
+
+
+def test_drop_newest_keeps_queued_records(tmp_path):
+    sink = AuditSink(str(tmp_path), max_queue=2, overflow_policy="drop_newest")
+    assert sink.log({"request_id": "a"}) and sink.log({"request_id": "b"})
+    assert not sink.log({"request_id": "c"})
+
+    sink.start()
+    sink.close()
+    assert [r["request_id"] for r in read_jsonl(tmp_path)] == ["a", "b"]
+    assert sink.get_stats()["dropped"] == 1
+
+
+def test_drop_oldest_makes_room(tmp_path):
+    sink = AuditSink(str(tmp_path), max_queue=2, overflow_policy="drop_oldest")
+    for request_id in "abc":
+        assert sink.log({"request_id": request_id})
+
+    sink.start()
+    sink.close()
+    assert [r["request_id"] for r in read_jsonl(tmp_path)] == ["b", "c"]
+    assert sink.get_stats()["dropped"] == 1
+
+
+def test_block_policy_drops_after_timeout(tmp_path):
+    sink = AuditSink(str(tmp_path), max_queue=1, overflow_policy="block", block_timeout=0.01)
+    assert sink.log({"request_id": "a"})
+    assert not sink.log({"request_id": "b"})
+    assert sink.get_stats()["dropped"] == 1
+
+
+def test_rotation_keeps_max_files(tmp_path):
+    sink = AuditSink(str(tmp_path), batch_size=1, max_file_bytes=1, max_files=3)
+    for i in range(6):
+        sink._write([{"request_id": str(i)}])
+    sink._close_file()
+
+    assert len(glob.glob(os.path.join(tmp_path, "audit-*.jsonl"))) == 3
+    assert [r["request_id"] for r in read_jsonl(tmp_path)] == ["3", "4", "5"]
+    assert sink.get_stats()["rotations"] == 5
+
+
+def test_unknown_backend_and_policy_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AuditSink(str(tmp_path), backend="csv")
+    with pytest.raises(ValueError):
+        AuditSink(str(tmp_path), overflow_policy="spill")
+
+
+def test_build_audit_record_flattens_probabilities():
+    record = build_audit_record("r1", "abc", (45.0, 1.0, 5.0, 1.0), make_result(), None)
+    assert record["metadata"] == [45.0, 1.0, 5.0, 1.0]
+    assert record["diagnosis"] == "nv" and record["risk_level"] == 1
+    assert len(record["probabilities"]) == 7
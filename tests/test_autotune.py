@@ -0,0 +1,52 @@
+import pytest
+
+from app.utils.autotune import choose_batching, fit_latency_curve, host_info
+
+
+def linear_measurements(overhead_ms, per_item_ms, batch_sizes=(1, 2, 4, 8, 16), p99_ratio=1.5):
+    measurements = {}
+    for batch_size in batch_sizes:
+        p50 = overhead_ms + per_item_ms * batch_size
+        measurements[batch_size] = {"p50_ms": p50, "p99_ms": p50 * p99_ratio, "mean_ms": p50}
+    return measurements
+
+
+def test_fit_recovers_line():
+    curve = fit_latency_curve(linear_measurements(5.0, 2.0))
+    assert curve["overhead_ms"] == pytest.approx(5.0)
+    assert curve["per_item_ms"] == pytest.approx(2.0)
+    assert curve["p99_ratio"] == pytest.approx(1.5)
+
+
+def test_fit_single_bucket():
+    curve = fit_latency_curve({4: {"p50_ms": 20.0, "p99_ms": 30.0, "mean_ms": 21.0}})
+    assert curve == {"overhead_ms": 0.0, "per_item_ms": 5.0, "p99_ratio": 1.5}
+
+
+def test_choose_largest_batch_within_target():
+    measurements = linear_measurements(5.0, 2.0)
+    curve = fit_latency_curve(measurements)
+    # p99(b) = 1.5 * (5 + 2b); 2 * p99 + wait <= 60 пропускает b <= 4
+    choice = choose_batching(measurements, curve, target_p99_ms=60.0)
+    assert choice["batch_size"] == 4
+    assert choice["max_wait_ms"] == pytest.approx(5.0)
+    assert choice["predicted_p99_ms"] <= 60.0
+
+
+def test_max_wait_capped_by_slack():
+    measurements = linear_measurements(20.0, 1.0, batch_sizes=(1,), p99_ratio=1.0)
+    curve = {"overhead_ms": 20.0, "per_item_ms": 1.0, "p99_ratio": 1.0}
+    # slack = 45 - 2 * 21 = 3 ms меньше накладных расходов на батч
+    choice = choose_batching(measurements, curve, target_p99_ms=45.0)
+    assert choice["max_wait_ms"] == pytest.approx(3.0)
+    assert choice["predicted_p99_ms"] == pytest.approx(45.0)
+
+
+def test_unreachable_target_returns_none():
+    measurements = linear_measurements(5.0, 2.0)
+    assert choose_batching(measurements, fit_latency_curve(measurements), target_p99_ms=10.0) is None
+
+
+def test_host_info_has_no_hostname():
+    info = host_info()
+    assert "node" not in info and "cpu_count" in info
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.utils.batcher import InferenceBatcher
+
+
+class GatedBatches:
+    """Batch function that records batches and holds the first one until released"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.started.set()
+        self.release.wait(5)
+        return items
+
+
+async def hold_worker(batcher, gate):
+    """Occupy the worker so that later submissions queue up behind it"""
+    blocker = asyncio.ensure_future(batcher.submit("blocker"))
+    await asyncio.get_running_loop().run_in_executor(None, gate.started.wait, 5)
+    return blocker
+
+
+async def enqueue(batcher, items):
+    tasks = [asyncio.ensure_future(batcher.submit(item, priority=priority)) for item, priority in items]
+    await asyncio.sleep(0)
+    return tasks
+
+
+@pytest.mark.asyncio
+async def test_weighted_fair_share_between_classes():
+    gate = GatedBatches()
+    batcher = InferenceBatcher(gate, max_batch_size=9, max_wait_ms=1)
+    batcher.start()
+    try:
+        blocker = await hold_worker(batcher, gate)
+        tasks = await enqueue(batcher, [(f"b{i}", "bulk") for i in range(16)] +
+                                       [(f"i{i}", "interactive") for i in range(16)])
+        gate.release.set()
+        results = await asyncio.gather(blocker, *tasks)
+    finally:
+        await batcher.stop()
+
+    first = gate.batches[1]
+    assert sum(item.startswith("i") for item in first) == 8
+    assert sum(item.startswith("b") for item in first) == 1
+    # Низкий приоритет получает свою долю, а не голодает
+    assert len(results) == 33
+    assert batcher.get_stats()["classes"]["bulk"]["completed"] == 16
+
+
+@pytest.mark.asyncio
+async def test_unknown_priority_falls_back_to_default_class():
+    gate = GatedBatches()
+    gate.release.set()
+    batcher = InferenceBatcher(gate, max_wait_ms=1, default_priority="bulk")
+    batcher.start()
+    try:
+        assert batcher.resolve_priority("realtime") == "bulk"
+        assert batcher.resolve_priority(None) == "bulk"
+        assert await batcher.submit("x", priority="realtime") == "x"
+    finally:
+        await batcher.stop()
+
+    classes = batcher.get_stats()["classes"]
+    assert classes["bulk"]["submitted"] == 1
+    assert classes["interactive"]["submitted"] == 0
+
+
+def test_unknown_default_priority_is_rejected():
+    with pytest.raises(ValueError):
+        InferenceBatcher(lambda items: items, default_priority="realtime")
+
+
+@pytest.mark.asyncio
+async def test_urgent_class_overrides_weights_near_deadline():
+    gate = GatedBatches()
+    batcher = InferenceBatcher(gate, max_batch_size=4, max_wait_ms=1,
+                               slo_ms={"bulk": 100.0}, urgent_fraction=0.5)
+    batcher.start()
+    try:
+        blocker = await hold_worker(batcher, gate)
+        bulk = await enqueue(batcher, [(f"b{i}", "bulk") for i in range(4)])
+        # Старейший bulk-запрос израсходовал больше половины SLO
+        await asyncio.sleep(0.08)
+        interactive = await enqueue(batcher, [(f"i{i}", "interactive") for i in range(4)])
+        gate.release.set()
+        await asyncio.gather(blocker, *bulk, *interactive)
+    finally:
+        await batcher.stop()
+
+    assert gate.batches[1] == ["b0", "b1", "b2", "b3"]
+    assert gate.batches[2] == ["i0", "i1", "i2", "i3"]
+
+
+@pytest.mark.asyncio
+async def test_weights_apply_before_deadline():
+    gate = GatedBatches()
+    batcher = InferenceBatcher(gate, max_batch_size=4, max_wait_ms=1,
+                               slo_ms={"bulk": 10000.0}, urgent_fraction=0.5)
+    batcher.start()
+    try:
+        blocker = await hold_worker(batcher, gate)
+        tasks = await enqueue(batcher, [(f"b{i}", "bulk") for i in range(4)] +
+                                       [(f"i{i}", "interactive") for i in range(4)])
+        gate.release.set()
+        await asyncio.gather(blocker, *tasks)
+    finally:
+        await batcher.stop()
+
+    assert sum(item.startswith("i") for item in gate.batches[1]) == 3
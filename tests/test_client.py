@@ -0,0 +1,141 @@
+import asyncio
+import json
+import re
+
+import httpx
+import pytest
+
+from client import AsyncSkinCancerClient, ClientError, RetryPolicy, SkinCancerClient
+
+IMAGE = b"\xff\xd8\xff\xe0 not decoded by the mock server"
+
+
+def metadata(i):
+    return {"age": i, "sex": 1, "localization": 5, "dx_type": 1}
+
+
+def batch_rows(request):
+    """Metadata rows of a multipart /predict/batch request"""
+    body = request.read().decode("latin-1")
+    match = re.search(r'name="metadata"\r\n\r\n(.*?)\r\n--', body, re.S)
+    return json.loads(match.group(1))
+
+
+class BatchServer:
+    """Mock /predict/batch: tags every result with the age it was sent with"""
+
+    def __init__(self, fail_ages=()):
+        self.batches = []
+        self.fail_ages = set(fail_ages)
+
+    def __call__(self, request):
+        rows = batch_rows(request)
+        self.batches.append([int(row["age"]) for row in rows])
+        results = [
+            {"success": False, "error": f"bad image {int(row['age'])}"} if row["age"] in self.fail_ages
+            else {"success": True, "model_variant": f"item-{int(row['age'])}"}
+            for row in rows
+        ]
+        failed = sum(not result["success"] for result in results)
+        return httpx.Response(200, json={"success": failed == 0, "total": len(rows), "failed": failed,
+                                         "results": results})
+
+
+class FlakyServer:
+    """Answers with the given statuses first, then 200"""
+
+    def __init__(self, statuses, headers=None):
+        self.statuses = list(statuses)
+        self.headers = headers or {}
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        if self.statuses:
+            return httpx.Response(self.statuses.pop(0), headers=self.headers, json={"detail": "busy"})
+        return httpx.Response(200, json={"status": "healthy"})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr("client.sync_client.time.sleep", recorded.append)
+    return recorded
+
+
+def test_retries_429_and_503_honouring_retry_after(sleeps):
+    server = FlakyServer([429, 503], headers={"Retry-After": "2"})
+    with SkinCancerClient(transport=httpx.MockTransport(server), retry=RetryPolicy(backoff_base=0.001)) as client:
+        assert client.health() == {"status": "healthy"}
+
+    assert server.calls == 3
+    assert sleeps == [2.0, 2.0]
+
+
+def test_retry_after_is_capped_and_retries_are_bounded(sleeps):
+    server = FlakyServer([503] * 10, headers={"Retry-After": "120"})
+    retry = RetryPolicy(max_retries=2, backoff_base=0.001, backoff_max=3.0)
+    with SkinCancerClient(transport=httpx.MockTransport(server), retry=retry) as client:
+        with pytest.raises(ClientError) as error:
+            client.health()
+
+    assert error.value.status_code == 503
+    assert server.calls == 3
+    assert sleeps == [3.0, 3.0]
+
+
+@pytest.mark.parametrize("status", [400, 404, 422])
+def test_client_errors_are_not_retried(sleeps, status):
+    server = FlakyServer([status])
+    with SkinCancerClient(transport=httpx.MockTransport(server)) as client:
+        with pytest.raises(ClientError) as error:
+            client.health()
+
+    assert error.value.status_code == status and "busy" in str(error.value)
+    assert server.calls == 1 and sleeps == []
+
+
+def test_sync_predict_batch_chunks_by_batch_size():
+    server = BatchServer(fail_ages={3})
+    with SkinCancerClient(transport=httpx.MockTransport(server), batch_size=4) as client:
+        response = client.predict_batch([(IMAGE, metadata(i)) for i in range(10)])
+
+    assert server.batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert response.total == 10 and response.failed == 1 and not response.success
+    assert [r.model_variant for r in response.results if r.success] == [f"item-{i}" for i in range(10) if i != 3]
+    assert response.results[3].error == "bad image 3"
+
+
+@pytest.mark.asyncio
+async def test_async_predict_batch_chunks_by_batch_size():
+    server = BatchServer()
+    async with AsyncSkinCancerClient(transport=httpx.MockTransport(server), batch_size=4) as client:
+        response = await client.predict_batch([(IMAGE, metadata(i)) for i in range(10)])
+
+    assert server.batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert [r.model_variant for r in response.results] == [f"item-{i}" for i in range(10)]
+    assert response.success
+
+
+@pytest.mark.asyncio
+async def test_predict_batched_coalesces_concurrent_calls():
+    server = BatchServer(fail_ages={2})
+    async with AsyncSkinCancerClient(transport=httpx.MockTransport(server), batch_size=16,
+                                     max_wait_ms=20) as client:
+        results = await asyncio.gather(*[client.predict_batched(IMAGE, metadata(i)) for i in range(5)])
+
+    assert server.batches == [[0, 1, 2, 3, 4]]
+    assert [r.model_variant for r in results if r.success] == ["item-0", "item-1", "item-3", "item-4"]
+    assert not results[2].success and results[2].error == "bad image 2"
+
+
+@pytest.mark.asyncio
+async def test_predict_batched_fails_every_call_of_a_failed_request():
+    def handler(request):
+        return httpx.Response(400, json={"detail": "Invalid metadata"})
+
+    async with AsyncSkinCancerClient(transport=httpx.MockTransport(handler), max_wait_ms=5) as client:
+        results = await asyncio.gather(*[client.predict_batched(IMAGE, metadata(i)) for i in range(3)],
+                                       return_exceptions=True)
+
+    assert all(isinstance(result, ClientError) and result.status_code == 400 for result in results)
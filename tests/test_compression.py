@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from app.utils.compression import pareto_front, prune_magnitude
+
+OBJECTIVES = {"balanced_accuracy": "max", "p95_ms": "min"}
+
+
+def test_pareto_front_drops_dominated_points():
+    points = [
+        {"balanced_accuracy": 0.80, "p95_ms": 50},
+        {"balanced_accuracy": 0.75, "p95_ms": 20},
+        {"balanced_accuracy": 0.70, "p95_ms": 30},  # хуже второй по обоим метрикам
+        {"balanced_accuracy": 0.80, "p95_ms": 60},  # та же точность, что у первой, но медленнее
+    ]
+    assert pareto_front(points, OBJECTIVES) == [True, True, False, False]
+
+
+def test_pareto_front_keeps_tied_points():
+    point = {"balanced_accuracy": 0.8, "p95_ms": 40}
+    assert pareto_front([dict(point), dict(point)], OBJECTIVES) == [True, True]
+
+
+def test_pareto_front_skips_points_missing_a_metric():
+    points = [
+        {"balanced_accuracy": 0.80, "p95_ms": 50},
+        {"balanced_accuracy": 0.99},  # нет задержки: не на фронте и никого не доминирует
+        {"balanced_accuracy": None, "p95_ms": 1},
+    ]
+    assert pareto_front(points, OBJECTIVES) == [True, False, False]
+
+
+def make_model():
+    image = tf.keras.Input(shape=(8, 8, 3))
+    x = tf.keras.layers.Conv2D(8, 3, activation="relu")(image)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    output = tf.keras.layers.Dense(7, activation="softmax")(x)
+    return tf.keras.Model(image, output)
+
+
+def test_prune_magnitude_reaches_sparsity_and_keeps_original():
+    model = make_model()
+    original = [w.copy() for w in model.get_weights()]
+
+    pruned, report = prune_magnitude(model, 0.5)
+
+    assert report["kernel_weights"] == 3 * 3 * 3 * 8 + 8 * 7
+    assert report["achieved_sparsity"] == pytest.approx(0.5, abs=0.02)
+    assert report["zero_weights"] == sum(int((layer.kernel.numpy() == 0).sum()) for layer in pruned.layers
+                                         if hasattr(layer, "kernel"))
+    for before, after in zip(original, model.get_weights()):
+        assert np.array_equal(before, after)
+
+
+def test_prune_magnitude_rejects_invalid_sparsity():
+    with pytest.raises(ValueError):
+        prune_magnitude(make_model(), 1.0)
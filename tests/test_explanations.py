@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.utils.explanations import ExplanationStore, render_heatmap
+
+HEIGHT, WIDTH = 30, 20
+
+
+def make_input(value=0):
+    return np.full((HEIGHT, WIDTH, 3), value, dtype=np.uint8), [45.0, 1.0, 5.0, 1.0]
+
+
+def decode_png(png):
+    return np.asarray(Image.open(io.BytesIO(png)).convert("RGB"))
+
+
+def test_inputs_evicted_in_lru_order():
+    store = ExplanationStore(max_inputs=2, max_heatmaps=2)
+    first = store.put(*make_input(1), class_index=1)
+    second = store.put(*make_input(2), class_index=2)
+
+    # Обращение к первому делает вытесняемым второй
+    assert store.get(first).class_index == 1
+    third = store.put(*make_input(3), class_index=3)
+
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+    stats = store.get_stats()
+    assert stats["inputs"] == 2 and stats["input_evictions"] == 1
+    assert stats["input_bytes"] == 2 * (HEIGHT * WIDTH * 3 + 4 * 4)
+
+
+def test_get_heatmap_missing_and_evicted():
+    store = ExplanationStore(max_inputs=4, max_heatmaps=2)
+    assert store.get_heatmap("missing") is None
+
+    store.put_heatmap("a", True, b"a")
+    store.put_heatmap("b", True, b"b")
+    assert store.get_heatmap("a", overlay=True) == b"a"
+    assert store.get_heatmap("a", overlay=False) is None
+
+    store.put_heatmap("c", True, b"c")
+    assert store.get_heatmap("b") is None
+    assert store.get_heatmap("a") == b"a" and store.get_heatmap("c") == b"c"
+
+    stats = store.get_stats()
+    assert stats["heatmap_evictions"] == 1
+    assert stats["heatmap_hits"] == 3 and stats["heatmap_misses"] == 3
+
+
+def test_render_heatmap_upsamples_to_image_size():
+    image, _ = make_input(100)
+    heatmap = decode_png(render_heatmap(image, np.random.rand(3, 2), overlay=False))
+    assert heatmap.shape == (HEIGHT, WIDTH, 3)
+
+
+def test_render_heatmap_overlay_blends_with_image():
+    cam = np.zeros((3, 2))
+    plain = decode_png(render_heatmap(np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8), cam, overlay=False))
+    image = np.full((HEIGHT, WIDTH, 3), 200, dtype=np.uint8)
+
+    blended = decode_png(render_heatmap(image, cam, overlay=True, alpha=0.45)).astype(np.float32)
+    expected = 0.45 * plain.astype(np.float32) + 0.55 * 200
+    assert np.abs(blended - expected).max() <= 1
+
+    # alpha=1 оставляет только цветовую карту
+    assert np.array_equal(decode_png(render_heatmap(image, cam, overlay=True, alpha=1.0)), plain)
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.utils.frame_stream import FrameSession
+
+
+class EchoBatcher:
+    """Answers every frame with the metadata it was classified with"""
+
+    def __init__(self):
+        self.items = []
+
+    async def submit(self, item, priority=None):
+        self.items.append(item)
+        return {"success": True, "metadata": list(item[1])}
+
+
+def jpeg(seed):
+    pixels = np.random.default_rng(seed).integers(0, 256, size=(60, 40, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+async def settle(session):
+    while session._inflight is not None:
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.asyncio
+async def test_successful_frames_are_audited():
+    audited = []
+    session = FrameSession(EchoBatcher(), [45.0, 1.0, 5.0, 3.0],
+                           audit=lambda sha, metadata, result: audited.append((sha, metadata, result)))
+    frame = jpeg(0)
+    await session.on_frame(frame)
+    await settle(session)
+
+    message = await session.next_message()
+    assert message["type"] == "result"
+    assert audited == [(hashlib.sha256(frame).hexdigest(), [45.0, 1.0, 5.0, 3.0], message["result"])]
+
+
+@pytest.mark.asyncio
+async def test_metadata_update_reclassifies_identical_frame():
+    batcher = EchoBatcher()
+    session = FrameSession(batcher, [45.0, 1.0, 5.0, 3.0])
+    frame = jpeg(1)
+
+    await session.on_frame(frame)
+    await settle(session)
+    await session.on_frame(frame)
+    await settle(session)
+    assert len(batcher.items) == 1 and session.get_stats()["skipped"] == 1
+
+    session.update_metadata([60.0, 0.0, 2.0, 1.0])
+    await session.on_frame(frame)
+    await settle(session)
+    assert len(batcher.items) == 2
+    assert (await session.next_message())["result"]["metadata"] == [60.0, 0.0, 2.0, 1.0]
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.utils.memory_budget import MemoryBudget, estimate_decode_bytes, process_memory
+
+
+def test_jpeg_draft_decode_estimate_uses_dct_scale():
+    full = estimate_decode_bytes("JPEG", (4000, 3000), None)
+    assert full == 4000 * 3000 * 4
+    # 4000x3000 -> 500x375 (1/8) still covers a 200x300 target
+    assert estimate_decode_bytes("JPEG", (4000, 3000), (200, 300)) == 500 * 375 * 4
+    # PNG is not draft-decoded; palette images also keep the converted copy
+    assert estimate_decode_bytes("PNG", (4000, 3000), (200, 300)) == full
+    assert estimate_decode_bytes("PNG", (100, 100), None, "P") == 100 * 100 * 7
+
+
+@pytest.mark.asyncio
+async def test_reservations_are_released_and_resized():
+    budget = MemoryBudget(limit_bytes=1000)
+    async with await budget.reserve(600) as reservation:
+        assert budget.get_stats()["reserved_bytes"] == 600
+        await reservation.resize(100)
+        assert budget.get_stats()["reserved_bytes"] == 100
+
+    stats = budget.get_stats()
+    assert stats["reserved_bytes"] == 0
+    assert stats["peak_reserved_bytes"] == 600
+    assert stats["admitted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_request_waits_until_memory_is_released():
+    budget = MemoryBudget(limit_bytes=1000, timeout_s=5)
+    first = await budget.reserve(800)
+    waiter = asyncio.ensure_future(budget.reserve(500))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    await first.resize(400)
+    second = await asyncio.wait_for(waiter, 1)
+    assert budget.get_stats()["reserved_bytes"] == 900
+    assert budget.get_stats()["waited"] == 1
+    await second.release()
+    await first.release()
+
+
+@pytest.mark.asyncio
+async def test_request_is_rejected_after_timeout():
+    budget = MemoryBudget(limit_bytes=1000, timeout_s=0.01)
+    held = await budget.reserve(900)
+    with pytest.raises(TimeoutError):
+        await budget.reserve(200)
+
+    stats = budget.get_stats()
+    assert stats["rejected"] == 1 and stats["reserved_bytes"] == 900
+    await held.release()
+
+
+@pytest.mark.asyncio
+async def test_oversized_request_is_admitted_alone():
+    budget = MemoryBudget(limit_bytes=1000, timeout_s=0.01)
+    async with await budget.reserve(5000):
+        with pytest.raises(TimeoutError):
+            await budget.reserve(1)
+    assert budget.get_stats()["reserved_bytes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unlimited_budget_only_tracks():
+    budget = MemoryBudget(limit_bytes=None)
+    reservations = [await budget.reserve(10 ** 9) for _ in range(3)]
+    assert budget.get_stats()["reserved_bytes"] == 3 * 10 ** 9
+    for reservation in reservations:
+        await reservation.release()
+
+
+def test_process_memory_reports_rss():
+    memory = process_memory()
+    assert set(memory) == {"rss_bytes", "peak_rss_bytes"}
+    assert memory["peak_rss_bytes"] is None or memory["peak_rss_bytes"] > 0
@@ -0,0 +1,75 @@
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from app.utils.profiler import ProfilingController
+
+
+def wait_inactive(controller, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while controller.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not controller.active
+
+
+def test_disabled_controller_refuses_captures(tmp_path):
+    with pytest.raises(RuntimeError):
+        ProfilingController(str(tmp_path)).start(tf_trace=False)
+
+
+def test_second_concurrent_capture_is_refused(tmp_path):
+    controller = ProfilingController(str(tmp_path), enabled=True)
+    controller.start(tf_trace=False)
+    try:
+        with pytest.raises(RuntimeError, match="already running"):
+            controller.start(tf_trace=False)
+    finally:
+        controller.finish()
+
+
+def test_capture_ends_after_max_duration(tmp_path):
+    controller = ProfilingController(str(tmp_path), enabled=True, max_duration_s=0.1)
+    capture = controller.start(duration_s=3600, tf_trace=False)
+    assert capture["duration_s"] == 0.1
+
+    assert wait_inactive(controller)
+    assert controller.get_status()["captures"] == [capture["capture_id"]]
+
+
+def test_capture_ends_after_max_requests(tmp_path):
+    controller = ProfilingController(str(tmp_path), enabled=True, max_requests=3)
+    capture = controller.start(requests=100, tf_trace=False)
+    assert capture["max_requests"] == 3
+
+    for _ in range(2):
+        controller.profile("decode", sum, [1, 2])
+        controller.request_finished()
+    assert controller.active
+    controller.request_finished()
+
+    assert wait_inactive(controller)
+    directory = os.path.join(tmp_path, capture["capture_id"])
+    assert os.path.exists(os.path.join(directory, "python.prof"))
+    assert not os.path.exists(os.path.join(directory, "tracemalloc.txt"))
+    assert os.path.exists(controller.archive_path(capture["capture_id"]))
+
+
+def test_tracemalloc_window_reports_peak_and_growth(tmp_path):
+    assert not tracemalloc.is_tracing()
+    controller = ProfilingController(str(tmp_path), enabled=True, max_tracemalloc_s=0.5)
+    capture = controller.start(tf_trace=False, tracemalloc_s=60)
+    assert capture["tracemalloc_s"] == 0.5
+
+    # Кратковременный буфер: к концу окна освобождён, но виден в пике
+    controller.profile("preprocess", lambda: float(np.ones(4 * 1024 * 1024).sum()))
+    controller.finish()
+
+    assert not tracemalloc.is_tracing()
+    with open(os.path.join(tmp_path, capture["capture_id"], "tracemalloc.txt"), encoding="utf-8") as f:
+        report = f.read()
+    peak_kib = float(report.split("peak ")[1].split(" KiB")[0])
+    assert peak_kib >= 32 * 1024
+    assert "since the window started" in report
@@ -0,0 +1,116 @@
+import time
+
+from app.utils.result_cache import NearDuplicateCache
+
+METADATA = [45.0, 1.0, 5.0, 1.0]
+
+
+def make_result(diagnosis_class=1, variant="primary"):
+    probabilities = [0.05] * 7
+    probabilities[diagnosis_class] = 0.7
+    return {
+        "success": True,
+        "model_variant": variant,
+        "diagnosis": {"class": diagnosis_class},
+        "probabilities": {"diagnosis": {str(i): {"probability": p} for i, p in enumerate(probabilities)}}
+    }
+
+
+def primary_key(model_version="m@1"):
+    return NearDuplicateCache.make_key(METADATA, None, model_version, "primary")
+
+
+def test_near_duplicate_hit_within_distance():
+    cache = NearDuplicateCache(max_distance=4, audit_rate=0.0)
+    cache.store(0b1011, primary_key(), make_result())
+
+    result, distance, audit = cache.lookup(0b1011 ^ 0b0111, [primary_key()])
+    assert distance == 3 and not audit
+    assert result["diagnosis"]["class"] == 1
+    assert cache.lookup(0xFF, [primary_key()]) is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_returned_result_is_a_copy():
+    cache = NearDuplicateCache(audit_rate=0.0)
+    cache.store(1, primary_key(), make_result())
+    cache.lookup(1, [primary_key()])[0]["diagnosis"]["class"] = 5
+    assert cache.lookup(1, [primary_key()])[0]["diagnosis"]["class"] == 1
+
+
+def test_key_separates_model_version_and_variant():
+    cache = NearDuplicateCache(audit_rate=0.0)
+    fast_key = NearDuplicateCache.make_key(METADATA, None, "m@1", "fast")
+    cache.store(7, fast_key, make_result(variant="fast"))
+
+    assert cache.lookup(7, [primary_key()]) is None
+    assert cache.lookup(7, [primary_key("m@2")]) is None
+    assert cache.lookup(7, [primary_key(), fast_key])[0]["model_variant"] == "fast"
+
+
+def test_entries_expire_after_ttl():
+    cache = NearDuplicateCache(ttl_s=0.01, audit_rate=0.0)
+    cache.store(1, primary_key(), make_result())
+    time.sleep(0.02)
+    assert cache.lookup(1, [primary_key()]) is None
+
+
+def test_failed_results_are_not_stored():
+    cache = NearDuplicateCache()
+    cache.store(1, primary_key(), {"success": False, "error": "boom"})
+    assert cache.get_stats()["stored"] == 0
+
+
+def test_ring_overwrites_oldest_entry():
+    cache = NearDuplicateCache(max_entries=2, max_distance=0, audit_rate=0.0)
+    for image_hash in (1, 2, 3):
+        cache.store(image_hash, primary_key(), make_result())
+
+    assert cache.lookup(1, [primary_key()]) is None
+    assert cache.lookup(3, [primary_key()]) is not None
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_audit_fallbacks_are_not_counted_as_hits():
+    cache = NearDuplicateCache(audit_rate=1.0)
+    cache.store(1, primary_key(), make_result())
+
+    cached, _, audit = cache.lookup(1, [primary_key()])
+    assert audit
+    cache.record_audit(cached, make_result(diagnosis_class=2))
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 0 and stats["hit_rate"] == 0.0
+    assert stats["audit"]["fallbacks"] == 1
+    assert stats["audit"]["samples"] == 1 and stats["audit"]["agreement_rate"] == 0.0
+
+
+def test_degraded_fresh_results_are_not_audited():
+    cache = NearDuplicateCache(audit_rate=1.0)
+    cache.store(1, primary_key(), make_result())
+
+    cached, _, _ = cache.lookup(1, [primary_key()])
+    degraded = make_result(diagnosis_class=2, variant="fast")
+    degraded["cascade"] = {"stage": "degraded"}
+    cache.record_audit(cached, degraded)
+    assert cache.get_stats()["audit"]["samples"] == 0
+
+
+def test_explanation_id_is_not_stored():
+    cache = NearDuplicateCache(audit_rate=0.0)
+    result = make_result()
+    result["explanation_id"] = "abc"
+    cache.store(1, primary_key(), result)
+
+    assert "explanation_id" not in cache.lookup(1, [primary_key()])[0]
+    assert result["explanation_id"] == "abc"
+
+
+def test_clear_drops_all_entries():
+    cache = NearDuplicateCache(audit_rate=0.0)
+    cache.store(1, primary_key(), make_result())
+    cache.clear()
+    assert cache.lookup(1, [primary_key()]) is None
+    assert cache.get_stats()["entries"] == 0
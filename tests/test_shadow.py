@@ -0,0 +1,80 @@
+import numpy as np
+
+from app.utils.shadow import MirroredItem, ShadowEvaluator
+
+CLASS_NAMES = ["df", "vasc", "bkl", "nv", "akiec", "bcc", "mel"]
+RISK = {"df": 0, "vasc": 0, "bkl": 0, "nv": 0, "akiec": 1, "bcc": 2, "mel": 3}
+
+
+class StubCandidate:
+    """Candidate model with fixed class mappings; predictions are passed to _record directly"""
+
+    model_version = "candidate@1"
+    model_path = "candidate.keras"
+    diagnosis_mapping = {i: {"name": name} for i, name in enumerate(CLASS_NAMES)}
+    danger_mapping = RISK
+
+
+def one_hot(index, value=0.7):
+    probabilities = np.full(7, (1 - value) / 6)
+    probabilities[index] = value
+    return probabilities
+
+
+def make_item(primary_class, variant="primary", primary_ms=10.0):
+    return MirroredItem(np.zeros((4, 4, 3), dtype=np.uint8), np.zeros(4, dtype=np.float32),
+                        one_hot(primary_class), variant, primary_ms)
+
+
+def make_result(diagnosis_class):
+    probabilities = one_hot(diagnosis_class)
+    return {"success": True, "model_variant": "primary",
+            "probabilities": {"diagnosis": {str(i): {"probability": p} for i, p in enumerate(probabilities)}}}
+
+
+def test_record_agreement_confusion_and_deltas():
+    shadow = ShadowEvaluator(StubCandidate())
+    batch = [make_item(6), make_item(3), make_item(6, variant="fast", primary_ms=2.0)]
+    # Кандидат согласен в первой строке, путает nv с bkl и пропускает меланому в третьей
+    probabilities = np.stack([one_hot(6), one_hot(2, 0.9), one_hot(3)])
+    shadow._record(batch, probabilities, candidate_ms=4.0)
+
+    stats = shadow.get_stats()
+    assert stats["compared"] == 3
+    assert stats["class_agreement"] == 1 / 3
+    assert stats["risk_agreement"] == 2 / 3  # nv и bkl - один уровень риска
+    assert stats["high_risk_misses"] == 1
+    assert stats["confusion"][6][6] == 1 and stats["confusion"][3][2] == 1 and stats["confusion"][6][3] == 1
+    primary = np.stack([item.primary_probabilities for item in batch])
+    assert np.isclose(stats["mean_max_probability_diff"], np.abs(primary - probabilities).max(axis=1).mean())
+
+    assert stats["agreement_by_primary_variant"]["primary"] == {"compared": 2, "agreements": 1, "rate": 0.5}
+    assert stats["agreement_by_primary_variant"]["fast"]["rate"] == 0.0
+
+    latency = stats["latency_ms_per_item"]
+    assert latency["primary"]["p50"] == 10.0 and latency["candidate"]["p50"] == 4.0
+    assert latency["delta_p50"] == -6.0
+
+
+def test_empty_stats():
+    stats = ShadowEvaluator(StubCandidate()).get_stats()
+    assert stats["compared"] == 0 and stats["class_agreement"] is None
+    assert stats["latency_ms_per_item"]["delta_p50"] is None
+
+
+def test_offer_drops_when_queue_is_full():
+    shadow = ShadowEvaluator(StubCandidate(), sample_rate=1.0, max_queue=2)
+    images = [np.zeros((4, 4, 3), dtype=np.uint8) for _ in range(3)]
+    results = [make_result(1), make_result(2), {"success": False}, make_result(3)]
+    shadow.offer(images + [images[0]], np.zeros((4, 4), dtype=np.float32), results, [1.0, 2.0, 3.0, 4.0])
+
+    stats = shadow.get_stats()
+    assert stats["offered"] == 3  # неуспешные ответы не зеркалятся
+    assert stats["mirrored"] == 2 and stats["dropped"] == 1
+    assert stats["queue_depth"] == 2
+
+    queued = [shadow._queue.get_nowait() for _ in range(2)]
+    assert [item.primary_ms for item in queued] == [1.0, 2.0]
+    # Изображение копируется: буферы батча переиспользуются
+    images[0][:] = 255
+    assert queued[0].image.max() == 0
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from app.utils.similarity_index import SimilarityIndex
+
+DIM = 8
+
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+
+
+def brute_force(vectors, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Индекс хранит float16, эталон считаем по тем же значениям
+    stored = normalized.astype(np.float16).astype(np.float32)
+    scores = stored @ (query / np.linalg.norm(query))
+    return [f"case-{i}" for i in np.argsort(-scores)[:k]]
+
+
+def add_cases(index, vectors, offset=0):
+    index.add(vectors, [f"case-{offset + i}" for i in range(len(vectors))],
+              [{"row": offset + i} for i in range(len(vectors))])
+
+
+def test_flat_search_matches_brute_force(tmp_path):
+    vectors = random_vectors(300)
+    index = SimilarityIndex(str(tmp_path), nlist=4, train_size=10 ** 6, chunk_size=64)
+    add_cases(index, vectors)
+
+    for query in random_vectors(5, seed=1):
+        found = index.search(query, k=7)
+        assert [case["case_id"] for case in found] == brute_force(vectors, query, 7)
+        assert found[0]["payload"] == {"row": int(found[0]["case_id"].split("-")[1])}
+        assert all(a["similarity"] >= b["similarity"] for a, b in zip(found, found[1:]))
+
+    assert index.get_stats()["mode"] == "flat"
+    assert index.search(vectors[0], k=0) == []
+
+
+def test_reopen_restores_vectors_and_cases(tmp_path):
+    vectors = random_vectors(50)
+    index = SimilarityIndex(str(tmp_path), nlist=4, train_size=10 ** 6)
+    add_cases(index, vectors)
+    index.flush()
+    expected = index.search(vectors[3], k=5)
+
+    reopened = SimilarityIndex(str(tmp_path), nlist=4, train_size=10 ** 6)
+    assert len(reopened) == 50
+    assert reopened.vectors.dtype == np.float16
+    assert reopened.search(vectors[3], k=5) == expected
+
+
+def test_reopen_recovers_from_truncated_last_line(tmp_path):
+    index = SimilarityIndex(str(tmp_path), nlist=4, train_size=10 ** 6)
+    add_cases(index, random_vectors(10))
+    index.flush()
+
+    cases_path = os.path.join(tmp_path, "cases.jsonl")
+    with open(cases_path, encoding="utf-8") as f:
+        lines = f.readlines()
+    # Сбой посреди записи последней строки, уже учтённой в meta.json
+    with open(cases_path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:10])
+
+    reopened = SimilarityIndex(str(tmp_path), nlist=4, train_size=10 ** 6)
+    assert len(reopened) == 9
+    add_cases(reopened, random_vectors(1, seed=5), offset=100)
+
+    with open(cases_path, encoding="utf-8") as f:
+        case_ids = [json.loads(line)["case_id"] for line in f]
+    assert case_ids == [f"case-{i}" for i in range(9)] + ["case-100"]
+    assert SimilarityIndex(str(tmp_path), nlist=4, train_size=10 ** 6).search(random_vectors(1, seed=5)[0], k=1)[0]["case_id"] == "case-100"
+
+
+def test_background_training_switches_to_ivf(tmp_path):
+    vectors = random_vectors(256)
+    index = SimilarityIndex(str(tmp_path), nlist=4, nprobe=4, train_size=256)
+    add_cases(index, vectors)
+
+    assert index.wait_for_training(timeout=30)
+    stats = index.get_stats()
+    assert stats["mode"] == "ivf" and stats["nlist"] == 4 and not stats["training"]
+    assert sorted(np.concatenate(index._lists).tolist()) == list(range(256))
+
+    # Со всеми пробируемыми списками IVF-поиск точный
+    for query in random_vectors(5, seed=2):
+        assert [case["case_id"] for case in index.search(query, k=5)] == brute_force(vectors, query, 5)
+
+    reopened = SimilarityIndex(str(tmp_path), nlist=4, nprobe=4)
+    assert reopened.get_stats()["mode"] == "ivf"
+
+
+class GatedIndex(SimilarityIndex):
+    """Holds background training between k-means and the assignment of trained rows"""
+
+    def __init__(self, *args, **kwargs):
+        self.gate = threading.Event()
+        self.training_started = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _assign_rows(self, vectors, start, stop, centroids):
+        if start == 0:
+            self.training_started.set()
+            self.gate.wait(10)
+        return super()._assign_rows(vectors, start, stop, centroids)
+
+
+def test_rows_added_during_training_are_assigned_and_merged(tmp_path):
+    vectors = random_vectors(300)
+    index = GatedIndex(str(tmp_path), nlist=4, nprobe=4, train_size=256, merge_threshold=4)
+    add_cases(index, vectors[:256])
+    assert index.training_started.wait(10)
+
+    # Вставки и поиск не ждут окончания обучения
+    add_cases(index, vectors[256:280], offset=256)
+    assert index.get_stats()["mode"] == "flat"
+    assert len(index.search(vectors[260], k=3)) == 3
+
+    index.gate.set()
+    assert index.wait_for_training(timeout=30)
+    assert sorted(np.concatenate(index._lists).tolist()) == list(range(280))
+    assert index.get_stats()["pending_rows"] == 0
+
+    # После обучения новые строки копятся в pending и сливаются по порогу
+    add_cases(index, vectors[280:], offset=280)
+    rows = np.concatenate(index._lists + [np.asarray(p, dtype=np.int64) for p in index._pending])
+    assert sorted(rows.tolist()) == list(range(300))
+    assert index.get_stats()["pending_rows"] < 20
+    for query in vectors[280:290]:
+        assert [case["case_id"] for case in index.search(query, k=5)] == brute_force(vectors, query, 5)
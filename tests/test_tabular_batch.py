@@ -0,0 +1,102 @@
+import io
+import tarfile
+import zipfile
+
+import numpy as np
+import pytest
+
+from app.utils.tabular_batch import iter_archive_images, read_metadata_table, validate_metadata_table
+
+
+class FakeModel:
+    sex_mapping = {"male": 0, "female": 1, "unknown": 2}
+    localization_mapping = {"unknown": 0, "lower extremity": 5}
+    dx_type_mapping = {"follow_up": 0, "consensus": 1, "confocal": 2, "histo": 3}
+
+    def validate_metadata_batch(self, metadata_batch):
+        return [None if 0 <= age <= 120 else "age out of range" for age in metadata_batch[:, 0]]
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def make_tar(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def test_read_csv_table_normalizes_ids_and_columns():
+    table = b"\xef\xbb\xbfImage_ID,Age,Sex,Localization,DX_Type\r\n" \
+            b"images/ISIC_1.jpg,45,female,lower extremity,histo\r\n" \
+            b",,,,\r\n" \
+            b"ISIC_2,60,0,5\r\n"
+    image_ids, columns = read_metadata_table(table, "meta.csv")
+
+    assert image_ids.tolist() == ["ISIC_1", "ISIC_2"]
+    assert columns["sex"].tolist() == ["female", "0"]
+    assert columns["dx_type"].tolist() == ["histo", ""]
+
+
+def test_missing_columns_are_rejected():
+    with pytest.raises(ValueError, match="dx_type"):
+        read_metadata_table(b"image_id,age,sex,localization\nISIC_1,45,1,5\n", "meta.csv")
+
+
+def test_validation_reports_per_row_errors():
+    table = b"image_id,age,sex,localization,dx_type\n" \
+            b"a,45,female,lower extremity,histo\n" \
+            b"b,45,alien,5,1\n" \
+            b"c,200,1,5,1\n"
+    _, columns = read_metadata_table(table, "meta.csv")
+    metadata, errors = validate_metadata_table(columns, FakeModel())
+
+    assert metadata.dtype == np.float32 and metadata.shape == (3, 4)
+    assert metadata[0].tolist() == [45.0, 1.0, 5.0, 3.0]
+    assert errors[0] is None
+    assert errors[1] == "Unrecognized value: sex='alien'"
+    assert errors[2] == "age out of range"
+
+
+@pytest.mark.parametrize("make_archive, filename", [(make_zip, "images.zip"), (make_tar, "images.tar.gz")])
+def test_archive_members_are_yielded_with_ids(make_archive, filename):
+    archive = make_archive([("dir/ISIC_1.jpg", b"one"), ("notes.txt", b"skip"), ("ISIC_2.png", b"two")])
+    members = list(iter_archive_images(archive, filename, max_member_bytes=16, max_members=10))
+    assert members == [("ISIC_1", b"one", None), ("ISIC_2", b"two", None)]
+
+
+@pytest.mark.parametrize("make_archive, filename", [(make_zip, "images.zip"), (make_tar, "images.tar.gz")])
+def test_duplicate_members_are_reported(make_archive, filename):
+    archive = make_archive([("ISIC_1.jpg", b"one"), ("other/ISIC_1.jpeg", b"again")])
+    members = list(iter_archive_images(archive, filename, max_member_bytes=16, max_members=10))
+
+    assert members[0] == ("ISIC_1", b"one", None)
+    image_id, data, error = members[1]
+    assert image_id == "ISIC_1" and data is None
+    assert error.startswith("Duplicate image id")
+
+
+def test_oversized_member_yields_error():
+    archive = make_zip([("big.jpg", b"x" * 32)])
+    (image_id, data, error), = iter_archive_images(archive, "images.zip", max_member_bytes=16, max_members=10)
+    assert image_id == "big" and data is None and "exceeds 16 bytes" in error
+
+
+def test_member_limit_and_corrupt_archive_raise():
+    archive = make_zip([(f"{i}.jpg", b"x") for i in range(3)])
+    with pytest.raises(ValueError, match="more than 2"):
+        list(iter_archive_images(archive, "images.zip", max_member_bytes=16, max_members=2))
+
+    with pytest.raises(ValueError, match="Corrupt"):
+        list(iter_archive_images(io.BytesIO(b"not an archive"), "images.zip", max_member_bytes=16, max_members=2))
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from app.models.model_manager import SkinCancerModel
+
+
+class RecordingModel:
+    """Stub Keras model: probabilities derived from the mean pixel of each view"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, inputs, verbose=0):
+        images, metadata = inputs
+        self.calls.append((np.array(images), np.array(metadata)))
+        means = images.reshape(len(images), -1).mean(axis=1)
+        probabilities = np.tile(np.linspace(0.1, 0.7, 7), (len(images), 1)) + means[:, None]
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture
+def model():
+    manager = SkinCancerModel()
+    manager.model = RecordingModel()
+    manager.is_loaded = True
+    manager.tta_crop_fraction = 0.9
+    return manager
+
+
+def make_image(shape):
+    height, width, _ = shape
+    gradient = np.arange(height * width, dtype=np.float32).reshape(height, width, 1) / (height * width)
+    return np.repeat(gradient, 3, axis=2)[None]
+
+
+def test_views_are_flips_rotation_and_corner_crops(model):
+    image = make_image(model.image_shape)
+    views = model._build_tta_views(image)
+
+    # 2 отражения, поворот на 180 градусов и 4 угловых кропа
+    assert views.shape == (7, *model.image_shape)
+    assert views.dtype == np.float32
+    np.testing.assert_array_equal(views[0], image[0][:, ::-1])
+    np.testing.assert_array_equal(views[1], image[0][::-1, :])
+    np.testing.assert_array_equal(views[2], image[0][::-1, ::-1])
+
+
+def test_corner_crops_are_resized_back_to_input_shape(model):
+    image = make_image(model.image_shape)
+    height, width, _ = model.image_shape
+    crop_h, crop_w = round(height * 0.9), round(width * 0.9)
+    crops = model._build_tta_views(image)[3:]
+
+    corners = [(0, 0), (0, width - crop_w), (height - crop_h, 0), (height - crop_h, width - crop_w)]
+    for crop, (top, left) in zip(crops, corners):
+        assert crop.shape == model.image_shape
+        # Углы кропа - углы соответствующей области исходного изображения
+        assert crop[0, 0, 0] == image[0, top, left, 0]
+        assert crop[-1, -1, 0] <= image[0, top + crop_h - 1, left + crop_w - 1, 0]
+        assert crop[-1, -1, 0] > image[0, top + crop_h - 2, left + crop_w - 2, 0] - 1e-6
+
+
+def test_tta_probabilities_are_mean_over_views(model):
+    image = make_image(model.image_shape)
+    metadata = model.preprocess_metadata(45, 1, 5, 3)
+    first_pass = model._forward(image, metadata)[0]
+
+    probabilities, total_views = model._predict_with_tta(image, metadata, first_pass)
+
+    views, view_metadata = model.model.calls[-1]
+    assert total_views == len(views) + 1 == 8
+    assert (view_metadata == metadata).all()
+    all_views = np.concatenate([image, views])
+    expected = model.model.predict([all_views, np.repeat(metadata, 8, axis=0)]).mean(axis=0)
+    np.testing.assert_allclose(probabilities, expected, rtol=1e-6)